@@ -11,27 +11,39 @@ if __name__ == '__main__':
     if sys.argv[1] == 'compile':
 
         if '-h' in sys.argv[2:]:
+            from . import opt
             print('''cslc [ARGS...] [FILE]
-Additional arguments will be passed to llc.''')
+Additional arguments will be passed to llc.
+-O0 disables IR optimization passes.
+-fpasses=NAME,... runs the named passes (%s) instead of the default ones.''' % ', '.join(opt.PassLoc))
             exit(0)
 
         filename = None
 
+        passes = None
         for arg in sys.argv[2:]:
             if arg[0] != '-':
                 filename = arg
+            elif arg.startswith('-fpasses='):
+                passes = [name for name in arg[len('-fpasses='):].split(',') if name]
+                sys.argv.remove(arg)
 
         if not filename:
             print('Error: No input files')
             exit(1)
 
         import os
-        from . import parse, ast, translate, vm
+        from . import parse, ast, translate, vm, cache, parallel, opt
 
-        parser = parse.Parser()
-        tree = parser.parse_file(filename)
+        parse.Parser.ast_cache.cache_dir = cache.default_cache_dir()
+        tree = parallel.parse_project(filename)
+        tree, _ = opt.fold_constants(tree)
         translater = translate.Translater()
         translater.translate(tree)
+        if passes is not None:
+            opt.run_passes(translater, passes)
+        elif not '-O0' in sys.argv[2:]:
+            opt.run_passes(translater)
         converter = vm.LLConverter(translater)
         irfilename = filename.rsplit('.', 1)[0] + '.ll'
         converter.output(irfilename)
@@ -45,5 +57,10 @@ Additional arguments will be passed to llc.''')
 
         pass
 
+    elif sys.argv[1] == 'bench':
+
+        from . import bench
+        bench.main(sys.argv[2:])
+
     else:
         print('Error: Unknown command %s' % sys.argv[1])
@@ -35,15 +35,22 @@ class ASTType(Enum):
 
 class AST:
     """ Abstract Syntax Tree
+        Nodes are slotted; a node without children shares the empty tuple
+        AST.NO_NODES, and gets its own list on the first append().
     """
 
+    __slots__ = ('type', 'value', 'attr', 'nodes')
+
+    NO_NODES = ()
+
     def __init__(self, mtype, mval=None, nodes=None, **kwargs):
         """ mval --> value of self (like operator.name)
+            kwargs --> attr; None if empty
         """
         self.type = mtype
         self.value = mval 
-        self.attr = kwargs
-        self.nodes = [] if not nodes else nodes 
+        self.attr = kwargs or None
+        self.nodes = nodes if nodes else AST.NO_NODES
 
     def __repr__(self):
         if len(self.nodes) > 0:
@@ -54,25 +61,61 @@ class AST:
     def append(self, child):
         """ Add a child.
         """
-        self.nodes.append(child)
+        if self.nodes is AST.NO_NODES:
+            self.nodes = [child]
+        else:
+            self.nodes.append(child)
+
+    def __reduce__(self):
+        """ Pickled as a flat preorder list, so that the depth of a tree is not
+            limited by the recursion limit of pickle.
+        """
+        flat = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            flat.append((node.type, node.value, node.attr, len(node.nodes)))
+            stack.extend(reversed(node.nodes))
+        return (_unflatten, (flat,))
+
+
+def _unflatten(flat):
+    """ Rebuild an AST from AST.__reduce__().
+    """
+    root = None
+    stack = []  # list [[AST, number of children still missing]]
+    for mtype, mval, attr, count in flat:
+        node = AST(mtype, mval)
+        node.attr = attr
+        if stack:
+            parent = stack[-1]
+            parent[0].append(node)
+            parent[1] -= 1
+            if parent[1] == 0:
+                stack.pop()
+        else:
+            root = node
+        if count:
+            stack.append([node, count])
+    return root
         
 
+_ConvertLoc = {
+    TokenType.NONE: ASTType.NONE,
+    TokenType.VAL: ASTType.VAL,
+    TokenType.NAME: ASTType.NAME,
+    TokenType.OP: ASTType.OP,
+    TokenType.TYPE: ASTType.TYPE,
+    TokenType.CTRL: ASTType.CTRL
+}
+
 def token2ast(token:Token):
     """ Convert token to AST node.
         The type of token is limited in
         NONE, VAL, NAME, OP, TYPE, CTRL
     """
 
-    ConvertTable = {
-        TokenType.NONE: ASTType.NONE,
-        TokenType.VAL: ASTType.VAL,
-        TokenType.NAME: ASTType.NAME,
-        TokenType.OP: ASTType.OP,
-        TokenType.TYPE: ASTType.TYPE,
-        TokenType.CTRL: ASTType.CTRL
-    }
-
-    return AST(ConvertTable[token.tp], token.val)
+    return AST(_ConvertLoc[token.tp], token.val)
 
 
 class ASTBuilder:
@@ -131,11 +174,12 @@ class ASTBuilder:
 def printast(root:AST, indent='\t', level=0):
     """ Formatted print an AST.
     """
-    if root.value is None:
-        print('%s%s' % (indent * level, root.type))
-    else:
-        print('%s%s' % (indent * level, root.value))
-
+    stack = [(root, level)]
+    while stack:
+        node, level = stack.pop()
+        if node.value is None:
+            print('%s%s' % (indent * level, node.type))
+        else:
+            print('%s%s' % (indent * level, node.value))
 
-    for node in root.nodes:
-        printast(node, indent, level+1)
+        stack.extend((child, level + 1) for child in reversed(node.nodes))
@@ -0,0 +1,218 @@
+""" Front-end throughput benchmarks.
+"""
+
+import time
+
+from .lex import Lexer, TokenArray
+from .parse import Parser
+from .translate import Translater
+from .tokens import TokenType
+from .ast import AST, ASTType
+from .opt import ConstantFolder, run_passes
+from .ir import Code
+
+
+def gen_source(nfuncs=1000):
+    """ Generate a machine-like CSL program with `nfuncs` functions.
+    """
+    lines = ['int g0 = 1;', 'float g1 = 2.5;']
+    for i in range(nfuncs):
+        lines.append('def f%d(x:int, y:float):int{' % i)
+        lines.append('    int a = x * %d + 3;' % i)
+        lines.append('    float b;')
+        lines.append('    b = y / 2.0e1 - a;')
+        lines.append('    if (a > g0 and not (b < 1.5)) a += 1; else a = a % 7;')
+        lines.append('    while (a > 0) { a--; if (a == %d) break; }' % (i % 5))
+        lines.append('    return a;')
+        lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def gen_deep_source(depth=200):
+    """ Generate CSL programs nested `depth` levels deep.
+        Returns dict{shape: source}
+    """
+    elif_chain = ['def f(x:int):int{', '    int r = 0;', '    if (x == 0) r = 0;']
+    for i in range(1, depth):
+        elif_chain.append('    else if (x == %d) r = %d;' % (i, i))
+    elif_chain += ['    return r;', '}']
+
+    parens = 'x' + ' + (x' * depth + ')' * depth
+    blocks = '{' * depth + 'x = x + 1;' + '}' * depth
+
+    return {
+        'else-if': '\n'.join(elif_chain) + '\n',
+        'parens': 'def f(x:int):int{\n    return %s;\n}\n' % parens,
+        'blocks': 'def f(x:int):int{\n    %s\n    return x;\n}\n' % blocks,
+    }
+
+
+def _best_of(func, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_lex(source, repeat=3):
+    """ Tokenize `source` with every tokenizer.
+        Returns dict{mode: (seconds, token count)}
+    """
+
+    def run(single_pass):
+        lexer = Lexer(single_pass)
+        lexer.load(source)
+        count = 0
+        while lexer.get_token().tp != TokenType.EOF:
+            count += 1
+        return count
+
+    def run_array():
+        lexer = TokenArray()
+        lexer.load(source)
+        return len(lexer) - 1
+
+    results = {}
+    for mode, single_pass in (('legacy', False), ('single-pass', True)):
+        results[mode] = _best_of(lambda: run(single_pass), repeat)
+    results['token-array'] = _best_of(run_array, repeat)
+    return results
+
+
+def bench_parse(source, repeat=5):
+    """ Parse `source`, from a pre-lexed TokenArray (parser only) and from
+        the streaming lexer (lex + parse).
+        Returns dict{mode: (seconds, token count)}
+    """
+    tokens = TokenArray()
+    tokens.load(source)
+    count = len(tokens) - 1
+
+    def run_array():
+        parser = Parser(True)
+        parser.lexer = tokens
+        tokens.index = tokens.look_index = 0
+        parser.next_token = tokens.get_token()
+        parser._parse_blocks()
+        return count
+
+    def run_stream():
+        parser = Parser(False)
+        parser.lexer.load(source)
+        parser.next_token = parser.lexer.get_token()
+        parser._parse_blocks()
+        return count
+
+    return {
+        'parse': _best_of(run_array, repeat),
+        'lex+parse': _best_of(run_stream, repeat),
+    }
+
+
+def bench_deep(depth=200, repeat=3):
+    """ Parse and translate deeply nested programs (see gen_deep_source).
+        Returns dict{shape: (seconds, token count)}
+    """
+
+    def run(source):
+        parser = Parser(True)
+        parser.lexer.load(source)
+        count = len(parser.lexer) - 1
+        parser.next_token = parser.lexer.get_token()
+        translater = Translater()
+        translater.translate(AST(ASTType.ROOT, nodes=parser._parse_blocks()))
+        return count
+
+    return {shape: _best_of(lambda: run(source), repeat) for shape, source in gen_deep_source(depth).items()}
+
+
+def bench_fold(source, repeat=3):
+    """ Fold constants of `source` (see opt.ConstantFolder).
+        Returns (seconds, nodes removed, global reads propagated)
+    """
+    parser = Parser(True)
+    parser.lexer.load(source)
+    parser.next_token = parser.lexer.get_token()
+    tree = AST(ASTType.ROOT, nodes=parser._parse_blocks())
+
+    def run():
+        folder = ConstantFolder()
+        folder.fold(tree)
+        return folder
+
+    elapsed, folder = _best_of(run, repeat)
+    return elapsed, folder.removed, folder.propagated
+
+
+def bench_passes(source, names=None, repeat=3):
+    """ Run IR passes (default: opt.DefaultPasses) on the translated `source`.
+        Returns (seconds, dict{code count: (before, after)}, stats)
+    """
+    parser = Parser(True)
+    parser.lexer.load(source)
+    parser.next_token = parser.lexer.get_token()
+    tree = AST(ASTType.ROOT, nodes=parser._parse_blocks())
+
+    def count(translater):
+        codes = [code.code for function in translater.functions for code in function.codes]
+        return {
+            'codes': len(codes),
+            'loads': codes.count(Code.LOAD),
+            'stores': codes.count(Code.STORE),
+            'phis': codes.count(Code.PHI),
+        }
+
+    best = None
+    for _ in range(repeat):
+        translater = Translater()
+        translater.translate(tree)
+        before = count(translater)
+        t0 = time.perf_counter()
+        stats = run_passes(translater, names)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+
+    after = count(translater)
+    return best, {key: (before[key], after[key]) for key in before}, stats
+
+
+def main(args):
+    """ Entry of `python -m pycsl bench [lex|parse|fold|opt] [FILE]` and
+        `python -m pycsl bench deep [DEPTH]`.
+    """
+    target = args[0] if args else 'lex'
+    if target == 'deep':
+        source = None
+    elif len(args) > 1:
+        with open(args[1], 'r') as finput:
+            source = finput.read()
+    else:
+        source = gen_source()
+
+    if target == 'lex':
+        results = bench_lex(source)
+    elif target == 'parse':
+        results = bench_parse(source)
+    elif target == 'fold':
+        elapsed, removed, propagated = bench_fold(source)
+        print('fold %8.3fs %8d nodes removed %8d globals propagated' % (elapsed, removed, propagated))
+        return
+    elif target == 'opt':
+        elapsed, counts, stats = bench_passes(source)
+        print('passes %8.3fs' % elapsed)
+        for key, (before, after) in counts.items():
+            print('%-12s %8d => %8d' % (key, before, after))
+        for name, passstats in stats.items():
+            print('%-12s %s' % (name, ', '.join('%s %d' % item for item in passstats.items())))
+        return
+    elif target == 'deep':
+        results = bench_deep(int(args[1]) if len(args) > 1 else 200)
+    else:
+        print('Error: Unknown benchmark %s' % target)
+        exit(1)
+
+    for mode, (elapsed, count) in results.items():
+        print('%-12s %8d tokens %8.3fs %10.0f tokens/s' % (mode, count, elapsed, count / elapsed))
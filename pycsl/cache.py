@@ -0,0 +1,183 @@
+""" Cache of parsed ASTs, in memory and on disk.
+"""
+
+import os
+import zlib
+import pickle
+import hashlib
+from collections import OrderedDict, namedtuple
+
+
+class CacheEntry(namedtuple('CacheEntry', ['ast', 'deps'])):
+    """ A cached parse result.
+        ast: AST with node as ROOT;
+        deps: tuple of (fullname, key) of every module spliced into ast.
+    """
+
+
+class ASTCache:
+    """ Two-tier cache of parsed modules, keyed by source hash and parser version.
+
+        Memory tier: LRU of at most `max_entries` entries; the least recently
+            used entry is evicted first.
+        Disk tier (only if `cache_dir` is set): one compressed pickle per entry;
+            when more than `max_disk_entries` files exist, the least recently
+            used ones (by mtime, refreshed on every hit) are removed. Entries
+            are only loaded if the directory and the file are owned by the
+            current user and not writable by others.
+
+        An entry is only valid if every module spliced into it is unchanged.
+    """
+
+    SUFFIX = '.ast'
+
+    def __init__(self, cache_dir=None, version=0, max_entries=64, max_disk_entries=1024):
+        self.cache_dir = cache_dir
+        self.version = version
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict()    # dict{key: CacheEntry}, in LRU order
+        self.file_keys = {}             # dict{fullname: (stat signature, key)}
+
+    def clear(self):
+        """ Clear memory tier.
+        """
+        self.entries.clear()
+        self.file_keys.clear()
+
+    def file_key(self, fullname):
+        """ Returns the key of a source file. Hashes are reused while the file
+            size and mtime are unchanged.
+        """
+        stat = os.stat(fullname)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        known = self.file_keys.get(fullname)
+        if known and known[0] == signature:
+            return known[1]
+
+        digest = hashlib.sha1(b'pycsl-%d:' % self.version)
+        with open(fullname, 'rb') as finput:
+            for chunk in iter(lambda: finput.read(1 << 20), b''):
+                digest.update(chunk)
+
+        key = digest.hexdigest()
+        self.file_keys[fullname] = (signature, key)
+        return key
+
+    def path_key(self, fullname):
+        """ Returns the key of a source file at its path, for results that
+            depend on where the file is (e.g. imports spliced in, as they are
+            searched relative to it).
+        """
+        digest = hashlib.sha1(self.file_key(fullname).encode())
+        digest.update(os.fsencode(fullname))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """ Returns CacheEntry of key, or None if missing or stale.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        else:
+            entry = self._load(key)
+            if entry is None:
+                return None
+            self._put_memory(key, entry)
+
+        if not self._valid(entry):
+            self.evict(key)
+            return None
+        return entry
+
+    def put(self, key, ast, deps=(), persist=True):
+        """ Store a parse result. If not persist, only the memory tier is
+            updated (e.g. another process already wrote it to disk).
+        """
+        entry = CacheEntry(ast, tuple(deps))
+        self._put_memory(key, entry)
+        if persist:
+            self._store(key, entry)
+        return entry
+
+    def evict(self, key):
+        """ Remove an entry from both tiers.
+        """
+        self.entries.pop(key, None)
+        if self.cache_dir:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _valid(self, entry):
+        for fullname, key in entry.deps:
+            try:
+                if self.file_key(fullname) != key:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _put_memory(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ASTCache.SUFFIX)
+
+    def _load(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            if not _private(os.stat(self.cache_dir)):
+                return None
+            with open(path, 'rb') as finput:
+                if not _private(os.fstat(finput.fileno())):
+                    return None
+                entry = pickle.loads(zlib.decompress(finput.read()))
+            os.utime(path)
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        return entry
+
+    def _store(self, key, entry):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        path = self._path(key)
+        tmppath = '%s.%d.tmp' % (path, os.getpid())
+        with os.fdopen(os.open(tmppath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as foutput:
+            foutput.write(zlib.compress(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)))
+        os.replace(tmppath, path)
+        self._prune()
+
+    def _prune(self):
+        names = [n for n in os.listdir(self.cache_dir) if n.endswith(ASTCache.SUFFIX)]
+        if len(names) <= self.max_disk_entries:
+            return
+
+        paths = [os.path.join(self.cache_dir, n) for n in names]
+        paths.sort(key=lambda p: os.stat(p).st_mtime_ns)
+        for path in paths[:len(paths) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _private(stat):
+    """ True if stat is of a file owned by the current user, that others
+        cannot write. Always True where there are no user ids.
+    """
+    getuid = getattr(os, 'getuid', None)
+    return getuid is None or (stat.st_uid == getuid() and not stat.st_mode & 0o022)
+
+
+def default_cache_dir():
+    """ $PYCSL_CACHE_DIR, or ~/.cache/pycsl
+    """
+    return os.environ.get('PYCSL_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'pycsl')
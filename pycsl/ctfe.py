@@ -0,0 +1,371 @@
+""" Compile-time function evaluation (CTFE)
+    Runs CSL functions on their AST, so that constant expressions may call
+    them. Only functions without side effects can run: they may use
+    parameters, local scalars and arrays, and call each other, but may not
+    access globals or call external functions. Values are evaluated by
+    evalute.eval_op, so results are the same as at run time.
+"""
+
+from .grammar.operators import Operator
+from .grammar.basic_types import ValType, Value
+from .grammar.keywords import Keyword
+
+from .ast import AST, ASTType, DeclNode
+from .errors import CompileError, EvalError
+from .symtable import OverloadTable, ScopedSymbolTable
+from .util.trampoline import trampoline
+from .visitor import Visitor, visits
+from .evalute import eval_op, cast_value
+
+
+# assignment operator ==> operator applied (None for plain assignment)
+AssignEvalLoc = {
+    Operator.ASN: None,
+    Operator.ADDASN: Operator.ADD,
+    Operator.SUBASN: Operator.SUB,
+    Operator.MULASN: Operator.MUL,
+    Operator.DIVASN: Operator.DIV,
+    Operator.REMASN: Operator.REM,
+}
+
+# inc / dec operator ==> (operator applied, returns the new value)
+IncDecEvalLoc = {
+    Operator.INC: (Operator.ADD, True),
+    Operator.DEC: (Operator.SUB, True),
+    Operator.POSTINC: (Operator.ADD, False),
+    Operator.POSTDEC: (Operator.SUB, False),
+}
+
+
+class Variable:
+    """ A local variable: scalar if shape is empty, else a row-major array.
+        cells holds the Value of every element, None if not initialized.
+    """
+
+    __slots__ = ('type', 'shape', 'cells')
+
+    def __init__(self, vtype, shape=()):
+        self.type = vtype
+        self.shape = shape
+        size = 1
+        for s in shape:
+            size *= s
+        self.cells = [None] * size
+
+
+class Return:
+    """ Signal of a return statement, with the returned Value.
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Evaluator(Visitor):
+    """ Execute CSL functions at compile time.
+        Statements return None, or a signal that ends the enclosing
+        statements: Keyword.BREAK, Keyword.CONTINUE or a Return. Expressions
+        return a Value. Handlers are generators run by util.trampoline, so
+        recursive CSL functions do not use the Python stack.
+        Every visited node costs a step; an evaluation taking more than
+        step_limit steps fails, like any evaluation that is not constant, by
+        EvalError.
+    """
+
+    STEP_LIMIT = 1 << 18        # maximum steps of one evaluation
+
+    def __init__(self):
+        super().__init__()
+
+        self.functions = dict()     # dict{function signature: FUNC AST, None if declared only}
+        self.overloads = OverloadTable()
+        self.results = dict()       # dict{(function name, args): Value or EvalError}
+        self.step_limit = Evaluator.STEP_LIMIT
+        self.steps = 0              # steps left in current evaluation
+        self.scopes = ScopedSymbolTable()   # name ==> Variable, of running function
+
+    def add_function(self, ast:AST):
+        """ Register a FUNC node. Declarations without body take part in
+            overload resolution, but cannot be evaluated.
+        """
+        decl = ast.nodes[0]
+        argtypes = tuple(arg_node.nodes[1].value if len(arg_node.nodes) == 2 else ValType.VOID for arg_node in decl.nodes[1].nodes)
+        signature = decl.nodes[0].value.name, argtypes, decl.nodes[2].value if len(decl.nodes) == 3 else ValType.VOID
+        if signature not in self.functions:
+            self.functions[signature] = None
+            self.overloads.add(signature)
+        if len(ast.nodes) == 2 and self.functions[signature] is None:
+            self.functions[signature] = ast
+
+    def add_functions(self, root:AST):
+        """ Register every function of ROOT node root.
+        """
+        for node in root.nodes:
+            if node.type == ASTType.FUNC:
+                self.add_function(node)
+
+    def call(self, funcname, args):
+        """ Returns the Value of funcname(*args); args are Values.
+            Results are cached, as functions have no side effects.
+        """
+        key = funcname, tuple((arg.type, arg.val) for arg in args)
+        result = self.results.get(key)
+        if result is None:
+            self.steps = self.step_limit
+            try:
+                result = trampoline(self._call(funcname, args))
+            except ZeroDivisionError:
+                result = EvalError('Division by zero')
+            except EvalError as err:
+                result = err
+            finally:
+                self.scopes.clear()
+            self.results[key] = result
+
+        if isinstance(result, EvalError):
+            raise EvalError(result.args[0])
+        return result
+
+    def visit(self, ast:AST, *args):
+        self.steps -= 1
+        if self.steps < 0:
+            raise EvalError('Step limit (%d) exceeded' % self.step_limit)
+        return super().visit(ast, *args)
+
+    def generic_visit(self, ast:AST, *args):
+        raise EvalError('Cannot evaluate %s %s' % (ast.type.name, ast.value))
+
+    def _call(self, funcname, args):
+        """ Run function funcname, resolved by argument types as in
+            Translater.
+        """
+        try:
+            signature = self.overloads.resolve(funcname, [arg.type for arg in args])
+        except CompileError:
+            raise EvalError('Function "%s" cannot be evaluated' % funcname)
+
+        func = self.functions[signature]
+        if func is None:
+            raise EvalError('Function "%s" cannot be evaluated' % funcname)
+        _, argtypes, rettype = signature
+
+        local_scopes = ScopedSymbolTable()
+        local_scopes.push()
+        for arg_node, argtype, arg in zip(func.nodes[0].nodes[1].nodes, argtypes, args):
+            var = Variable(argtype)
+            var.cells[0] = self._cast(arg, argtype)
+            local_scopes.declare(arg_node.nodes[0].value.name, var)
+
+        caller_scopes, self.scopes = self.scopes, local_scopes
+        signal = yield self.visit(func.nodes[1])
+        self.scopes = caller_scopes
+
+        if isinstance(signal, Return) and rettype != ValType.VOID:
+            return self._cast(signal.value, rettype)
+        elif rettype == ValType.VOID:
+            return Value(ValType.VOID, None)
+        else:
+            raise EvalError('Function "%s" must return a value' % funcname)
+
+    def _cast(self, value:Value, vtype):
+        if not isinstance(vtype, ValType) or vtype == ValType.VOID or value.type == ValType.VOID:
+            raise EvalError('Cannot cast %s to %s' % (value.type, vtype))
+        return value if value.type == vtype else Value(vtype, cast_value(value.val, vtype))
+
+    def _lookup(self, name):
+        var = self.scopes.lookup(name)
+        if var is None:
+            raise EvalError('Variable "%s" cannot be evaluated' % name)
+        return var
+
+    ## statements
+
+    @visits(ASTType.BLOCK)
+    def _eval_block(self, ast:AST):
+        self.scopes.push()
+        for node in ast.nodes:
+            signal = yield self.visit(node)
+            if signal is not None and signal.__class__ is not Value:   # not an expression
+                break
+        else:
+            signal = None
+        self.scopes.pop()
+        return signal
+
+    @visits((ASTType.CTRL, Keyword.IF))
+    def _eval_if(self, ast:AST):
+        cond = yield self.visit(ast.nodes[0])
+        if cond.val:
+            return (yield self.visit(ast.nodes[1]))
+        elif len(ast.nodes) == 3:
+            return (yield self.visit(ast.nodes[2]))
+
+    @visits((ASTType.CTRL, Keyword.WHILE))
+    def _eval_while(self, ast:AST):
+        while (yield self.visit(ast.nodes[0])).val:
+            signal = yield self.visit(ast.nodes[1])
+            if signal == Keyword.BREAK:
+                break
+            elif isinstance(signal, Return):
+                return signal
+
+    @visits((ASTType.CTRL, Keyword.FOR))
+    def _eval_for(self, ast:AST):
+        yield self.visit(ast.nodes[0])
+        while (yield self.visit(ast.nodes[1])).val:
+            signal = yield self.visit(ast.nodes[3])
+            if signal == Keyword.BREAK:
+                break
+            elif isinstance(signal, Return):
+                return signal
+            yield self.visit(ast.nodes[2])
+
+    @visits((ASTType.CTRL, Keyword.BREAK), (ASTType.CTRL, Keyword.CONTINUE))
+    def _eval_jump(self, ast:AST):
+        return ast.value
+
+    @visits((ASTType.CTRL, Keyword.RETURN))
+    def _eval_return(self, ast:AST):
+        if not ast.nodes:
+            return Return(Value(ValType.VOID, None))
+        return Return((yield self.visit(ast.nodes[0])))
+
+    @visits((ASTType.DECL, DeclNode.VARDECL))
+    def _eval_decl(self, ast:AST):
+        typename = ast.nodes[0].value
+
+        for elem in ast.nodes[1:]:
+            name_node = elem.nodes[0]
+            shape = []
+            for node in name_node.nodes:
+                shape.append(int((yield self.visit(node)).val))
+
+            # allocation is paid by steps, checked before allocating
+            size = 1
+            for s in shape:
+                if s < 0:
+                    raise EvalError('Negative array size')
+                size *= s
+            if size > self.steps:
+                raise EvalError('Step limit (%d) exceeded' % self.step_limit)
+            self.steps -= size
+
+            var = Variable(typename, tuple(shape))
+            self.scopes.declare(name_node.value.name, var)
+            if len(elem.nodes) == 1:
+                continue
+            elif not shape:
+                var.cells[0] = self._cast((yield self.visit(elem.nodes[1])), typename)
+            else:
+                inits = []
+                yield self._eval_init_list(elem.nodes[1], [], inits)
+                for coord, value in inits:
+                    var.cells[self._flat_index(var, self._expand_coord(coord, shape))] = self._cast(value, typename)
+
+    def _eval_init_list(self, ast:AST, coord, inits):
+        if ast.type != ASTType.LIST:
+            raise EvalError('Array must be initialized by list')
+        for i, node in enumerate(ast.nodes):
+            if node.type == ASTType.LIST:
+                yield self._eval_init_list(node, coord + [i], inits)
+            else:
+                inits.append((coord + [i], (yield self.visit(node))))
+
+    @staticmethod
+    def _expand_coord(coord, shape):
+        """ Full coordinate of an init list entry, as in Translater.
+        """
+        if len(coord) >= len(shape):
+            return coord
+        result = coord[:-1]
+        val, dim = coord[-1], shape[len(coord)-1:]
+        while len(dim) > 1:
+            result.append(val // dim[0])
+            val, dim = val % dim[0], dim[1:]
+        result.append(val)
+        return result
+
+    ## expressions
+
+    @visits(ASTType.VAL)
+    def _eval_val(self, ast:AST):
+        return ast.value
+
+    @visits(ASTType.NAME)
+    def _eval_name(self, ast:AST):
+        var = self._lookup(ast.value.name)
+        if var.shape:
+            raise EvalError('Array "%s" cannot be used as a value' % ast.value.name)
+        return self._read(var, 0)
+
+    @visits(ASTType.CALL)
+    def _eval_call(self, ast:AST):
+        if ast.nodes[0].type != ASTType.NAME:
+            raise EvalError('Not a function: %s' % ast.nodes[0].value)
+        args = []
+        for node in ast.nodes[1:]:
+            args.append((yield self.visit(node)))
+        return (yield self._call(ast.nodes[0].value.name, args))
+
+    @visits(ASTType.OP)
+    def _eval_op(self, ast:AST):
+        values = []
+        for node in ast.nodes:
+            values.append((yield self.visit(node)))
+        return eval_op(ast.value, *values)
+
+    @visits((ASTType.OP, Operator.LSUB))
+    def _eval_subscript(self, ast:AST):
+        var, idx = yield self._ref(ast)
+        return self._read(var, idx)
+
+    @visits(*[(ASTType.OP, op) for op in AssignEvalLoc])
+    def _eval_assign(self, ast:AST):
+        value = yield self.visit(ast.nodes[1])
+        var, idx = yield self._ref(ast.nodes[0])
+        operator = AssignEvalLoc[ast.value]
+        if operator is None:
+            var.cells[idx] = self._cast(value, var.type)
+            return value
+        else:
+            var.cells[idx] = self._cast(eval_op(operator, self._read(var, idx), self._cast(value, var.type)), var.type)
+            return var.cells[idx]
+
+    @visits(*[(ASTType.OP, op) for op in IncDecEvalLoc])
+    def _eval_incdec(self, ast:AST):
+        var, idx = yield self._ref(ast.nodes[0])
+        operator, ret_new = IncDecEvalLoc[ast.value]
+        old = self._read(var, idx)
+        var.cells[idx] = self._cast(eval_op(operator, old, Value(var.type, 1)), var.type)
+        return var.cells[idx] if ret_new else old
+
+    def _ref(self, ast:AST):
+        """ Returns (Variable, index of cell) of an lvalue.
+        """
+        coord = []
+        while ast.type == ASTType.OP and ast.value == Operator.LSUB:
+            coord.append(int((yield self.visit(ast.nodes[1])).val))
+            ast = ast.nodes[0]
+        if ast.type != ASTType.NAME:
+            raise EvalError('Expression is not assignable')
+        var = self._lookup(ast.value.name)
+        coord.reverse()
+        return var, self._flat_index(var, coord)
+
+    def _flat_index(self, var:Variable, coord):
+        if len(coord) != len(var.shape):
+            raise EvalError('Subscript does not match array shape')
+        idx = 0
+        for c, s in zip(coord, var.shape):
+            if c < 0 or c >= s:
+                raise EvalError('Array index out of range')
+            idx = idx * s + c
+        return idx
+
+    def _read(self, var:Variable, idx):
+        value = var.cells[idx]
+        if value is None:
+            raise EvalError('Variable is not initialized')
+        return value
@@ -6,8 +6,12 @@ class ReadError(RuntimeError):
     """
 
     def __init__(self, err):
+        self.err = err
         super().__init__('Reading error: %s' % err)
 
+    def __reduce__(self):
+        return (ReadError, (self.err,))
+
 
 class SynError(RuntimeError):
     """ General syntax error
@@ -16,9 +20,22 @@ class SynError(RuntimeError):
     def __init__(self, err, pos):
         self.err = err 
         self.pos = pos 
+        self.loc = None 
 
         super().__init__('SyntaxError at pos %d: ' % self.pos + self.err)
 
+    def locate(self, source_map):
+        """ Resolve pos into file/line/column with a preprocess.SourceMap.
+        """
+        if self.loc is None:
+            self.loc = source_map.lookup(self.pos)
+            if self.loc is not None:
+                self.args = ('SyntaxError at %s: ' % str(self.loc) + self.err,)
+
+    def __reduce__(self):
+        # keep resolved location when sent across processes
+        return (SynError, (self.err, self.pos), {'loc': self.loc, 'args': self.args})
+
 
 class ParseError(RuntimeError):
     """ Cannot recognize symbol.
@@ -35,4 +52,8 @@ class CompileError(RuntimeError):
 
     def __init__(self, err):
         super().__init__(err)
-        
\ No newline at end of file
+
+
+class EvalError(CompileError):
+    """ Expression cannot be evaluated at compile time
+    """
@@ -1,6 +1,10 @@
 """ Compile-time evaluation
+    Results follow the generated code: int / char wrap around like i32 / i8,
+    floats are rounded to single precision, and division truncates as in C.
 """
 
+import struct
+
 from .grammar.operators import Operator
 from .grammar.basic_types import ValType, Value
 
@@ -10,7 +14,39 @@ from .errors import CompileError
 def _cdiv(a, b):
     # c-style division
 
-    return a // b if isinstance(a, int) and isinstance(b, int) else a / b
+    if isinstance(a, int) and isinstance(b, int):
+        q = abs(a) // abs(b)
+        return q if (a < 0) == (b < 0) else -q
+    return a / b
+
+
+def _crem(a, b):
+    # c-style remainder: has the sign of the dividend
+
+    if isinstance(a, int) and isinstance(b, int):
+        return a - b * _cdiv(a, b)
+    return a - b * int(a / b)
+
+
+def _pow(a, b):
+    # integer power wraps around like csl.pow: computed modulo 2**32, the
+    # sign is restored by cast_value
+
+    if isinstance(a, int) and isinstance(b, int):
+        if b >= 0:
+            return pow(a, b, 1 << 32)
+        elif a == 1:
+            return 1
+        elif a == -1:
+            return -1 if b & 1 else 1
+        return 0
+    return a ** b
+
+
+def _as_int(a):
+    if not isinstance(a, int):
+        raise CompileError("Bitwise operation on float")
+    return a
 
 
 OpEvalLoc = {
@@ -18,50 +54,85 @@ OpEvalLoc = {
     Operator.SUB: lambda a, b: a - b,
     Operator.MUL: lambda a, b: a * b,
     Operator.DIV: _cdiv,
-    Operator.REM: lambda a, b: a % b,
-    Operator.POW: lambda a, b: a ** b,
+    Operator.REM: _crem,
+    Operator.POW: _pow,
 
+    Operator.PLUS: lambda a: a,
     Operator.MINUS: lambda a: -a,
 
-    Operator.AND: lambda a, b: a and b,
-    Operator.OR: lambda a, b: a or b,
-    Operator.XOR: lambda a, b: a ^ b,
-    Operator.NOT: lambda a: not a,
-
-    Operator.EQ: lambda a, b: a == b,
-    Operator.NE: lambda a, b: a != b,
-    Operator.LT: lambda a, b: a < b,
-    Operator.LE: lambda a, b: a <= b,
-    Operator.GT: lambda a, b: a > b,
-    Operator.GE: lambda a, b: a >= b,
+    Operator.AND: lambda a, b: _as_int(a) & _as_int(b),
+    Operator.OR: lambda a, b: _as_int(a) | _as_int(b),
+    Operator.XOR: lambda a, b: _as_int(a) ^ _as_int(b),
+    Operator.NOT: lambda a: int(not a),
+
+    Operator.EQ: lambda a, b: int(a == b),
+    Operator.NE: lambda a, b: int(a != b),
+    Operator.LT: lambda a, b: int(a < b),
+    Operator.LE: lambda a, b: int(a <= b),
+    Operator.GT: lambda a, b: int(a > b),
+    Operator.GE: lambda a, b: int(a >= b),
 }
 
 
+# Operators with bool result
+BoolOps = frozenset([Operator.EQ, Operator.NE, Operator.LT, Operator.LE, Operator.GT, Operator.GE, Operator.NOT])
+
+# Arithmetic operators: result is at least char
+ArithOps = frozenset(op for op in Operator if op.value < Operator.EQ.value)
+
+_RankLoc = {vtype: vtype.value for vtype in ValType}
+
+
+def cast_value(val, vtype:ValType):
+    """ Convert python number val to the representation of vtype.
+    """
+    if vtype is ValType.INT:
+        return ((int(val) + 0x80000000) & 0xffffffff) - 0x80000000
+
+    elif vtype is ValType.FLOAT:
+        return struct.unpack('f', struct.pack('f', float(val)))[0]
+
+    elif vtype is ValType.CHAR:
+        return ((int(val) + 0x80) & 0xff) - 0x80
+
+    elif vtype is ValType.BOOL:
+        return int(val) & 1
+
+    else:
+        raise CompileError("Need value type")
+
+
 def eval_op(op:Operator, lhs:Value, rhs=None):
+    """ Evaluate operator on values.
+        Raises CompileError if op cannot be evaluated, ZeroDivisionError on
+        division by zero.
+    """
 
-    if lhs.type == ValType.VOID or (rhs is not None and rhs.type == ValType.VOID):
+    rettype = lhs.type
+    if rettype is ValType.VOID or (rhs is not None and rhs.type is ValType.VOID):
         raise CompileError("Need value type")
 
-    if op.value >= Operator.EQ.value and op.value < Operator.LBRA.value: # boolean operators
+    if op in BoolOps:
         rettype = ValType.BOOL
 
-    elif rhs:
-        rettype = ValType(max(lhs.type.value, rhs.type.value))
-
     else:
-        rettype = lhs.type
-
-    if op.value < Operator.EQ.value:
-        rettype = ValType(max(rettype.value, ValType.CHAR.value))
+        if rhs is not None and _RankLoc[rhs.type] > _RankLoc[rettype]:
+            rettype = rhs.type
+        if rettype is ValType.BOOL and op in ArithOps:
+            rettype = ValType.CHAR
 
     try:
         evalfunc = OpEvalLoc[op]
     except KeyError:
         raise CompileError("Unrecognized operator: %s" % op)
 
-    if rhs is None:
-        
-        return Value(rettype, evalfunc(lhs.val))
-
-    else:
-        return Value(rettype, evalfunc(lhs.val, rhs.val))
+    try:
+        if rhs is None:
+            result = evalfunc(lhs.val)
+        else:
+            result = evalfunc(lhs.val, rhs.val)
+        if result.__class__ is complex:
+            raise CompileError("Cannot evaluate %s" % op)
+        return Value(rettype, cast_value(result, rettype))
+    except (OverflowError, ValueError):
+        raise CompileError("Overflow in constant expression")
@@ -98,7 +98,7 @@ OpAsnLoc = dict(zip(Operator, [
     0, 0, 0, 0, 0, 0,
     0, 0, 0, 0,
     0, 0, 1, 1,
-    1, 1, 1, 1, 1, 1,
+    1, 1, 1, 1, 1, 1, 1,
     0, 0
 ]))
 
@@ -1,4 +1,5 @@
 
-from .tac import Code, TAC, op2code
+from .tac import Code, TAC, op2code, CastCodes
 from .types import Pointer, Array
 from .memory import Block, MemoryLoc, Identifier, Register, Label
+from .cfg import CFG, BasicBlock, DomTree, Loop, natural_loops, TerminatorCodes
@@ -0,0 +1,490 @@
+""" Control flow graph of a function
+"""
+
+from .memory import Block, Label, Identifier, MemoryLoc, Register
+from .tac import Code, TAC
+
+
+# Codes ending a basic block
+TerminatorCodes = frozenset([Code.HLT, Code.RET, Code.BR])
+
+
+class BasicBlock:
+    """ Codes with a single entry and a single exit.
+        label: register index of the Label of the block (None if the block
+            is not a branch target);
+        codes: list of TAC, the terminator (if any) last;
+        preds / succs: lists of BasicBlock, a block appears once per edge;
+    """
+
+    def __init__(self, label=None, codes=None):
+        self.label = label
+        self.codes = codes if codes is not None else []
+        self.preds = []
+        self.succs = []
+
+    def terminator(self):
+        """ Returns the last code if it ends the block, else None.
+        """
+        if self.codes and self.codes[-1].code in TerminatorCodes:
+            return self.codes[-1]
+        return None
+
+    def __repr__(self):
+        return '<BasicBlock %r: %d codes>' % (self.label, len(self.codes))
+
+
+class CFG:
+    """ Basic blocks of a Block, in code order.
+        Blocks start at labels and after terminators; a block without a
+        terminator falls through to the next one.
+        Passes edit the codes of the blocks and keep the edges up to date
+        with add_edge() / remove_edge() / remove_block() / insert_block() /
+        merge();
+        write_back() stores the result into the function. The dominator tree
+        is updated in place by insert_block(), merge() and by removing
+        unreachable blocks, and recomputed on demand after other edge changes.
+    """
+
+    def __init__(self, function:Block):
+        self.function = function
+        self.blocks = []        # list of BasicBlock in code order
+        self._rpo = None
+        self._domtree = None
+
+        codes = function.codes
+        starts = set(function.labels)
+        starts.add(0)
+        for addr, code in enumerate(codes):
+            if code.code in TerminatorCodes:
+                starts.add(addr + 1)
+        starts = sorted(addr for addr in starts if addr < len(codes))
+
+        blockat = dict()    # code address ==> BasicBlock
+        for start, end in zip(starts, starts[1:] + [len(codes)]):
+            block = BasicBlock(function.labels.get(start), codes[start:end])
+            blockat[start] = block
+            self.blocks.append(block)
+
+        for idx, block in enumerate(self.blocks):
+            last = block.terminator()
+            if last is None:
+                if idx + 1 < len(self.blocks):
+                    self.add_edge(block, self.blocks[idx + 1])
+            elif last.code == Code.BR:
+                for target in self.branch_targets(last):
+                    self.add_edge(block, blockat[function.registers[target.addr].addr])
+
+    @property
+    def entry(self):
+        return self.blocks[0]
+
+    @staticmethod
+    def branch_targets(code:TAC):
+        """ Returns list of label identifiers a BR code jumps to.
+        """
+        return [code.first] if code.cond is None else [code.first, code.second]
+
+    def label_id(self, block:BasicBlock):
+        """ Returns identifier of the label of block, adding a label if
+            there is none.
+        """
+        if block.label is None:
+            block.label = len(self.function.registers)
+            self.function.registers.append(Label())
+        return Identifier(MemoryLoc.LOCAL, block.label)
+
+    # Structure updates
+
+    def add_edge(self, src:BasicBlock, dst:BasicBlock):
+        """ Record an edge src => dst. Codes are not changed.
+        """
+        src.succs.append(dst)
+        dst.preds.append(src)
+        self._domtree = None
+        self._rpo = None
+
+    def remove_edge(self, src:BasicBlock, dst:BasicBlock):
+        """ Remove an edge src => dst. Codes are not changed.
+        """
+        src.succs.remove(dst)
+        dst.preds.remove(src)
+        if src not in dst.preds:
+            self._drop_incoming(src, dst)
+        if not (self._domtree is not None and src not in self._domtree.idom):
+            self._domtree = None    # edges from unreachable blocks do not count
+        self._rpo = None
+
+    def remove_block(self, block:BasicBlock):
+        """ Remove block and its edges.
+        """
+        for succ in list(block.succs):
+            self.remove_edge(block, succ)
+        for pred in list(block.preds):
+            self.remove_edge(pred, block)
+        self.blocks.remove(block)
+        if self._domtree is not None:
+            self._domtree.discard(block)
+
+    def insert_block(self, block:BasicBlock, before:BasicBlock, preds):
+        """ Insert block in front of before (in code order too), taking over
+            the edges from preds to before; block ends with a branch to
+            before. Branches of preds are redirected to the label of block.
+            The dominator tree is updated if preds are reachable.
+        """
+        oldlabel = self.label_id(before)
+        newlabel = self.label_id(block)
+        if block.terminator() is None:
+            block.codes.append(TAC(Code.BR, None, oldlabel))
+
+        idx = self.blocks.index(before)
+        if idx > 0 and self.blocks[idx - 1] not in preds and self.blocks[idx - 1].terminator() is None:
+            # keep the previous block falling into before
+            self.blocks[idx - 1].codes.append(TAC(Code.BR, None, oldlabel))
+        self.blocks.insert(idx, block)
+
+        domtree = self._domtree
+        if domtree is not None and all(pred in domtree.idom for pred in preds):
+            others = [pred for pred in before.preds if pred not in preds and pred in domtree.idom]
+            takeover = all(domtree.dominates(before, pred) for pred in others)
+            newidom = domtree.idom[before] if takeover else domtree.common_dominator(preds)
+        else:
+            domtree = None
+
+        self._move_incoming(preds, block, before)
+        for pred in preds:
+            last = pred.terminator()
+            if last is not None and last.code == Code.BR:
+                if last.first.addr == oldlabel.addr:
+                    last.first = newlabel
+                if last.cond is not None and last.second.addr == oldlabel.addr:
+                    last.second = newlabel
+            while before in pred.succs:
+                pred.succs[pred.succs.index(before)] = block
+                before.preds.remove(pred)
+                block.preds.append(pred)
+        self.add_edge(block, before)
+
+        if domtree is not None:
+            # block dominates before iff the other entries of before are
+            # dominated by before (e.g. block is a loop preheader)
+            domtree.set_idom(block, newidom)
+            if takeover:
+                domtree.set_idom(before, block)
+            self._domtree = domtree
+        return block
+
+    def merge(self, block:BasicBlock, succ:BasicBlock):
+        """ Append succ to block, which must be its only predecessor and
+            jump to it unconditionally. The PHIs of succ must have been
+            replaced by their value.
+            The dominator tree is updated in place.
+        """
+        assert block.succs == [succ] and succ.preds == [block] and succ.terminator() is not None
+        block.codes[-1:] = succ.codes
+        self._rpo = None
+
+        if succ.label is not None and succ.succs:
+            newlabel = self.label_id(block)
+            for dst in set(succ.succs):
+                for code in dst.codes:
+                    if code.code != Code.PHI:
+                        break
+                    code.first = [(val, newlabel if label.addr == succ.label else label) for val, label in code.first]
+
+        block.succs = succ.succs
+        for dst in succ.succs:
+            dst.preds = [block if pred is succ else pred for pred in dst.preds]
+        succ.preds = []
+        succ.succs = []
+        self.blocks.remove(succ)
+
+        domtree = self._domtree
+        if domtree is not None:
+            for child in list(domtree.children[succ]):
+                domtree.set_idom(child, block)
+            domtree.discard(succ)
+
+    def _drop_incoming(self, src:BasicBlock, dst:BasicBlock):
+        """ Remove values coming from src in the PHIs of dst.
+        """
+        if src.label is None:
+            return
+        for code in dst.codes:
+            if code.code != Code.PHI:
+                break
+            code.first = [pair for pair in code.first if pair[1].addr != src.label]
+
+    def _move_incoming(self, preds, block:BasicBlock, before:BasicBlock):
+        """ Values coming from preds in the PHIs of before now come from
+            block: merged by a PHI in block if they differ.
+        """
+        labels = set(pred.label for pred in preds if pred.label is not None)
+        newlabel = Identifier(MemoryLoc.LOCAL, block.label)
+        phis = []
+        for code in before.codes:
+            if code.code != Code.PHI:
+                break
+            moved = [pair for pair in code.first if pair[1].addr in labels]
+            if not moved:
+                continue
+            kept = [pair for pair in code.first if pair[1].addr not in labels]
+            values = set((val.loc, val.addr) if isinstance(val, Identifier) else (val.type, val.val) for val, _ in moved)
+            if len(values) == 1:
+                value = moved[0][0]
+            else:
+                registers = self.function.registers
+                registers.append(Register(registers[code.ret.addr].type))
+                value = Identifier(MemoryLoc.LOCAL, len(registers) - 1)
+                phis.append(TAC(Code.PHI, value, moved))
+            code.first = kept + [(value, newlabel)]
+        block.codes[:0] = phis
+
+    def remove_unreachable(self):
+        """ Remove blocks not reachable from the entry.
+            Returns number of blocks removed.
+        """
+        reachable = set(self.rpo())
+        removed = [block for block in self.blocks if block not in reachable]
+        for block in removed:
+            for succ in list(block.succs):
+                succ.preds.remove(block)
+                if succ in reachable:
+                    self._drop_incoming(block, succ)
+            for pred in list(block.preds):
+                pred.succs.remove(block)
+            self.blocks.remove(block)
+        return len(removed)
+
+    # Analyses
+
+    def rpo(self):
+        """ Returns list of blocks reachable from the entry in reverse
+            postorder.
+        """
+        if self._rpo is None:
+            order = []
+            visited = {self.entry}
+            stack = [(self.entry, iter(self.entry.succs))]
+            while stack:
+                block, it = stack[-1]
+                for succ in it:
+                    if succ not in visited:
+                        visited.add(succ)
+                        stack.append((succ, iter(succ.succs)))
+                        break
+                else:
+                    stack.pop()
+                    order.append(block)
+            order.reverse()
+            self._rpo = order
+        return self._rpo
+
+    @property
+    def domtree(self):
+        """ Dominator tree of reachable blocks.
+        """
+        if self._domtree is None:
+            self._domtree = DomTree(self)
+        return self._domtree
+
+    def write_back(self):
+        """ Store the codes of the blocks into the function, and renumber its
+            registers.
+        """
+        codes = []
+        labels = dict()
+        for block in self.blocks:
+            if block.label is not None:
+                labels[len(codes)] = block.label
+            codes.extend(block.codes)
+        self.function.codes = codes
+        self.function.labels = labels
+        self.function.renumber()
+
+
+class Loop:
+    """ Natural loop.
+        header: BasicBlock dominating the loop;
+        blocks: set of BasicBlock in the loop, header included;
+        latches: list of blocks in the loop jumping to the header;
+        parent: innermost Loop containing this one, or None;
+    """
+
+    def __init__(self, header:BasicBlock):
+        self.header = header
+        self.blocks = {header}
+        self.latches = []
+        self.parent = None
+
+    def exits(self):
+        """ Returns list of blocks in the loop with a successor outside.
+        """
+        return [block for block in self.blocks if any(succ not in self.blocks for succ in block.succs)]
+
+    def preheader(self, cfg:CFG):
+        """ Returns the only block entering the loop, which only jumps to the
+            header; it is inserted first if there is none. Returns None if
+            the header is the entry of the function.
+        """
+        if self.header is cfg.entry:
+            return None
+        entries = [pred for pred in self.header.preds if pred not in self.blocks]
+        if len(set(entries)) == 1 and entries[0].succs == [self.header]:
+            return entries[0]
+        block = cfg.insert_block(BasicBlock(), self.header, list(set(entries)))
+        outer = self.parent
+        while outer is not None:
+            outer.blocks.add(block)
+            outer = outer.parent
+        return block
+
+
+def natural_loops(cfg:CFG):
+    """ Returns list of natural loops of reachable blocks, inner loops first.
+        Loops with the same header are merged.
+    """
+    domtree = cfg.domtree
+    loops = dict()      # header ==> Loop
+    for block in cfg.rpo():
+        for succ in block.succs:
+            if domtree.dominates(succ, block):
+                loop = loops.get(succ)
+                if loop is None:
+                    loop = loops[succ] = Loop(succ)
+                loop.latches.append(block)
+                stack = [block]
+                while stack:
+                    node = stack.pop()
+                    if node not in loop.blocks:
+                        loop.blocks.add(node)
+                        stack.extend(pred for pred in node.preds if pred in domtree.idom)
+    loops = sorted(loops.values(), key=lambda loop: len(loop.blocks))
+    for idx, loop in enumerate(loops):
+        loop.parent = next((outer for outer in loops[idx + 1:] if loop.header in outer.blocks), None)
+    return loops
+
+
+class DomTree:
+    """ Dominator tree, computed by the iterative algorithm of Cooper, Harvey
+        and Kennedy ("A Simple, Fast Dominance Algorithm").
+        idom: dict{block: immediate dominator (None for the entry)};
+        children: dict{block: list of blocks it immediately dominates};
+    """
+
+    def __init__(self, cfg:CFG):
+        order = cfg.rpo()
+        self.idom = dict()
+        self.children = dict()
+        self._pre = None        # dict{block: (preorder, last preorder of subtree)}
+
+        rpo = {block: i for i, block in enumerate(order)}
+        idom = {order[0]: order[0]}
+        changed = True
+        while changed:
+            changed = False
+            for block in order[1:]:
+                new_idom = None
+                for pred in block.preds:
+                    if pred not in idom:
+                        continue
+                    if new_idom is None:
+                        new_idom = pred
+                        continue
+                    a, b = pred, new_idom
+                    while a is not b:
+                        while rpo[a] > rpo[b]:
+                            a = idom[a]
+                        while rpo[b] > rpo[a]:
+                            b = idom[b]
+                    new_idom = a
+                if idom.get(block) is not new_idom:
+                    idom[block] = new_idom
+                    changed = True
+
+        for block in order:
+            self.children[block] = []
+        for block in order[1:]:
+            self.idom[block] = idom[block]
+            self.children[idom[block]].append(block)
+        self.idom[order[0]] = None
+
+    def preorder(self):
+        """ Returns list of blocks in preorder of the tree.
+        """
+        root = next(block for block, parent in self.idom.items() if parent is None)
+        order = []
+        stack = [root]
+        while stack:
+            block = stack.pop()
+            order.append(block)
+            stack.extend(reversed(self.children[block]))
+        return order
+
+    def dominates(self, a:BasicBlock, b:BasicBlock):
+        """ Whether every path from the entry to b goes through a.
+        """
+        if self._pre is None:
+            order = self.preorder()
+            self._pre = dict()
+            for i, block in enumerate(order):
+                self._pre[block] = [i, i]
+            for block in reversed(order):
+                parent = self.idom[block]
+                if parent is not None:
+                    self._pre[parent][1] = max(self._pre[parent][1], self._pre[block][1])
+        pa, pb = self._pre.get(a), self._pre.get(b)
+        return pa is not None and pb is not None and pa[0] <= pb[0] <= pa[1]
+
+    def common_dominator(self, blocks):
+        """ Returns the nearest block dominating all of blocks.
+        """
+        result = None
+        for block in blocks:
+            if result is None:
+                result = block
+                continue
+            ancestors = set()
+            while block is not None:
+                ancestors.add(block)
+                block = self.idom[block]
+            while result not in ancestors:
+                result = self.idom[result]
+        return result
+
+    def frontiers(self):
+        """ Returns dict{block: set of blocks in its dominance frontier}.
+        """
+        frontiers = {block: set() for block in self.idom}
+        for block in self.idom:
+            if len(block.preds) < 2:
+                continue
+            for pred in block.preds:
+                runner = pred
+                while runner in self.idom and runner is not self.idom[block]:
+                    frontiers[runner].add(block)
+                    runner = self.idom[runner]
+        return frontiers
+
+    # Incremental updates
+
+    def set_idom(self, block:BasicBlock, parent):
+        """ Make parent the immediate dominator of block.
+        """
+        old = self.idom.get(block)
+        if old is not None:
+            self.children[old].remove(block)
+        self.idom[block] = parent
+        self.children.setdefault(block, [])
+        if parent is not None:
+            self.children[parent].append(block)
+        self._pre = None
+
+    def discard(self, block:BasicBlock):
+        """ Drop an unreachable block.
+        """
+        if block in self.idom:
+            assert not self.children[block]
+            self.set_idom(block, None)
+            del self.idom[block]
+            del self.children[block]
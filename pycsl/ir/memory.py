@@ -30,6 +30,56 @@ class Block:
     def __init__(self):
         self.registers = [] # list of  Register instances
         self.codes = []     # list of IR instances
+        self.labels = {}    # dict{code address: index of Label in registers}
+        self.argnum = 0     # number of argument registers, which come first
+
+
+    def label_at(self, addr):
+        """ Returns the register index of the label pointing to addr,
+            adding the label if there is none.
+        """
+        idx = self.labels.get(addr)
+        if idx is None:
+            idx = self.labels[addr] = len(self.registers)
+            self.registers.append(Label(addr))
+        return idx
+
+    def renumber(self):
+        """ Number registers in order of definition, as LLVM requires:
+            arguments, then labels and code results in code order.
+            Registers not defined by a code are dropped. Used after a pass
+            rewrote codes, with labels mapping the new addresses to the
+            (old) register indices of the labels to keep.
+        """
+        registers = self.registers[:self.argnum]
+        regmap = {idx: idx for idx in range(self.argnum)}
+        labels = {}
+
+        for addr, code in enumerate(self.codes):
+            idx = self.labels.get(addr)
+            if idx is not None:
+                label = self.registers[idx]
+                label.addr = addr
+                regmap[idx] = labels[addr] = len(registers)
+                registers.append(label)
+            if code.ret is not None and code.ret.loc == MemoryLoc.LOCAL:
+                regmap[code.ret.addr] = len(registers)
+                registers.append(self.registers[code.ret.addr])
+
+        ids = [Identifier(MemoryLoc.LOCAL, idx) for idx in range(len(registers))]
+
+        def remap(id_or_val):
+            if isinstance(id_or_val, Identifier) and id_or_val.loc == MemoryLoc.LOCAL:
+                return ids[regmap[id_or_val.addr]]
+            return id_or_val
+
+        for code in self.codes:
+            code.map_operands(remap)
+            if code.ret is not None:
+                code.ret = remap(code.ret)
+
+        self.registers = registers
+        self.labels = labels
 
 
 class MemoryLoc(Enum):
@@ -25,6 +25,8 @@ class Code(Enum):
     OR = 17
     XOR = 18
     NOT = 19
+    SHL = 20
+    SHR = 21
 
     # Memory
     ALLOC = 30
@@ -55,39 +57,44 @@ class Code(Enum):
         return self.name.lower()
 
 
+OpCodeLoc = {
+    Operator.ADD: Code.ADD,
+    Operator.SUB: Code.SUB,
+    Operator.MUL: Code.MUL,
+    Operator.DIV: Code.DIV,
+    Operator.REM: Code.REM,
+    Operator.POW: Code.POW,
+    Operator.ASN: None,
+    Operator.ADDASN: Code.ADD,
+    Operator.SUBASN: Code.SUB,
+    Operator.MULASN: Code.MUL,
+    Operator.DIVASN: Code.DIV,
+    Operator.REMASN: Code.REM,
+    Operator.POWASN: Code.POW,
+    Operator.INC: Code.ADD,
+    Operator.DEC: Code.SUB,
+    Operator.POSTINC: Code.ADD,
+    Operator.POSTDEC: Code.SUB,
+    Operator.AND: Code.AND,
+    Operator.OR: Code.OR,
+    Operator.XOR: Code.XOR,
+    Operator.NOT: Code.NOT,
+    Operator.EQ: Code.EQ,
+    Operator.NE: Code.NE,
+    Operator.LT: Code.LT,
+    Operator.LE: Code.LE,
+    Operator.GT: Code.GT,
+    Operator.GE: Code.GE
+}
+
+
 def op2code(op:Operator):
 
-    ConvertTable = {
-        Operator.ADD: Code.ADD,
-        Operator.SUB: Code.SUB,
-        Operator.MUL: Code.MUL,
-        Operator.DIV: Code.DIV,
-        Operator.REM: Code.REM,
-        Operator.POW: Code.POW,
-        Operator.ASN: None,
-        Operator.ADDASN: Code.ADD,
-        Operator.SUBASN: Code.SUB,
-        Operator.MULASN: Code.MUL,
-        Operator.DIVASN: Code.DIV,
-        Operator.REMASN: Code.REM,
-        Operator.POWASN: Code.POW,
-        Operator.INC: Code.ADD,
-        Operator.DEC: Code.SUB,
-        Operator.POSTINC: Code.ADD,
-        Operator.POSTDEC: Code.SUB,
-        Operator.AND: Code.AND,
-        Operator.OR: Code.OR,
-        Operator.XOR: Code.XOR,
-        Operator.NOT: Code.NOT,
-        Operator.EQ: Code.EQ,
-        Operator.NE: Code.NE,
-        Operator.LT: Code.LT,
-        Operator.LE: Code.LE,
-        Operator.GT: Code.GT,
-        Operator.GE: Code.GE
-    }
-
-    return ConvertTable[op]
+    return OpCodeLoc[op]
+
+
+# Codes whose second component is a type
+CastCodes = frozenset([Code.EXT, Code.TRUNC, Code.ITOF, Code.FTOI, Code.ITOP, Code.PTOI, Code.BITC])
 
 
 class TAC:
@@ -103,6 +110,44 @@ class TAC:
         self.second = second 
         self.cond = cond 
 
+    def operands(self):
+        """ Returns list of values / identifiers read by the code, labels included.
+        """
+        code = self.code
+        if code == Code.ALLOC:
+            return []
+        elif code == Code.CALL:
+            return list(self.second)
+        elif code == Code.PHI:
+            return [x for pair in self.first for x in pair]
+        elif code == Code.GETPTR:
+            return [self.first] + list(self.second)
+        elif code in CastCodes:
+            return [self.first]
+        else:
+            return [x for x in (self.first, self.second, self.cond) if x is not None]
+
+    def map_operands(self, func):
+        """ Replace every operand x (see operands()) by func(x).
+        """
+        code = self.code
+        if code == Code.ALLOC:
+            return
+        elif code == Code.CALL:
+            self.second = [func(x) for x in self.second]
+        elif code == Code.PHI:
+            self.first = [(func(val), func(label)) for val, label in self.first]
+        elif code == Code.GETPTR:
+            self.first = func(self.first)
+            self.second = [func(x) for x in self.second]
+        else:
+            if self.first is not None:
+                self.first = func(self.first)
+            if self.second is not None and code not in CastCodes:
+                self.second = func(self.second)
+            if self.cond is not None:
+                self.cond = func(self.cond)
+
     def __str__(self):
         ret = ''
 
@@ -115,7 +160,9 @@ class TAC:
         if self.cond is not None:
             ret += (' %s' % str(self.cond))
 
-        if self.first is not None:
+        if self.code == Code.PHI:
+            ret += (''.join((' [%s %s]' % (str(val), str(label)) for val, label in self.first)))
+        elif self.first is not None:
             ret += (' %s' % str(self.first))
 
         if isinstance(self.second, list):
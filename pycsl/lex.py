@@ -2,6 +2,7 @@
 """
 
 import re 
+from array import array
 from collections import deque
 
 from .errors import SynError
@@ -15,6 +16,22 @@ from .tokens import Token, Symbol, TokenType
 from .util.ioutil import StrReader
 
 
+def _build_word_table():
+    """ Map every reserved word to its (TokenType, value) pair, so identifiers
+        are resolved by a single dict lookup.
+    """
+    table = {}
+    for word in keywords.ctrl_kwds:
+        table[word] = (TokenType.CTRL, KeywordLoc[word])
+    for word in keywords.def_kwds:
+        table[word] = (TokenType.DEF, KeywordLoc[word])
+    for word in typenames:
+        table[word] = (TokenType.TYPE, TypenameLoc[word])
+    for word in keywords.logic_kwds:
+        table[word] = (TokenType.OP, OpLoc[word])
+    return table
+
+
 class Lexer:
     
     """
@@ -26,7 +43,14 @@ class Lexer:
     function: {var}\\(
     operator: [+\\-\\*\\/\\=\\%\\^\\!\\:\\,\\.\\<\\>]+
     lineend:  ;
+
+    Two tokenizers are available. The single-pass one (default) matches all
+    the rules above with one named-group pattern and resolves keywords
+    through `WordLoc`; the legacy one tries each rule in turn. Both produce
+    the same tokens.
     """
+
+    SINGLE_PASS = True              # use the combined pattern instead of per-rule regexes
     
     re_ws = re.compile(r'[ \t\n]+')
     re_val = re.compile(r'(\d*[.])?(\d)+(e[+\-]?\d+)?')
@@ -40,10 +64,30 @@ class Lexer:
     re_kwd_logic = re.compile('|'.join(keywords.logic_kwds))
     re_kwd_sep = re.compile(r'[\{\}\,\:]')
 
+    # alternatives are tried in the same order as the legacy tokenizer
+    re_token = re.compile(r'''[ \t\n]*(?:
+        (?P<eol>;)
+        |(?P<val>(\d*[.])?(\d)+(e[+\-]?\d+)?)
+        |(?P<op>%s)
+        |(?P<sep>[\{\}\,\:])
+        |(?P<id>\w+)
+        |(?P<eof>\Z)
+    )''' % OperatorRe, re.VERBOSE)
 
-    def __init__(self):
+    # same patterns for bytes-like input (e.g. a preprocessed mmap)
+    re_token_b = re.compile(re_token.pattern.encode(), re.VERBOSE)
+    re_ws_b = re.compile(re_ws.pattern.encode())
+
+    WordLoc = _build_word_table()
+
+
+    def __init__(self, single_pass=None):
+        self.single_pass = Lexer.SINGLE_PASS if single_pass is None else single_pass
+        self.re_cur_token = self.re_token
+        self.re_cur_ws = self.re_ws
         self.reader = None 
         self.token_str = None 
+        self.token_start = 0
         self.token_buf = deque()
         self.next_get_pos = 0
         self.next_look_pos = 0
@@ -52,16 +96,23 @@ class Lexer:
         self.reader = None
         self.token_buf.clear()
         self.token_str = None
+        self.token_start = 0
         self.next_get_pos = self.next_look_pos = 0
 
     def load(self, ifile):
         """ Load an input.
             Args:
             --
-            ifile: string/file-like object
-            sym_table: dict-like object. If `None`, keep current sym_table.
+            ifile: string, or bytes-like object (mmap, bytes) of ascii source
         """
         self.clear()
+        if isinstance(ifile, str):
+            self.re_cur_token, self.re_cur_ws = self.re_token, self.re_ws
+        elif self.single_pass:
+            self.re_cur_token, self.re_cur_ws = self.re_token_b, self.re_ws_b
+        else:
+            ifile = bytes(ifile).decode()
+            self.re_cur_token, self.re_cur_ws = self.re_token, self.re_ws
         self.reader = StrReader(ifile)
         
     def get_token(self):
@@ -98,7 +149,49 @@ class Lexer:
         self.next_look_pos -= 1
 
     def fetch_token(self):
-        self.token_buf.append(self._fetch_token())
+        if self.single_pass:
+            self.token_buf.append(self._fetch_token_single())
+        else:
+            token = self._fetch_token()
+            token.pos = self.token_start
+            self.token_buf.append(token)
+
+    def _fetch_token_single(self):
+        """ Fetch a new token with one match of the combined pattern.
+        """
+        src = self.reader.obj
+        match_obj = self.re_cur_token.match(src, self.reader.pos())
+
+        if not match_obj:
+            self.unrecognized()
+
+        self.reader.seek(match_obj.end())
+        kind = match_obj.lastgroup
+        string = match_obj.group(kind)
+        if not isinstance(string, str):
+            string = string.decode()
+        start = self.token_start = match_obj.start(kind)
+
+        if kind == 'id':
+            word = self.WordLoc.get(string)
+            if word is not None:
+                return Token(word[0], word[1], start)
+            return Token(TokenType.NAME, Symbol(string), start)
+
+        elif kind == 'op':
+            return Token(TokenType.OP, OpLoc[string], start)
+
+        elif kind == 'val':
+            return Token(TokenType.VAL, Value.parse(string), start)
+
+        elif kind == 'eol':
+            return Token(TokenType.EOL, None, start)
+
+        elif kind == 'sep':
+            return Token(TokenType.SEP, SepLoc[string], start)
+
+        else:
+            return Token(TokenType.EOF, None, start)
 
     def _fetch_token(self): 
         """ Fetch a new token from string. 
@@ -108,6 +201,7 @@ class Lexer:
             return Token(TokenType.EOF, None)
 
         self.match(self.re_ws)
+        self.token_start = self.reader.pos()
 
         if self.reader.eof():
             return Token(TokenType.EOF, None)
@@ -138,11 +232,21 @@ class Lexer:
         
         else:
 
-            raise SynError('Unrecognized token: %s' % self.next_char, self.cur_pos())
+            self.unrecognized()
 
 
     def cur_pos(self):
-        return self.reader.pos()
+        """ Start offset of the last token fetched.
+        """
+        return self.token_start
+
+    def unrecognized(self):
+        """ Raise SynError for the character after whitespace at read position.
+        """
+        self.match(self.re_cur_ws)
+        pos = self.reader.pos()
+        char = self.reader.obj[pos:pos+1]
+        raise SynError('Unrecognized token: %s' % (char if isinstance(char, str) else bytes(char).decode(errors='replace')), pos)
 
     def match(self, regex):
         # if match succeed. iter+=span, self.token_str changed, return True. else return False
@@ -154,4 +258,125 @@ class Lexer:
             return True 
         else:
             return False 
-            
\ No newline at end of file
+            
+
+class TokenArray(Lexer):
+
+    """ Token store lexing the whole input up front.
+
+    Tokens are kept in parallel arrays: type codes (`types`), indexes into
+    the table of distinct tokens (`values`) and start offsets (`offsets`).
+    Each distinct token -- and so each distinct name -- exists only once in
+    `table`, and `get_token()` hands out those shared instances by index.
+    """
+
+    def __init__(self):
+        super().__init__(True)
+        self.types = array('B')     # TokenType.value of each token
+        self.values = array('L')    # index into self.table
+        self.offsets = array('L')   # start offset of each token
+        self.table = []             # list [Token]; one per distinct token
+        self.token_ids = {}         # dict{(TokenType, key): index in self.table}
+        self.symbols = {}           # dict{name: Symbol}
+        self.index = 0
+        self.look_index = 0
+
+    def clear(self):
+        super().clear()
+        del self.types[:]
+        del self.values[:]
+        del self.offsets[:]
+        self.table.clear()
+        self.token_ids.clear()
+        self.symbols.clear()
+        self.index = self.look_index = 0
+
+    def load(self, ifile):
+        """ Load an input and tokenize it completely.
+        """
+        super().load(ifile)
+        self.tokenize()
+        self.reader = None  # source is no longer needed
+
+    def tokenize(self):
+        src = self.reader.obj
+        scanner = self.re_cur_token.scanner(src)
+        types, values, offsets = self.types, self.values, self.offsets
+        token_ids = self.token_ids
+        intern = self.intern
+        end = 0
+
+        while True:
+            match_obj = scanner.match()
+            if not match_obj:
+                self.reader.seek(end)
+                self.unrecognized()
+            end = match_obj.end()
+
+            kind = match_obj.lastgroup
+            string = match_obj.group(kind)
+            key = (kind, string)
+            tid = token_ids.get(key)
+            if tid is None:
+                tid = token_ids[key] = intern(kind, string)
+
+            types.append(self.table[tid].tp.value)
+            values.append(tid)
+            offsets.append(match_obj.start(kind))
+
+            if kind == 'eof':
+                break
+
+    def intern(self, kind, string):
+        """ Create the shared token for a lexeme. Returns its index in table.
+        """
+        if not isinstance(string, str):
+            string = string.decode()
+
+        if kind == 'id':
+            word = self.WordLoc.get(string)
+            if word is not None:
+                token = Token(*word)
+            else:
+                token = Token(TokenType.NAME, self.symbols.setdefault(string, Symbol(string)))
+        elif kind == 'op':
+            token = Token(TokenType.OP, OpLoc[string])
+        elif kind == 'val':
+            token = Token(TokenType.VAL, Value.parse(string))
+        elif kind == 'eol':
+            token = Token(TokenType.EOL, None)
+        elif kind == 'sep':
+            token = Token(TokenType.SEP, SepLoc[string])
+        else:
+            token = Token(TokenType.EOF, None)
+
+        self.table.append(token)
+        return len(self.table) - 1
+
+    def get_token(self):
+        # EOF is sticky, as in Lexer
+        idx = min(self.index, len(self.values) - 1)
+        self.index = self.look_index = idx + 1
+        return self.table[self.values[idx]]
+
+    def get_all(self):
+        out_buf = [self.table[self.values[i]] for i in range(self.index, self.look_index)]
+        self.index = self.look_index
+        return out_buf
+
+    def look_ahead(self):
+        idx = min(self.look_index, len(self.values) - 1)
+        self.look_index += 1
+        return self.table[self.values[idx]]
+
+    def unlook_ahead(self):
+        assert self.look_index > self.index, "Cannot unlook"
+        self.look_index -= 1
+
+    def cur_pos(self):
+        """ Start offset of the last token fetched.
+        """
+        return self.offsets[min(self.index, len(self.offsets)) - 1] if self.index else 0
+
+    def __len__(self):
+        return len(self.values)
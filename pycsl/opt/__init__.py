@@ -0,0 +1,9 @@
+from .fold import ConstantFolder, fold_constants
+from .passes import IRPass, PassLoc, DefaultPasses, register_pass, run_passes
+from .mem2reg import Mem2Reg
+from .dce import DeadCodeElimination
+from .peephole import LoadStoreForwarding
+from .gvn import GlobalValueNumbering
+from .licm import LoopInvariantCodeMotion
+from .strength import StrengthReduction
+from .inline import FunctionInlining
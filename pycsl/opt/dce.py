@@ -0,0 +1,126 @@
+""" Dead code elimination.
+"""
+
+from ..grammar.basic_types import Value
+from ..ir import Block, Code, TAC, Identifier, MemoryLoc, CFG
+
+from .passes import IRPass, register_pass
+
+
+# Codes that must be kept even if their result is unused
+SideEffectCodes = frozenset([Code.HLT, Code.RET, Code.BR, Code.INVOKE, Code.STORE, Code.CALL])
+
+
+@register_pass
+class DeadCodeElimination(IRPass):
+    """ Remove code that cannot run or whose result is unused:
+        - branches on a value are replaced by a jump;
+        - unreachable blocks are removed;
+        - a block is merged into its predecessor when it is the only
+          successor of that predecessor, which is its only predecessor;
+        - codes without side effects whose result is never used are
+          removed, as are variables that are only stored to.
+    """
+
+    name = 'dce'
+
+    def run(self, function:Block):
+        cfg = CFG(function)
+        ncodes = len(function.codes)
+
+        for block in cfg.blocks:
+            last = block.terminator()
+            if last is not None and last.code == Code.BR and isinstance(last.cond, Value):
+                target, other = (last.first, last.second) if last.cond.val else (last.second, last.first)
+                block.codes[-1] = TAC(Code.BR, None, target)
+                cfg.remove_edge(block, next(succ for succ in block.succs if succ.label == other.addr))
+                self.count('branches folded')
+
+        self.count('blocks removed', cfg.remove_unreachable())
+        replaced = self._merge_blocks(cfg)
+        if replaced:
+            def resolve(x):
+                if isinstance(x, Identifier) and x.loc == MemoryLoc.LOCAL:
+                    return replaced.get(x.addr, x)
+                return x
+
+            for block in cfg.blocks:
+                for code in block.codes:
+                    code.map_operands(resolve)
+
+        self._remove_dead_codes(cfg)
+        cfg.write_back()
+        self.count('codes removed', ncodes - len(function.codes))
+
+    def _merge_blocks(self, cfg:CFG):
+        """ Merge straight-line chains of blocks.
+            Returns dict{register index of PHI removed: its value}
+        """
+        replaced = dict()
+        for block in list(cfg.blocks):
+            if block not in cfg.blocks:
+                continue
+            while len(block.succs) == 1:
+                succ = block.succs[0]
+                if succ is block or succ is cfg.entry or len(succ.preds) != 1 or succ.terminator() is None:
+                    break
+                last = block.terminator()
+                if last is None or last.code != Code.BR:
+                    break
+                while succ.codes[0].code == Code.PHI:
+                    phi = succ.codes.pop(0)
+                    replaced[phi.ret.addr] = phi.first[0][0]
+                cfg.merge(block, succ)
+                self.count('blocks merged')
+
+        # a PHI can be replaced by another one
+        for key, val in replaced.items():
+            while isinstance(val, Identifier) and val.loc == MemoryLoc.LOCAL and val.addr in replaced:
+                val = replaced[val.addr]
+            replaced[key] = val
+        return replaced
+
+    def _remove_dead_codes(self, cfg:CFG):
+        """ Remove codes without side effect whose result is not used, by
+            marking the codes needed by the ones with side effects.
+        """
+        defs = dict()       # register index ==> code defining it
+        stored = dict()     # register index of ALLOC ==> STOREs into it, if it is only stored to
+        for block in cfg.blocks:
+            for code in block.codes:
+                if code.ret is not None:
+                    defs[code.ret.addr] = code
+                    if code.code == Code.ALLOC:
+                        stored[code.ret.addr] = []
+
+        for block in cfg.blocks:
+            for code in block.codes:
+                operands = code.operands()
+                if code.code == Code.STORE:
+                    if isinstance(code.second, Identifier) and code.second.addr in stored:
+                        stored[code.second.addr].append(code)
+                    operands = operands[:1]
+                for x in operands:
+                    if isinstance(x, Identifier) and x.loc == MemoryLoc.LOCAL:
+                        stored.pop(x.addr, None)
+
+        deadstores = set(code for codes in stored.values() for code in codes)
+        live = set()
+        worklist = []
+        for block in cfg.blocks:
+            for code in block.codes:
+                if code.code in SideEffectCodes and code not in deadstores:
+                    live.add(code)
+                    worklist.append(code)
+
+        while worklist:
+            for x in worklist.pop().operands():
+                if isinstance(x, Identifier) and x.loc == MemoryLoc.LOCAL:
+                    code = defs.get(x.addr)
+                    if code is not None and code not in live:
+                        live.add(code)
+                        worklist.append(code)
+
+        self.count('stores removed', len(deadstores))
+        for block in cfg.blocks:
+            block.codes = [code for code in block.codes if code in live]
@@ -0,0 +1,300 @@
+""" Constant folding and propagation on the AST.
+"""
+
+from ..grammar.operators import Operator
+from ..grammar.basic_types import ValType, Value
+
+from ..ast import AST, ASTType, DeclNode
+from ..errors import CompileError
+from ..ctfe import Evaluator
+from ..symtable import ScopedSymbolTable
+from ..evalute import eval_op, cast_value
+from ..translate import AssignOps, IncDecOps, BinaryOps
+from ..util.trampoline import trampoline
+from ..visitor import Visitor, visits
+
+
+# Operators folded when every operand is a value
+FoldOps = BinaryOps + [Operator.PLUS, Operator.MINUS, Operator.NOT]
+
+# Operators whose result has the type of their first operand
+TargetTypedOps = AssignOps + IncDecOps + [Operator.LSUB, Operator.PLUS, Operator.MINUS]
+
+# Operators reassociated over int constants: operator ==> chain kind
+LinearOps = {
+    Operator.ADD: Operator.ADD,
+    Operator.SUB: Operator.ADD,
+    Operator.MUL: Operator.MUL,
+}
+
+
+def assigned_names(root:AST):
+    """ Returns set of names that are target of an assignment / inc / dec.
+    """
+    targets = set(AssignOps + IncDecOps)
+    names = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.type == ASTType.OP and node.value in targets and node.nodes[0].type == ASTType.NAME:
+            names.add(node.nodes[0].value.name)
+        stack.extend(node.nodes)
+    return names
+
+
+class ConstantFolder(Visitor):
+    """ Fold constant subtrees of an AST before translation.
+        - operators on values are evaluated by evalute.eval_op (unary chains,
+          parentheses, global initializers, array sizes);
+        - scalar globals with a constant initializer that are never assigned
+          are replaced by their value, unless shadowed;
+        - int +, -, * chains like (x + 1) + 2 are reassociated into x + 3;
+        - calls of functions without side effects on values are evaluated by
+          ctfe.Evaluator, within CALL_STEP_LIMIT steps.
+        The tree is not modified: changed nodes are copied, unchanged subtrees
+        are shared with the input (which may be held by the AST cache).
+        Handlers are generators run by util.trampoline; they return
+        (new node, ValType of the node or None if unknown).
+    """
+
+    REASSOCIATE = True      # reassociate int +, -, * chains with constants
+    CALL_STEP_LIMIT = 1 << 14   # step limit of calls evaluated (0: do not evaluate calls)
+
+    def __init__(self):
+        super().__init__()
+
+        self.removed = 0        # number of AST nodes removed
+        self.propagated = 0     # number of global variable reads replaced by values
+
+        self.scopes = ScopedSymbolTable()   # name ==> (ValType, Value or None)
+        self.functypes = {}     # dict{function name: return ValType or None}
+        self.assigned = set()   # names assigned anywhere
+        self.linear = {}        # dict{node: (chain kind, operand, int constant)}
+        self.evaluator = Evaluator()
+        self.evaluator.step_limit = ConstantFolder.CALL_STEP_LIMIT
+
+    def fold(self, ast:AST):
+        """ Returns the folded tree of ROOT node ast.
+        """
+        assert ast.type == ASTType.ROOT
+
+        self.assigned = assigned_names(ast)
+        self.functypes.clear()
+        for node in ast.nodes:
+            if node.type == ASTType.FUNC:
+                decl = node.nodes[0]
+                name = decl.nodes[0].value.name
+                rettype = decl.nodes[2].value if len(decl.nodes) == 3 else ValType.VOID
+                if self.functypes.get(name, rettype) != rettype:
+                    rettype = None
+                self.functypes[name] = rettype
+
+        if ConstantFolder.CALL_STEP_LIMIT:
+            self.evaluator.add_functions(ast)
+
+        self.scopes.push()
+        try:
+            return trampoline(self.visit(ast))[0]
+        finally:
+            self.scopes.clear()
+            self.linear.clear()
+
+    def generic_visit(self, ast:AST):
+        """ Fold all children.
+        """
+        nodes = yield self._fold_nodes(ast.nodes)
+        return self._copy(ast, nodes), None
+
+    @visits(ASTType.BLOCK)
+    def _fold_block(self, ast:AST):
+        self.scopes.push()
+        nodes = yield self._fold_nodes(ast.nodes)
+        self.scopes.pop()
+        return self._copy(ast, nodes), None
+
+    @visits(ASTType.FUNC)
+    def _fold_function(self, ast:AST):
+        if len(ast.nodes) == 1:     # declaration only
+            return ast, None
+
+        self.scopes.push()
+        for arg_node in ast.nodes[0].nodes[1].nodes:
+            argtype = arg_node.nodes[1].value if len(arg_node.nodes) == 2 else None
+            self.scopes.declare(arg_node.nodes[0].value.name, (argtype, None))
+
+        block, _ = yield self.visit(ast.nodes[1])
+        self.scopes.pop()
+        return self._copy(ast, [ast.nodes[0], block]), None
+
+    @visits((ASTType.DECL, DeclNode.VARDECL))
+    def _fold_decl(self, ast:AST):
+        """ Fold array sizes and initializers, and register the variables.
+            A local is registered before its initializer is folded, as in
+            Translater.
+        """
+        typename = ast.nodes[0].value
+        isglobal = len(self.scopes) == 1
+        nodes = [ast.nodes[0]]
+
+        for elem in ast.nodes[1:]:
+            name_node = elem.nodes[0]
+            varname = name_node.value.name
+
+            if not isglobal:
+                self.scopes.declare(varname, (typename, None))
+
+            shape = yield self._fold_nodes(name_node.nodes)
+            elem_nodes = [self._copy(name_node, shape)]
+            if len(elem.nodes) > 1:
+                init, _ = yield self.visit(elem.nodes[1])
+                elem_nodes.append(init)
+            nodes.append(self._copy(elem, elem_nodes))
+
+            if isglobal:
+                value = None
+                if not name_node.nodes and varname not in self.assigned and typename != ValType.VOID:
+                    if len(elem_nodes) == 1:
+                        value = Value(typename, cast_value(0, typename))
+                    elif elem_nodes[1].type == ASTType.VAL and elem_nodes[1].value.type != ValType.VOID:
+                        value = Value(typename, cast_value(elem_nodes[1].value.val, typename))
+                self.scopes.declare(varname, (typename, value))
+
+        return self._copy(ast, nodes), None
+
+    @visits(ASTType.VAL)
+    def _fold_val(self, ast:AST):
+        return ast, ast.value.type
+
+    @visits(ASTType.NAME)
+    def _fold_name(self, ast:AST):
+        """ Replace a constant global by its value.
+        """
+        vartype, value = self.scopes.lookup(ast.value.name, (None, None))
+        if value is None:
+            return ast, vartype
+        self.propagated += 1
+        return AST(ASTType.VAL, value), vartype
+
+    @visits(ASTType.CALL)
+    def _fold_call(self, ast:AST):
+        """ Evaluate a call of a function without side effects on values.
+        """
+        args = yield self._fold_nodes(ast.nodes[1:])
+        if ast.nodes[0].type != ASTType.NAME:
+            return self._copy(ast, [ast.nodes[0]] + args), None
+
+        funcname = ast.nodes[0].value.name
+        if all(node.type == ASTType.VAL for node in args) and funcname in self.evaluator.overloads:
+            try:
+                value = self.evaluator.call(funcname, [node.value for node in args])
+            except CompileError:
+                pass
+            else:
+                if value.type != ValType.VOID:
+                    self.removed += len(args) + 1
+                    return AST(ASTType.VAL, value), value.type
+
+        return self._copy(ast, [ast.nodes[0]] + args), self.functypes.get(funcname)
+
+    @visits(ASTType.OP)
+    def _fold_op(self, ast:AST):
+        operator = ast.value
+        nodes = []
+        types = []
+        for node in ast.nodes:
+            node, nodetype = yield self.visit(node)
+            nodes.append(node)
+            types.append(nodetype)
+
+        if operator in TargetTypedOps:
+            rettype = types[0]
+        elif operator.value >= Operator.EQ.value and operator.value <= Operator.GE.value:
+            rettype = ValType.BOOL
+        elif operator in BinaryOps and None not in types:
+            rettype = ValType(max(t.value for t in types))
+        else:
+            rettype = None
+
+        if operator in FoldOps and all(node.type == ASTType.VAL for node in nodes):
+            try:
+                value = eval_op(operator, *(node.value for node in nodes))
+            except (CompileError, ZeroDivisionError):
+                pass
+            else:
+                self.removed += len(nodes)
+                return AST(ASTType.VAL, value), value.type
+
+        if operator == Operator.PLUS:
+            self.removed += 1
+            return nodes[0], rettype
+
+        if operator in LinearOps and types == [ValType.INT, ValType.INT] and ConstantFolder.REASSOCIATE:
+            folded = self._reassociate(ast, nodes)
+            if folded is not None:
+                return folded, ValType.INT
+
+        return self._copy(ast, nodes), rettype
+
+    def _reassociate(self, ast:AST, nodes):
+        """ Fold (e op1 c1) op2 c2 of the same chain kind into e op (c1 op c2).
+            Int arithmetic wraps, so + and * are associative.
+            Returns the new node, or None if ast is not e op c.
+        """
+        operator = ast.value
+        kind = LinearOps[operator]
+        if nodes[1].type == ASTType.VAL:
+            operand, const = nodes[0], nodes[1].value.val
+            if operator == Operator.SUB:
+                const = -const
+        elif nodes[0].type == ASTType.VAL and operator != Operator.SUB:
+            operand, const = nodes[1], nodes[0].value.val
+        else:
+            return None
+
+        inner = self.linear.get(operand)
+        if inner is None or inner[0] != kind:
+            node = self._copy(ast, nodes)
+            self.linear[node] = (kind, operand, const)
+            return node
+
+        _, operand, inner_const = inner
+        const = cast_value(inner_const + const if kind == Operator.ADD else inner_const * const, ValType.INT)
+        self.removed += 2
+
+        # operand of a chain is int, so it can stand for itself
+        if kind == Operator.ADD and const == 0 or kind == Operator.MUL and const == 1:
+            self.removed += 2
+            return operand
+
+        if kind == Operator.ADD and const < 0 and const != cast_value(-const, ValType.INT):
+            node = AST(ASTType.OP, Operator.SUB, [operand, AST(ASTType.VAL, Value(ValType.INT, -const))])
+        else:
+            node = AST(ASTType.OP, kind, [operand, AST(ASTType.VAL, Value(ValType.INT, const))])
+
+        self.linear[node] = (kind, operand, const)
+        return node
+
+    def _fold_nodes(self, nodes):
+        """ Returns list of folded nodes.
+        """
+        result = []
+        for node in nodes:
+            node, _ = yield self.visit(node)
+            result.append(node)
+        return result
+
+    def _copy(self, ast:AST, nodes):
+        """ Returns ast if nodes are its children, else a copy with nodes.
+        """
+        if len(nodes) == len(ast.nodes) and all(a is b for a, b in zip(nodes, ast.nodes)):
+            return ast
+        node = AST(ast.type, ast.value, nodes)
+        node.attr = ast.attr
+        return node
+
+
+def fold_constants(ast:AST):
+    """ Returns (folded tree of ROOT node ast, number of nodes removed).
+    """
+    folder = ConstantFolder()
+    return folder.fold(ast), folder.removed
@@ -0,0 +1,139 @@
+""" Global value numbering.
+"""
+
+from ..ir import Block, Code, Identifier, MemoryLoc, CFG, CastCodes
+from ..symtable import ScopedSymbolTable
+
+from .passes import IRPass, register_pass
+
+
+# Codes computing a value from their operands only
+PureCodes = frozenset([
+    Code.ADD, Code.SUB, Code.MUL, Code.DIV, Code.REM, Code.POW,
+    Code.AND, Code.OR, Code.XOR, Code.NOT, Code.SHL, Code.SHR,
+    Code.EQ, Code.NE, Code.LT, Code.LE, Code.GT, Code.GE,
+    Code.GETPTR,
+]) | CastCodes
+
+# Codes whose operands can be swapped
+CommutativeCodes = frozenset([Code.ADD, Code.MUL, Code.AND, Code.OR, Code.XOR, Code.EQ, Code.NE])
+
+# Codes that may write memory
+ClobberCodes = frozenset([Code.STORE, Code.CALL, Code.INVOKE])
+
+
+def _key(x):
+    """ Hashable key of a value / identifier.
+    """
+    if isinstance(x, Identifier):
+        return (x.loc, x.addr)
+    return (x.type, x.val)
+
+
+@register_pass
+class GlobalValueNumbering(IRPass):
+    """ Reuse values computed in a dominating block.
+        Codes are numbered by (code, operands) over a walk of the dominator
+        tree, so a pure code (arithmetic, comparison, cast, GETPTR) is
+        replaced by an identical one dominating it. Loads are numbered with
+        the memory generation, which changes at every STORE or CALL and at
+        blocks with other entries than their dominator; a STORE makes its
+        value known for the next loads of the address. A PHI merging a
+        single value is replaced by the value.
+    """
+
+    name = 'gvn'
+
+    def run(self, function:Block):
+        cfg = CFG(function)
+        cfg.remove_unreachable()
+        children = cfg.domtree.children
+        table = ScopedSymbolTable()     # expression key ==> value
+        replaced = dict()   # register index ==> value
+        generation = 0
+        changed = False
+
+        def resolve(x):
+            if isinstance(x, Identifier) and x.loc == MemoryLoc.LOCAL:
+                return replaced.get(x.addr, x)
+            return x
+
+        # entries: (block, memory generation at its entry) or (None, None) to leave
+        stack = [(cfg.entry, generation)]
+        while stack:
+            block, gen = stack.pop()
+            if block is None:
+                table.pop()
+                continue
+            table.push()
+
+            result = []
+            for code in block.codes:
+                code.map_operands(resolve)
+
+                if code.code == Code.PHI:
+                    values = set(_key(val) for val, _ in code.first if not _same_reg(val, code.ret))
+                    if len(values) == 1:
+                        value = next(val for val, _ in code.first if not _same_reg(val, code.ret))
+                        replaced[code.ret.addr] = value
+                        self.count('phis removed')
+                        continue
+
+                elif code.code in PureCodes:
+                    operands = tuple(_key(x) for x in code.operands())
+                    if code.code in CommutativeCodes:
+                        operands = tuple(sorted(operands, key=repr))
+                    if code.code in CastCodes:
+                        operands += (code.second,)
+                    key = (code.code,) + operands
+                    value = table.lookup(key)
+                    if value is not None:
+                        replaced[code.ret.addr] = value
+                        self.count('codes removed')
+                        continue
+                    table.declare(key, code.ret)
+
+                elif code.code == Code.LOAD:
+                    key = (Code.LOAD, _key(code.first), gen)
+                    value = table.lookup(key)
+                    if value is not None:
+                        replaced[code.ret.addr] = value
+                        self.count('loads removed')
+                        continue
+                    table.declare(key, code.ret)
+
+                elif code.code in ClobberCodes:
+                    generation += 1
+                    gen = generation
+                    if code.code == Code.STORE:
+                        table.declare((Code.LOAD, _key(code.second), gen), code.first)
+
+                result.append(code)
+
+            if len(result) != len(block.codes):
+                block.codes = result
+                changed = True
+
+            stack.append((None, None))
+            for child in children[block]:
+                if child.preds == [block]:
+                    stack.append((child, gen))
+                else:
+                    # memory may be changed on the other paths to child
+                    generation += 1
+                    stack.append((child, generation))
+
+        if changed:
+            # PHIs can use values of blocks visited later
+            for key, val in replaced.items():
+                while isinstance(val, Identifier) and val.loc == MemoryLoc.LOCAL and val.addr in replaced:
+                    val = replaced[val.addr]
+                replaced[key] = val
+            for block in cfg.blocks:
+                for code in block.codes:
+                    code.map_operands(resolve)
+            cfg.write_back()
+
+
+def _same_reg(x, reg:Identifier):
+    return isinstance(x, Identifier) and x.loc == reg.loc and x.addr == reg.addr
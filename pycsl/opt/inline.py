@@ -0,0 +1,163 @@
+""" Function inlining.
+"""
+
+import copy
+
+from ..grammar.basic_types import ValType
+from ..ir import Block, Code, TAC, Identifier, MemoryLoc, Label, TerminatorCodes
+
+from .passes import IRPass, register_pass
+
+
+@register_pass
+class FunctionInlining(IRPass):
+    """ Replace calls to small functions by the code of the callee.
+        A callee is inlined if it has at most MaxInlineCodes codes and
+        cannot call the caller back, directly or through other functions.
+        Registers and labels of the callee are copied into the caller,
+        arguments are replaced by the values passed, and every RET becomes
+        a branch to the code after the call, where a PHI merges the values
+        returned. ALLOCs of the callee are moved to the entry of the caller,
+        so mem2reg can promote them (and no stack is allocated in a loop).
+    """
+
+    name = 'inline'
+    MaxInlineCodes = 30     # largest callee inlined, in codes
+
+    def __init__(self, translater):
+        super().__init__(translater)
+        self.signatures = {id(translater.functions[idx]): sig
+            for sig, idx in translater.function_table.items() if idx is not None}
+        self.reachable = dict()     # signature ==> set of signatures it may call
+
+    def run(self, function:Block):
+        caller = self.signatures.get(id(function))
+        codes = []
+        labels = dict()     # new code address ==> label register index
+        allocs = []         # ALLOCs moved to the entry
+        moved = dict()      # label of a block with a call ==> label of its last part
+        curlabel = None     # label of the current block of function
+        inlined = False
+
+        for addr, code in enumerate(function.codes):
+            if addr in function.labels:
+                if len(codes) in labels:
+                    # the block after an inlined call is empty
+                    codes.append(TAC(Code.BR, None, Identifier(MemoryLoc.LOCAL, function.labels[addr])))
+                labels[len(codes)] = function.labels[addr]
+                curlabel = function.labels[addr]
+            callee = self._callee(code, caller)
+            if callee is None:
+                codes.append(code)
+                continue
+            after = self._inline(function, code, callee, codes, labels, allocs)
+            if curlabel is not None:
+                moved[curlabel] = after
+            self.count('calls inlined')
+            inlined = True
+
+        if inlined:
+            # successors are now entered from the block after the last call
+            for code in codes:
+                if code.code == Code.PHI:
+                    code.first = [(val, moved.get(label.addr, label)) for val, label in code.first]
+            labels = {(addr + len(allocs) if addr > 0 else addr): idx for addr, idx in labels.items()}
+            function.codes = allocs + codes
+            function.labels = labels
+            function.renumber()
+
+    def _callee(self, code:TAC, caller):
+        """ Returns the Block to inline at code, or None.
+        """
+        if code.code != Code.CALL:
+            return None
+        idx = self.translater.function_table.get(code.first)
+        if idx is None:
+            return None     # declared only
+        callee = self.translater.functions[idx]
+        if len(callee.codes) > self.MaxInlineCodes:
+            return None
+        if code.ret is not None and code.first[2] == ValType.VOID:
+            return None
+        if not any(c.code == Code.RET for c in callee.codes):
+            return None
+        if caller is None or caller == code.first or caller in self._reachable(code.first):
+            self.count('recursive calls kept')
+            return None
+        return callee
+
+    def _reachable(self, signature):
+        """ Returns set of signatures of the functions signature may call,
+            directly or not.
+        """
+        result = self.reachable.get(signature)
+        if result is None:
+            result = set()
+            stack = [signature]
+            while stack:
+                idx = self.translater.function_table.get(stack.pop())
+                if idx is None:
+                    continue
+                for code in self.translater.functions[idx].codes:
+                    if code.code == Code.CALL and code.first not in result:
+                        result.add(code.first)
+                        stack.append(code.first)
+            self.reachable[signature] = result
+        return result
+
+    def _inline(self, function:Block, call:TAC, callee:Block, codes, labels, allocs):
+        """ Append the codes of callee, replacing call, to codes.
+            Returns the label of the block after the call.
+        """
+        # callee register index ==> value / identifier in function
+        regmap = {idx: arg for idx, arg in enumerate(call.second)}
+        for idx in range(callee.argnum, len(callee.registers)):
+            register = callee.registers[idx]
+            regmap[idx] = Identifier(MemoryLoc.LOCAL, len(function.registers))
+            function.registers.append(Label() if isinstance(register, Label) else register)
+
+        def remap(x):
+            if isinstance(x, Identifier) and x.loc == MemoryLoc.LOCAL:
+                return regmap[x.addr]
+            return x
+
+        def new_label():
+            function.registers.append(Label())
+            return Identifier(MemoryLoc.LOCAL, len(function.registers) - 1)
+
+        after = new_label()
+        incoming = []       # (value returned, label of the block returning it)
+        codes.append(TAC(Code.BR, None, remap(Identifier(MemoryLoc.LOCAL, callee.labels[0]))))
+
+        blockstart = len(codes)
+        curlabel = None
+        for addr, code in enumerate(callee.codes):
+            if addr in callee.labels:
+                curlabel = regmap[callee.labels[addr]]
+                labels[len(codes)] = curlabel.addr
+                blockstart = len(codes)
+
+            code = copy.copy(code)
+            code.map_operands(remap)
+            if code.ret is not None:
+                code.ret = remap(code.ret)
+
+            if code.code == Code.ALLOC:
+                allocs.append(code)
+                continue
+            if code.code == Code.RET:
+                if curlabel is None:
+                    curlabel = new_label()
+                    labels[blockstart] = curlabel.addr
+                incoming.append((code.first, curlabel))
+                code = TAC(Code.BR, None, after)
+
+            codes.append(code)
+            if code.code in TerminatorCodes:
+                curlabel = None
+                blockstart = len(codes)
+
+        labels[len(codes)] = after.addr
+        if call.ret is not None:
+            codes.append(TAC(Code.PHI, call.ret, incoming))
+        return after
@@ -0,0 +1,102 @@
+""" Loop-invariant code motion.
+"""
+
+from ..grammar.basic_types import Value
+from ..ir import Block, Code, Identifier, MemoryLoc, CFG, natural_loops
+
+from .gvn import PureCodes
+from .passes import IRPass, register_pass
+
+
+@register_pass
+class LoopInvariantCodeMotion(IRPass):
+    """ Move codes computing the same value in every iteration of a loop to
+        its preheader, inner loops first:
+        - pure codes whose operands are defined outside of the loop (DIV and
+          REM only by a constant other than 0 and -1, as they may trap);
+        - loads of a variable the loop does not store to, if the loop has no
+          call. Array elements are not loaded ahead, as the index may only
+          be valid inside the loop.
+    """
+
+    name = 'licm'
+
+    def run(self, function:Block):
+        cfg = CFG(function)
+        cfg.remove_unreachable()
+        loops = natural_loops(cfg)
+        if not loops:
+            return
+
+        allocs = set(code.ret.addr for code in function.codes if code.code == Code.ALLOC)
+        defblock = dict()   # register index ==> block defining it
+        for block in cfg.blocks:
+            for code in block.codes:
+                if code.ret is not None:
+                    defblock[code.ret.addr] = block
+
+        changed = False
+        for loop in loops:
+            self.count('loops')
+            hasblocks = len(cfg.blocks)
+            preheader = loop.preheader(cfg)
+            if preheader is None:
+                continue
+            if len(cfg.blocks) != hasblocks:
+                self.count('preheaders inserted')
+                changed = True
+
+            hascall = False
+            stored = set()      # keys of identifiers stored to
+            for block in loop.blocks:
+                for code in block.codes:
+                    if code.code == Code.CALL:
+                        hascall = True
+                    elif code.code == Code.STORE and isinstance(code.second, Identifier):
+                        stored.add((code.second.loc, code.second.addr))
+
+            def invariant(x):
+                if isinstance(x, Identifier) and x.loc == MemoryLoc.LOCAL:
+                    return defblock.get(x.addr) not in loop.blocks
+                return True
+
+            hoisted = []
+            for block in cfg.rpo():
+                if block not in loop.blocks:
+                    continue
+                kept = []
+                for code in block.codes:
+                    if code.code in PureCodes:
+                        movable = all(invariant(x) for x in code.operands()) and self._cannot_trap(code)
+                    elif code.code == Code.LOAD:
+                        address = code.first
+                        movable = (not hascall and (address.loc, address.addr) not in stored and
+                            (address.loc == MemoryLoc.GLOBAL or address.addr in allocs))
+                        if movable:
+                            self.count('loads hoisted')
+                    else:
+                        movable = False
+
+                    if movable:
+                        hoisted.append(code)
+                        defblock[code.ret.addr] = preheader
+                    else:
+                        kept.append(code)
+                block.codes = kept
+
+            if hoisted:
+                if preheader.terminator() is None:
+                    preheader.codes.extend(hoisted)
+                else:
+                    preheader.codes[-1:-1] = hoisted
+                self.count('codes hoisted', len(hoisted))
+                changed = True
+
+        if changed:
+            cfg.write_back()
+
+    def _cannot_trap(self, code):
+        if code.code not in (Code.DIV, Code.REM):
+            return True
+        divisor = code.second
+        return isinstance(divisor, Value) and divisor.val != 0 and divisor.val != -1
@@ -0,0 +1,174 @@
+""" Promotion of local variables to SSA registers.
+"""
+
+from ..grammar.basic_types import ValType, Value
+from ..evalute import cast_value
+from ..ir import Block, Code, TAC, Identifier, MemoryLoc, Register
+from ..ir import CFG
+
+from .passes import IRPass, register_pass
+
+
+@register_pass
+class Mem2Reg(IRPass):
+    """ Promote local scalar variables to registers.
+        A variable is an ALLOC of a value type whose address is only used by
+        LOAD and STORE. Its loads are replaced by the value stored last on the
+        path, with PHI codes inserted at the dominance frontiers of its stores
+        (and dropped again when the merged value is never used). A variable
+        read before any store reads 0. Unreachable blocks are removed, as they
+        have no reaching value.
+    """
+
+    name = 'mem2reg'
+
+    def run(self, function:Block):
+        cfg = CFG(function)
+        ncodes = len(function.codes)
+        self.count('blocks removed', cfg.remove_unreachable())
+
+        promoted = self._find_variables(function)
+        if promoted:
+            domtree = cfg.domtree
+            frontiers = domtree.frontiers()
+
+            # blocks that store each variable
+            defblocks = {var: set() for var in promoted}
+            for block in cfg.blocks:
+                for code in block.codes:
+                    if code.code == Code.STORE and code.second.addr in promoted:
+                        defblocks[code.second.addr].add(block)
+
+            phis = {block: [] for block in cfg.blocks}     # block ==> list of (variable, PHI code)
+            for var, vartype in promoted.items():
+                placed = set()
+                worklist = list(defblocks[var])
+                while worklist:
+                    for block in frontiers[worklist.pop()]:
+                        if block not in placed:
+                            placed.add(block)
+                            function.registers.append(Register(vartype))
+                            ret = Identifier(MemoryLoc.LOCAL, len(function.registers) - 1)
+                            phis[block].append((var, TAC(Code.PHI, ret, [])))
+                            if block not in defblocks[var]:
+                                worklist.append(block)
+
+            self._rename(cfg, promoted, phis)
+            live = self._live_phis(cfg, phis)
+            for block in cfg.blocks:
+                block.codes[:0] = [phi for _, phi in phis[block] if phi in live]
+            self.count('variables promoted', len(promoted))
+            self.count('phis inserted', len(live))
+        else:
+            live = ()
+
+        cfg.write_back()
+        self.count('codes removed', ncodes + len(live) - len(function.codes))
+
+    def _find_variables(self, function:Block):
+        """ Returns dict{register index of ALLOC: ValType} of promotable
+            variables.
+        """
+        allocs = dict()
+        for code in function.codes:
+            if code.code == Code.ALLOC and isinstance(code.first, ValType) and code.first != ValType.VOID:
+                allocs[code.ret.addr] = code.first
+
+        for code in function.codes:
+            if code.code == Code.LOAD:
+                continue
+            operands = code.operands()
+            if code.code == Code.STORE:
+                operands = operands[:1]
+            for x in operands:
+                if isinstance(x, Identifier) and x.loc == MemoryLoc.LOCAL:
+                    allocs.pop(x.addr, None)
+        return allocs
+
+    def _rename(self, cfg:CFG, promoted, phis):
+        """ Replace loads by reaching values over a dominator tree walk.
+        """
+        children = cfg.domtree.children
+        values = {var: [] for var in promoted}  # variable ==> stack of reaching values
+        replaced = dict()   # register index of LOAD ==> value
+
+        def current(var):
+            stack = values[var]
+            if stack:
+                return stack[-1]
+            vartype = promoted[var]
+            return Value(vartype, cast_value(0, vartype))
+
+        def resolve(x):
+            if isinstance(x, Identifier) and x.loc == MemoryLoc.LOCAL:
+                return replaced.get(x.addr, x)
+            return x
+
+        stack = [(cfg.entry, False)]
+        while stack:
+            block, leaving = stack.pop()
+            if leaving:
+                for var, _ in phis[block]:
+                    values[var].pop()
+                for code in block.codes:
+                    if code.code == Code.STORE and code.second.addr in promoted:
+                        values[code.second.addr].pop()
+                continue
+
+            for var, phi in phis[block]:
+                values[var].append(phi.ret)
+
+            result = []
+            for code in block.codes:
+                if code.code == Code.ALLOC and code.ret.addr in promoted:
+                    continue
+                elif code.code == Code.LOAD and code.first.addr in promoted:
+                    replaced[code.ret.addr] = current(code.first.addr)
+                    continue
+                elif code.code == Code.STORE and code.second.addr in promoted:
+                    values[code.second.addr].append(resolve(code.first))
+                code.map_operands(resolve)
+                result.append(code)
+
+            if block.succs:
+                label = cfg.label_id(block)
+                for succ in block.succs:
+                    for var, phi in phis[succ]:
+                        phi.first.append((current(var), label))
+
+            # stores are dropped after the walk leaves the block
+            stack.append((block, True))
+            stack.extend((child, False) for child in children[block])
+            block.codes = result
+
+        for block in cfg.blocks:
+            block.codes = [code for code in block.codes
+                if not (code.code == Code.STORE and code.second.addr in promoted)]
+            # PHIs can use loads of blocks visited later
+            for code in block.codes:
+                if code.code == Code.PHI:
+                    code.map_operands(resolve)
+
+    def _live_phis(self, cfg:CFG, phis):
+        """ Returns set of PHI codes whose value is used.
+        """
+        byret = {phi.ret.addr: phi for block_phis in phis.values() for _, phi in block_phis}
+        live = set()
+        worklist = []
+
+        def mark(x):
+            if isinstance(x, Identifier) and x.loc == MemoryLoc.LOCAL:
+                phi = byret.get(x.addr)
+                if phi is not None and phi not in live:
+                    live.add(phi)
+                    worklist.append(phi)
+
+        for block in cfg.blocks:
+            for code in block.codes:
+                for x in code.operands():
+                    mark(x)
+
+        while worklist:
+            for val, _ in worklist.pop().first:
+                mark(val)
+        return live
@@ -0,0 +1,62 @@
+""" Passes over the IR of translated functions.
+"""
+
+from ..ir import Block, Register, Identifier, MemoryLoc
+
+
+PassLoc = {}    # dict{pass name: IRPass subclass}
+
+# Passes run by default, in order
+DefaultPasses = ['inline', 'mem2reg', 'peephole', 'gvn', 'licm', 'strength', 'dce']
+
+
+def register_pass(cls):
+    """ Class decorator: make an IRPass available by its name.
+    """
+    PassLoc[cls.name] = cls
+    return cls
+
+
+class IRPass:
+    """ Base of passes. A pass object runs on every function of a
+        translater, and counts what it changed in stats.
+    """
+
+    name = None
+
+    def __init__(self, translater):
+        self.translater = translater
+        self.stats = dict()     # dict{counter name: count}
+
+    def create_reg(self, function:Block, regtype):
+        """ Returns identifier of a new register of function.
+        """
+        function.registers.append(Register(regtype))
+        return Identifier(MemoryLoc.LOCAL, len(function.registers) - 1)
+
+    def count(self, key, n=1):
+        self.stats[key] = self.stats.get(key, 0) + n
+
+    def run(self, function:Block):
+        """ Transform function in place.
+        """
+        raise NotImplementedError()
+
+
+def run_passes(translater, names=None):
+    """ Run passes named by names (default: DefaultPasses) on every function
+        translated by translater.
+        Returns dict{pass name: stats}
+    """
+    results = dict()
+    for name in (DefaultPasses if names is None else names):
+        try:
+            irpass = PassLoc[name](translater)
+        except KeyError:
+            raise RuntimeError('Unknown pass: %s' % name)
+        for function in translater.functions:
+            irpass.run(function)
+        stats = results.setdefault(name, dict())
+        for key, n in irpass.stats.items():
+            stats[key] = stats.get(key, 0) + n
+    return results
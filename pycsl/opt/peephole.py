@@ -0,0 +1,131 @@
+""" Block-local load / store optimization.
+"""
+
+from ..ir import Block, Code, Identifier, MemoryLoc, CFG
+
+from .passes import IRPass, register_pass
+
+
+# Address classes
+_PRIVATE = 0    # local variable only used by LOAD / STORE: cannot be aliased
+_GLOBAL = 1     # global variable: can be read and written by a call
+_MEMORY = 2     # anything else: arrays, pointers; may alias each other
+
+
+def _same(a, b):
+    """ Whether values / identifiers a and b are the same.
+    """
+    if isinstance(a, Identifier):
+        return isinstance(b, Identifier) and a.loc == b.loc and a.addr == b.addr
+    return not isinstance(b, Identifier) and a == b
+
+
+@register_pass
+class LoadStoreForwarding(IRPass):
+    """ Remove redundant memory operations within basic blocks:
+        - a LOAD after a STORE to the same address is replaced by the value
+          stored;
+        - a LOAD after a LOAD of the same address is replaced by the first
+          one;
+        - a STORE overwritten by a later STORE to the same address with no
+          possible read in between is removed.
+        Addresses are identifiers. Scalar variables cannot be reached through
+        pointers (CSL has no address-of operator), so only stores through
+        pointers are assumed to clobber each other, and calls clobber
+        globals and memory reached through pointers.
+        Does not need SSA form, but leaves nothing to do after mem2reg for
+        promoted variables.
+    """
+
+    name = 'peephole'
+
+    def run(self, function:Block):
+        cfg = CFG(function)
+        classes = self._classify(function)
+        replaced = dict()   # register index of LOAD removed ==> value
+
+        def resolve(x):
+            if isinstance(x, Identifier) and x.loc == MemoryLoc.LOCAL:
+                return replaced.get(x.addr, x)
+            return x
+
+        def addrkey(x):
+            if x.loc == MemoryLoc.GLOBAL:
+                return (x.loc, x.addr), classes.get(x.addr, _GLOBAL)
+            return (x.loc, x.addr), classes.get(x.addr, _MEMORY)
+
+        changed = False
+        for block in cfg.blocks:
+            known = dict()      # address key ==> (class, value in memory)
+            pending = dict()    # address key ==> (class, STORE not read yet)
+            removed = set()     # STOREs removed
+
+            def forget(table, *forgotten):
+                for key in [key for key, (cls, _) in table.items() if cls in forgotten]:
+                    del table[key]
+
+            result = []
+            for code in block.codes:
+                code.map_operands(resolve)
+
+                if code.code == Code.LOAD and isinstance(code.first, Identifier):
+                    key, cls = addrkey(code.first)
+                    if key in known:
+                        replaced[code.ret.addr] = known[key][1]
+                        self.count('loads removed')
+                        continue
+                    known[key] = (cls, code.ret)
+                    if cls == _MEMORY:
+                        forget(pending, _MEMORY)
+                    else:
+                        pending.pop(key, None)
+
+                elif code.code == Code.STORE and isinstance(code.second, Identifier):
+                    key, cls = addrkey(code.second)
+                    if key in known and _same(known[key][1], code.first):
+                        # memory already holds the value
+                        self.count('stores removed')
+                        continue
+                    if key in pending:
+                        removed.add(pending[key][1])
+                        self.count('stores removed')
+                    if cls == _MEMORY:
+                        forget(known, _MEMORY)
+                    known[key] = (cls, code.first)
+                    pending[key] = (cls, code)
+
+                elif code.code == Code.CALL:
+                    forget(known, _GLOBAL, _MEMORY)
+                    forget(pending, _GLOBAL, _MEMORY)
+
+                result.append(code)
+
+            if removed or len(result) != len(block.codes):
+                block.codes = [code for code in result if code not in removed]
+                changed = True
+
+        if changed:
+            for block in cfg.blocks:
+                for code in block.codes:
+                    code.map_operands(resolve)
+            cfg.write_back()
+
+    def _classify(self, function:Block):
+        """ Returns dict{local register index / global name: address class}
+            for the identifiers that are addressed directly.
+        """
+        classes = dict()
+        for code in function.codes:
+            if code.code == Code.ALLOC:
+                classes[code.ret.addr] = _PRIVATE
+
+        for code in function.codes:
+            operands = code.operands()
+            if code.code == Code.LOAD:
+                continue
+            elif code.code == Code.STORE:
+                operands = operands[:1]
+            for x in operands:
+                if isinstance(x, Identifier):
+                    classes[x.addr] = _MEMORY
+        return classes
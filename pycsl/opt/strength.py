@@ -0,0 +1,294 @@
+""" Induction variables and strength reduction.
+"""
+
+from ..grammar.basic_types import ValType, Value
+from ..evalute import cast_value
+from ..ir import Block, Code, TAC, Identifier, MemoryLoc, Array, CFG, natural_loops
+
+from .passes import IRPass, register_pass
+
+
+# Bits of the types shifts are used for
+_BitsLoc = {
+    ValType.CHAR: 8,
+    ValType.INT: 32,
+}
+
+
+def _log2(value):
+    """ Returns k if value is an int Value 2**k with k > 0, else None.
+    """
+    if isinstance(value, Value) and value.type in _BitsLoc and value.val > 1 and value.val & (value.val - 1) == 0:
+        return value.val.bit_length() - 1
+    return None
+
+
+def _count(tp):
+    """ Number of scalar elements in tp.
+    """
+    return tp.size * _count(tp.type) if isinstance(tp, Array) else 1
+
+
+def _same_reg(x, reg:Identifier):
+    return isinstance(x, Identifier) and x.loc == reg.loc and x.addr == reg.addr
+
+
+@register_pass
+class StrengthReduction(IRPass):
+    """ Replace expensive codes by cheaper ones.
+        - Linear induction variables of loops are found: a PHI of the header
+          whose value from the only latch is the PHI plus or minus a constant.
+          In the loop, iv * c and GETPTR codes whose only varying index is
+          iv get an induction variable of their own, initialized in the
+          preheader and increased next to iv, so a multiplication becomes an
+          addition and an address is advanced by a constant offset.
+        - int / char multiplications by a power of two become SHL, divisions
+          and remainders SHR with a correction for negative dividends.
+        - int / char powers by a small constant become a chain of
+          multiplications (square and multiply); a float raised to an int
+          converted to float keeps the int exponent, for llvm.powi.
+    """
+
+    name = 'strength'
+    MaxPowMultiplications = 8   # longest multiplication chain replacing a POW
+
+    def run(self, function:Block):
+        cfg = CFG(function)
+        cfg.remove_unreachable()
+        replaced = dict()   # register index ==> new induction variable
+
+        for loop in natural_loops(cfg):
+            if len(set(loop.latches)) != 1:
+                continue
+            preheader = loop.preheader(cfg)
+            if preheader is None:
+                continue
+            self._reduce_loop(cfg, loop, preheader, loop.latches[0], replaced)
+
+        powers = self._expand_pow(cfg, replaced)
+        shifted = self._shift(cfg)
+
+        if replaced or powers or shifted:
+            def resolve(x):
+                while isinstance(x, Identifier) and x.loc == MemoryLoc.LOCAL and x.addr in replaced:
+                    x = replaced[x.addr]
+                return x
+
+            for block in cfg.blocks:
+                for code in block.codes:
+                    code.map_operands(resolve)
+            cfg.write_back()
+
+    def _reduce_loop(self, cfg:CFG, loop, preheader, latch, replaced):
+        function = cfg.function
+        header = loop.header
+        prelabel = cfg.label_id(preheader).addr
+        latchlabel = cfg.label_id(latch).addr
+
+        defs = dict()   # register index ==> (block, code) of codes in loop
+        for block in loop.blocks:
+            for code in block.codes:
+                if code.ret is not None:
+                    defs[code.ret.addr] = (block, code)
+
+        def invariant(x):
+            return not (isinstance(x, Identifier) and x.loc == MemoryLoc.LOCAL and x.addr in defs)
+
+        # iv register index ==> (init, step, block and code of the update)
+        ivs = dict()
+        for code in header.codes:
+            if code.code != Code.PHI:
+                break
+            if function.registers[code.ret.addr].type != ValType.INT or len(code.first) != 2:
+                continue
+            incoming = {label.addr: val for val, label in code.first}
+            init, nextval = incoming.get(prelabel), incoming.get(latchlabel)
+            if init is None or not isinstance(nextval, Identifier) or nextval.addr not in defs:
+                continue
+            block, update = defs[nextval.addr]
+            if update.code == Code.ADD and _same_reg(update.second, code.ret) and isinstance(update.first, Value):
+                step = update.first.val
+            elif update.code in (Code.ADD, Code.SUB) and _same_reg(update.first, code.ret) and isinstance(update.second, Value):
+                step = update.second.val if update.code == Code.ADD else -update.second.val
+            else:
+                continue
+            ivs[code.ret.addr] = (init, step, block, update)
+        if not ivs:
+            return
+        self.count('induction variables', len(ivs))
+
+        phis = []
+        for block in loop.blocks:
+            for code in block.codes:
+                if code.code == Code.MUL and function.registers[code.ret.addr].type == ValType.INT:
+                    operands = [code.first, code.second]
+                    ivops = [x for x in operands if isinstance(x, Identifier) and x.addr in ivs]
+                    consts = [x for x in operands if isinstance(x, Value)]
+                    if len(ivops) != 1 or len(consts) != 1:
+                        continue
+                    init, step, updblock, update = ivs[ivops[0].addr]
+                    factor = consts[0].val
+                    if isinstance(init, Value):
+                        start = Value(ValType.INT, cast_value(init.val * factor, ValType.INT))
+                    else:
+                        start = self.create_reg(function, ValType.INT)
+                        self._append(preheader, TAC(Code.MUL, start, init, consts[0]))
+                    increment = Value(ValType.INT, cast_value(step * factor, ValType.INT))
+                    self.count('multiplications reduced')
+
+                elif code.code == Code.GETPTR:
+                    if not invariant(code.first) or not all(isinstance(x, Value) or x.addr in ivs or invariant(x) for x in code.second):
+                        continue
+                    positions = [i for i, x in enumerate(code.second) if isinstance(x, Identifier) and x.addr in ivs]
+                    if len(positions) != 1:
+                        continue
+                    position = positions[0]
+                    init, step, updblock, update = ivs[code.second[position].addr]
+
+                    # stride of the index, in elements of the result
+                    tp = function.registers[code.first.addr].type if code.first.loc == MemoryLoc.LOCAL else None
+                    if tp is None:
+                        tp = self._global_type(code.first)
+                    for _ in range(position + 1):
+                        tp = tp.type
+                    stride = _count(tp) // _count(function.registers[code.ret.addr].type.unref_type())
+
+                    start = self.create_reg(function, function.registers[code.ret.addr].type)
+                    indices = list(code.second)
+                    indices[position] = init
+                    self._append(preheader, TAC(Code.GETPTR, start, code.first, indices))
+                    increment = [Value(ValType.INT, cast_value(step * stride, ValType.INT))]
+                    self.count('addresses reduced')
+
+                else:
+                    continue
+
+                regtype = function.registers[code.ret.addr].type
+                phi = self.create_reg(function, regtype)
+                following = self.create_reg(function, regtype)
+                if code.code == Code.MUL:
+                    nextcode = TAC(Code.ADD, following, phi, increment)
+                else:
+                    nextcode = TAC(Code.GETPTR, following, phi, increment)
+                updblock.codes.insert(updblock.codes.index(update) + 1, nextcode)
+                phis.append(TAC(Code.PHI, phi, [
+                    (start, Identifier(MemoryLoc.LOCAL, prelabel)),
+                    (following, Identifier(MemoryLoc.LOCAL, latchlabel))
+                ]))
+                replaced[code.ret.addr] = phi
+
+        header.codes[:0] = phis
+
+    def _append(self, block, code:TAC):
+        """ Add code to block before its terminator.
+        """
+        if block.terminator() is None:
+            block.codes.append(code)
+        else:
+            block.codes.insert(len(block.codes) - 1, code)
+
+    def _global_type(self, id_:Identifier):
+        return self.translater.global_sym_table[id_.addr].type
+
+    def _expand_pow(self, cfg:CFG, replaced):
+        """ Rewrite POW codes with an int exponent.
+            Returns number of codes rewritten.
+        """
+        function = cfg.function
+        itofs = dict()      # register index ==> int converted to it
+        for block in cfg.blocks:
+            for code in block.codes:
+                if code.code == Code.ITOF and isinstance(code.first, Identifier) and \
+                        code.first.loc == MemoryLoc.LOCAL and function.registers[code.first.addr].type == ValType.INT:
+                    itofs[code.ret.addr] = code.first
+
+        count = 0
+        for block in cfg.blocks:
+            result = []
+            for code in block.codes:
+                if code.code != Code.POW:
+                    result.append(code)
+                    continue
+                regtype = function.registers[code.ret.addr].type
+                exponent = code.second
+
+                if regtype == ValType.FLOAT:
+                    if isinstance(exponent, Identifier) and exponent.addr in itofs:
+                        code.second = itofs[exponent.addr]
+                        count += 1
+                    result.append(code)
+                    continue
+
+                if regtype not in _BitsLoc or not isinstance(exponent, Value) or exponent.val < 0:
+                    result.append(code)
+                    continue
+                bits = bin(exponent.val)[3:]    # after the leading 1
+                if exponent.val > 0 and len(bits) + bits.count('1') > self.MaxPowMultiplications:
+                    result.append(code)
+                    continue
+
+                count += 1
+                if exponent.val == 0:
+                    replaced[code.ret.addr] = Value(regtype, 1)
+                    continue
+                value = code.first
+                for bit in bits:
+                    square = self.create_reg(function, regtype)
+                    result.append(TAC(Code.MUL, square, value, value))
+                    value = square
+                    if bit == '1':
+                        product = self.create_reg(function, regtype)
+                        result.append(TAC(Code.MUL, product, value, code.first))
+                        value = product
+                replaced[code.ret.addr] = value
+            block.codes = result
+
+        self.count('powers expanded', count)
+        return count
+
+    def _shift(self, cfg:CFG):
+        """ Rewrite multiplications / divisions / remainders by powers of two.
+            Returns number of codes rewritten.
+        """
+        function = cfg.function
+        count = 0
+        for block in cfg.blocks:
+            result = []
+            for code in block.codes:
+                if code.code not in (Code.MUL, Code.DIV, Code.REM):
+                    result.append(code)
+                    continue
+                regtype = function.registers[code.ret.addr].type
+                shift = _log2(code.second)
+                if shift is None and code.code == Code.MUL:
+                    shift = _log2(code.first)
+                    operand = code.second
+                else:
+                    operand = code.first
+                if shift is None or regtype not in _BitsLoc:
+                    result.append(code)
+                    continue
+
+                count += 1
+                amount = Value(regtype, shift)
+                if code.code == Code.MUL:
+                    result.append(TAC(Code.SHL, code.ret, operand, amount))
+                    continue
+
+                # round towards zero: add 2**shift - 1 to negative dividends
+                sign = self.create_reg(function, regtype)
+                bias = self.create_reg(function, regtype)
+                biased = self.create_reg(function, regtype)
+                result.append(TAC(Code.SHR, sign, operand, Value(regtype, _BitsLoc[regtype] - 1)))
+                result.append(TAC(Code.AND, bias, sign, Value(regtype, (1 << shift) - 1)))
+                result.append(TAC(Code.ADD, biased, operand, bias))
+                if code.code == Code.DIV:
+                    result.append(TAC(Code.SHR, code.ret, biased, amount))
+                else:
+                    masked = self.create_reg(function, regtype)
+                    result.append(TAC(Code.AND, masked, biased, Value(regtype, cast_value(-(1 << shift), regtype))))
+                    result.append(TAC(Code.SUB, code.ret, operand, masked))
+            block.codes = result
+
+        self.count('shifts', count)
+        return count
@@ -0,0 +1,211 @@
+""" Parallel front-end: import graph and concurrent module parsing.
+"""
+
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from . import preprocess
+from .parse import Parser
+from .ast import AST, ASTType
+from .errors import ReadError, SynError
+
+
+class ImportGraph:
+    """ Modules reachable from a root file, with their imports.
+        Imports are found with a scan of the preprocessed text, without parsing.
+    """
+
+    re_import = re.compile(r'\bimport\s+(\w+)\s*;')
+    re_import_b = re.compile(re_import.pattern.encode())
+
+    def __init__(self):
+        self.root = None
+        self.imports = OrderedDict()    # dict{fullname: list [fullname]}
+
+    def build(self, filename):
+        """ Find every module reachable from filename.
+        """
+        self.root = preprocess.Preprocessor().get_fullname(filename)
+        self.imports.clear()
+
+        pending = [self.root]
+        while pending:
+            fullname = pending.pop()
+            if fullname in self.imports:
+                continue
+            self.imports[fullname] = self.scan(fullname)
+            pending += reversed(self.imports[fullname])
+
+        return self
+
+    def scan(self, fullname):
+        """ Returns list of fullnames imported by a module, in order.
+        """
+        preprocessor = preprocess.Preprocessor()
+        preprocessor.process_file(fullname)
+        text = preprocessor.result()
+        regex = self.re_import if isinstance(text, str) else self.re_import_b
+
+        imported = []
+        for match_obj in regex.finditer(text):
+            name = match_obj.group(1)
+            name = name if isinstance(name, str) else name.decode()
+            imported.append(preprocessor.get_fullname(name + preprocessor.suffix))
+        return imported
+
+    def order(self):
+        """ Returns modules in dependency order (imported modules first, root
+            last). Raises ReadError if there is a cycle.
+        """
+        ordered = []
+        state = {}  # fullname: 1 = on stack, 2 = done
+
+        for start in self.imports:
+            if start in state:
+                continue
+            state[start] = 1
+            stack = [(start, iter(self.imports[start]))]
+            while stack:
+                fullname, children = stack[-1]
+                for child in children:
+                    if state.get(child) == 1:
+                        chain = [f for f, _ in stack]
+                        chain = chain[chain.index(child):] + [child]
+                        raise ReadError('Circular import: %s' % ' -> '.join(chain))
+                    elif child not in state:
+                        state[child] = 1
+                        stack.append((child, iter(self.imports[child])))
+                        break
+                else:
+                    state[fullname] = 2
+                    ordered.append(fullname)
+                    stack.pop()
+
+        return ordered
+
+
+re_split = re.compile(r'[{}]|\bdef\b')
+re_split_b = re.compile(re_split.pattern.encode())
+
+
+def split_source(source, pieces):
+    """ Split preprocessed source into at most `pieces` chunks of similar size.
+        Chunks are only cut before a top-level 'def', so each holds whole
+        functions and declarations.
+        Returns list of (offset, chunk).
+    """
+    regex = re_split if isinstance(source, str) else re_split_b
+    opening = '{' if isinstance(source, str) else b'{'
+    closing = '}' if isinstance(source, str) else b'}'
+    target = len(source) // max(pieces, 1)
+
+    cuts = [0]
+    depth = 0
+    for match_obj in regex.finditer(source):
+        token = match_obj.group()
+        if token == opening:
+            depth += 1
+        elif token == closing:
+            depth -= 1
+        elif depth == 0 and match_obj.start() - cuts[-1] >= target and len(cuts) < pieces:
+            cuts.append(match_obj.start())
+
+    cuts.append(len(source))
+    return [(begin, source[begin:end]) for begin, end in zip(cuts, cuts[1:])]
+
+
+def split_module(fullname, pieces):
+    """ Preprocess a module and split it with split_source().
+        Returns (preprocess.SourceMap, list [(offset, chunk)]).
+    """
+    preprocessor = preprocess.Preprocessor()
+    preprocessor.process_file(fullname)
+    return preprocessor.source_map, split_source(preprocessor.result(), pieces)
+
+
+def _parse_module(fullname, token_array, cache_dir):
+    """ Parse one module without its imports (runs in a worker process).
+    """
+    Parser.ast_cache.cache_dir = cache_dir
+    return Parser(token_array).parse_file(fullname, inline_imports=False)
+
+
+def _parse_chunk(chunk, dirname, token_array):
+    """ Parse a chunk of a module (runs in a worker process).
+    """
+    return Parser(token_array).parse_source(chunk, dirname)
+
+
+def _join_chunks(source_map, chunks, results):
+    """ Concatenate parsed chunks of a module into one ROOT, in order.
+        Syntax errors are located in the whole module.
+    """
+    blocks = []
+    for (offset, _), result in zip(chunks, results):
+        try:
+            blocks += result.result()
+        except SynError as err:
+            error = SynError(err.err, err.pos + offset)
+            error.locate(source_map)
+            raise error from None
+    return AST(ASTType.ROOT, nodes=blocks)
+
+
+def parse_project(filename, workers=None, token_array=None, min_parallel=4, split_size=1 << 18):
+    """ Parse a file and every module it imports.
+        Modules are parsed concurrently in a process pool when at least
+        `min_parallel` of them are not cached, then spliced into one ROOT in
+        dependency order, each module once.
+        Modules of at least `split_size` bytes are split at top-level
+        functions (see split_source) and their chunks parsed concurrently too.
+
+        workers: Number of processes. None ==> os.cpu_count(); 1 ==> serial.
+        split_size: None ==> never split modules.
+    """
+    graph = ImportGraph().build(filename)
+    modules = graph.order()
+
+    asts = {}
+    missing = []
+    for fullname in modules:
+        entry = Parser.ast_cache.get(Parser.ast_cache.file_key(fullname) + Parser.MODULE_KEY)
+        if entry is not None:
+            asts[fullname] = entry.ast
+        else:
+            missing.append(fullname)
+
+    workers = workers or os.cpu_count() or 1
+    split = {}  # dict{fullname: (SourceMap, list [(offset, chunk)])}
+    if workers > 1 and split_size is not None:
+        for fullname in missing:
+            if os.path.getsize(fullname) >= split_size:
+                split[fullname] = split_module(fullname, workers)
+
+    if split or (workers > 1 and len(missing) >= min_parallel):
+        with ProcessPoolExecutor(workers) as executor:
+            results = {}
+            for fullname in missing:
+                if fullname in split:
+                    results[fullname] = [executor.submit(_parse_chunk, chunk, os.path.dirname(fullname), token_array)
+                        for _, chunk in split[fullname][1]]
+                else:
+                    results[fullname] = executor.submit(_parse_module, fullname, token_array, Parser.ast_cache.cache_dir)
+
+            for fullname in missing:
+                key = Parser.ast_cache.file_key(fullname) + Parser.MODULE_KEY
+                if fullname in split:
+                    asts[fullname] = _join_chunks(*split[fullname], results[fullname])
+                    Parser.ast_cache.put(key, asts[fullname])
+                else:
+                    asts[fullname] = results[fullname].result()
+                    Parser.ast_cache.put(key, asts[fullname], persist=False)
+    else:
+        for fullname in missing:
+            asts[fullname] = Parser(token_array).parse_file(fullname, inline_imports=False)
+
+    blocks = []
+    for fullname in modules:
+        blocks += asts[fullname].nodes
+    return AST(ASTType.ROOT, nodes=blocks)
@@ -1,32 +1,89 @@
 
 from . import lex
 from . import preprocess
+from .cache import ASTCache
 
 from .util import ioutil
-from .errors import SynError
+from .util.trampoline import trampoline
+from .errors import SynError, ReadError
 from .tokens import Token, TokenType, Symbol
 
 from .grammar.keywords import Keyword, Separator
 from .grammar.basic_types import Value
-from .grammar.operators import Operator, precedence, OpAryLoc, OpAssoLoc, OpAsso 
+from .grammar.operators import Operator, OpPrecedenceLoc, OpAryLoc, OpAssoLoc
 
 from .ast import AST, ASTType, ASTBuilder, DeclNode, token2ast
 
 
+# Role of an operator following an operand in _parse_simple_expr
+OP_BINARY = 0   # left associative binary operator
+OP_ASSIGN = 1   # assignment; ends the simple expression
+OP_CLOSE = 2    # closing bracket; ends the simple expression
+OP_ERROR = 3    # not allowed after an operand
+
+def _op_role(op):
+    if OpAryLoc[op] == 2 and OpAssoLoc[op] == 1:
+        return OP_ASSIGN
+    elif op in (Operator.RBRA, Operator.RSUB):
+        return OP_CLOSE
+    elif OpAryLoc[op] == 1 or OpAssoLoc[op] != 0:
+        return OP_ERROR
+    else:
+        return OP_BINARY
+
+# Tables of the operator loop, indexed by op._value_: hashing an Enum member
+# is a Python-level call, and so is reading op.value
+_Operators = [Operator(v) for v in range(len(Operator))]
+
+OpRole = tuple(_op_role(op) for op in _Operators)
+OpPrecedence = tuple(OpPrecedenceLoc[op] for op in _Operators)
+
+# Prefix operators: operator token => AST operator, None if not prefix
+PrefixOp = tuple({
+    Operator.INC: Operator.INC,
+    Operator.DEC: Operator.DEC,
+    Operator.ADD: Operator.PLUS,
+    Operator.SUB: Operator.MINUS,
+    Operator.NOT: Operator.NOT,
+}.get(op) for op in _Operators)
+
+
 class Parser:
     """
     The main parser for CSL.
     Using recursive descent here (except for operators, where LR(1) is applied).
+    Recursive rules are generators run by util.trampoline: a rule yields the
+    generator of a sub-rule and receives its AST, so nesting depth is not
+    bounded by the Python recursion limit.
     """
-    ast_cache = dict()
+    VERSION = 2             # bump when the AST produced changes; invalidates cached ASTs
 
-    def __init__(self):
+    ast_cache = ASTCache(version=VERSION)
+    parsing = []            # stack of modules being parsed, for import cycles
+
+    TOKEN_ARRAY = False     # lex the whole input into a lex.TokenArray before parsing
+    MODULE_KEY = '-module'  # cache key suffix of results without imports inlined
+
+    def __init__(self, token_array=None):
+        self.token_array = Parser.TOKEN_ARRAY if token_array is None else token_array
         self.cur_token = None
         self.next_token = None 
         self.next_look_token = None 
-        self.lexer = lex.Lexer()
+        self.lexer = lex.TokenArray() if self.token_array else lex.Lexer()
         self.preprocessor = preprocess.Preprocessor()
-
+        self.inline_imports = True  # splice imported modules into the result
+        self.source_key = None      # cache key of last file parsed
+        self.deps = {}              # dict{fullname: cache key} of modules spliced into last file
+        self.imports = []           # list of fullname imported by last file
+
+        self.stmt_table = {         # dict{Keyword: bound handler} of _parse_stmt
+            Keyword.IF: self._parse_if,
+            Keyword.WHILE: self._parse_while,
+            Keyword.FOR: self._parse_for,
+            Keyword.CONTINUE: None,     # no operand
+            Keyword.BREAK: None,
+            Keyword.RETURN: self._parse_return,
+        }
 
     def clear(self):
         """ Clear token, tokenbuffer, aststack, lex.
@@ -36,37 +93,89 @@ class Parser:
         self.next_look_token = None   
         self.lexer.clear()
         self.preprocessor.clear()
+        self.source_key = None
+        self.deps = {}
+        self.imports = []
 
-    def parse_file(self, filename):
+    def parse_file(self, filename, inline_imports=True):
         """ Parse a file containing functions.
             Returns an AST with node as ROOT.
+
+            inline_imports: If False, imported modules are only recorded in
+                self.imports, and the result holds this file's own nodes.
         """
         self.clear()
+        self.inline_imports = inline_imports
         fullname = self.preprocessor.get_fullname(filename)
+        if inline_imports:
+            self.source_key = self.ast_cache.path_key(fullname)
+        else:
+            self.source_key = self.ast_cache.file_key(fullname) + Parser.MODULE_KEY
+
+        entry = self.ast_cache.get(self.source_key)
+        if entry is not None:
+            self.deps = dict(entry.deps)
+            return entry.ast
+
+        if fullname in Parser.parsing:
+            chain = Parser.parsing[Parser.parsing.index(fullname):] + [fullname]
+            raise ReadError('Circular import: %s' % ' -> '.join(chain))
+
         self.preprocessor.process_file(filename)
-        self.lexer.load(self.preprocessor.result())
-        self.preprocessor.strstack.clear()
-        self.next_token = self.lexer.get_token()
+        Parser.parsing.append(fullname)
+
+        try:
+            self.lexer.load(self.preprocessor.result())
+            self.preprocessor.strstack.clear()
+            self.next_token = self.lexer.get_token()
+            blocks = self._parse_blocks()
+        except SynError as err:
+            err.locate(self.preprocessor.source_map)
+            raise
+        finally:
+            Parser.parsing.pop()
 
-        self.ast_cache[fullname] = AST(ASTType.NONE)
+        self.preprocessor.include_paths.pop()
+        return self.ast_cache.put(self.source_key, AST(ASTType.ROOT, nodes=blocks), self.deps.items()).ast
 
+    def parse_source(self, source, dirname='.'):
+        """ Parse preprocessed source (e.g. a chunk of a file), without
+            inlining imports; imported files are searched in dirname.
+            Returns list of AST. SynError.pos is an offset into source.
+        """
+        self.clear()
+        self.inline_imports = False
+        self.preprocessor.include_paths.append(dirname)
+        self.lexer.load(source)
+        self.next_token = self.lexer.get_token()
+        try:
+            return self._parse_blocks()
+        finally:
+            self.preprocessor.include_paths.pop()
+
+    def _parse_blocks(self):
+        """ Parse top-level functions, declarations and imports until EOF.
+            Returns list of AST.
+        """
         blocks = []
 
         while True:
 
-            if self.match_noget(TokenType.DEF, lambda x:x == Keyword.DEF):
-                blocks.append(self._parse_func_or_def())
+            if self.match_noget(TokenType.DEF, Keyword.DEF):
+                blocks.append(trampoline(self._parse_func_or_def()))
             elif self.match_noget(TokenType.TYPE):
-                blocks.append(self._parse_decl())
+                blocks.append(trampoline(self._parse_decl()))
                 self.force_match(TokenType.EOL)
-            elif self.match(TokenType.DEF, lambda x:x == Keyword.IMPORT):
+            elif self.match(TokenType.DEF, Keyword.IMPORT):
                 self.force_match(TokenType.NAME)
                 filename_import = self.preprocessor.get_fullname(self.cur_token.val.name + self.preprocessor.suffix)
                 self.force_match(TokenType.EOL)
-                if filename_import not in self.ast_cache:
-                    parser = Parser()
-                    parser.parse_file(filename_import)
-                blocks += self.ast_cache[filename_import].nodes ## TODO: check circular import
+                self.imports.append(filename_import)
+                if self.inline_imports:
+                    parser = Parser(self.token_array)
+                    blocks += parser.parse_file(filename_import).nodes
+                    self.deps.update(parser.deps)
+                    self.deps[filename_import] = self.ast_cache.file_key(filename_import)
             elif self.match(TokenType.EOL):
                 continue 
             elif self.match(TokenType.EOF):
@@ -74,9 +183,7 @@ class Parser:
             else:
                 raise SynError('Unrecognized head: %s' % self.next_token, self.lexer.cur_pos())
 
-        self.preprocessor.include_paths.pop()
-        Parser.ast_cache[fullname] = AST(ASTType.ROOT, nodes=blocks)
-        return Parser.ast_cache[fullname]
+        return blocks
 
     def parse_line(self, line):
         """ Parse simple expression & statement.
@@ -90,13 +197,13 @@ class Parser:
         self.next_token = self.lexer.get_token()
 
         if self.match_noget(TokenType.TYPE):
-            mast = self._parse_decl()
+            mast = trampoline(self._parse_decl())
         elif self.match_noget(TokenType.EOL):
             return AST(ASTType.ROOT) 
         elif self.match_noget(TokenType.EOF):
             return AST(ASTType.ROOT)
         else:
-            mast = self._parse_expr()
+            mast = trampoline(self._parse_expr())
 
         self.match(TokenType.EOL)  # both line with/without ';' is OK. After ';' is not parsed.
         return mast 
@@ -110,7 +217,7 @@ class Parser:
         """
         
         # func head
-        self.force_match(TokenType.DEF, lambda x:x == Keyword.DEF)
+        self.force_match(TokenType.DEF, Keyword.DEF)
         self.force_match(TokenType.NAME)
 
         ast_head = AST(ASTType.DECL, DeclNode.FUNCDECL)
@@ -145,7 +252,7 @@ class Parser:
         if self.match(TokenType.EOL):
             return mast 
         else:
-            mast.append(self._parse_compound_stmt())
+            mast.append((yield self._parse_compound_stmt()))
             return mast 
             
     def _parse_compound_stmt(self):
@@ -162,12 +269,12 @@ class Parser:
                 break 
             elif self.match(TokenType.EOL):
                 continue 
-            elif self.match_noget(TokenType.SEP, lambda x: x == Separator.LCPD):
-                mast.append(self._parse_compound_stmt())
+            elif self.match_noget(TokenType.SEP, Separator.LCPD):
+                mast.append((yield self._parse_compound_stmt()))
             elif self.match_noget(TokenType.TYPE):
-                mast.append(self._parse_decl())
+                mast.append((yield self._parse_decl()))
             else:
-                mast.append(self._parse_stmt())
+                mast.append((yield self._parse_stmt()))
 
         return mast 
 
@@ -181,135 +288,123 @@ class Parser:
                 | jump_stmt
         """
 
-        # if
-        if self.match(TokenType.CTRL, lambda x:x == Keyword.IF):
-            mast = token2ast(self.cur_token)
-            self.force_match_op(Operator.LBRA)
-            mast.append(self._parse_expr())
-            self.force_match_op(Operator.RBRA)
-            mast.append(self._parse_stmt())
-            if self.match(TokenType.CTRL, lambda x:x == Keyword.ELSE):
-                mast.append(self._parse_stmt())
-            return mast 
-
-        # while
-        elif self.match(TokenType.CTRL, lambda x:x == Keyword.WHILE):
-            mast = token2ast(self.cur_token)
-            self.force_match_op(Operator.LBRA)
-            mast.append(self._parse_expr())
-            self.force_match_op(Operator.RBRA)
-            mast.append(self._parse_stmt())
-            return mast 
-
-        # for
-        elif self.match(TokenType.CTRL, lambda x:x == Keyword.FOR):
-            mast = token2ast(self.cur_token)
-            self.force_match_op(Operator.LBRA)
-            mast.append(self._parse_expr())
-            self.force_match(TokenType.EOL)
-            mast.append(self._parse_expr())
-            self.force_match(TokenType.EOL)
-            mast.append(self._parse_expr())
-            self.force_match_op(Operator.RBRA)
-            mast.append(self._parse_stmt())
-            return mast 
-            
-        # continue/break
-        elif self.match(TokenType.CTRL, lambda x:x in (Keyword.CONTINUE, Keyword.BREAK)):
-            return token2ast(self.cur_token)
-
-        # return
-        elif self.match(TokenType.CTRL, lambda x:x == Keyword.RETURN):
-            mast = token2ast(self.cur_token)
-            if self.match(TokenType.EOL):
-                return mast 
-            else:
-                mast.append(self._parse_expr())
-                return mast 
+        token = self.next_token
+        if token.tp is TokenType.CTRL:
+            if token.val in self.stmt_table:
+                self.cur_token = token
+                self.next_token = self.lexer.get_token()
+                handler = self.stmt_table[token.val]
+                return token2ast(token) if handler is None else (yield handler())
 
-        elif self.match_noget(TokenType.SEP, lambda x:x == Separator.LCPD):
-            return self._parse_compound_stmt()
+        if self.match_noget(TokenType.SEP, Separator.LCPD):
+            return (yield self._parse_compound_stmt())
 
         elif self.match(TokenType.EOL):
             return AST(ASTType.BLOCK)
 
         else:
-            mast = self._parse_expr()
+            mast = yield self._parse_expr()
             self.force_match(TokenType.EOL)
             return mast
 
+    def _parse_if(self):
+        """ select_stmt = 'if' '(' expr ')' stmt ('else' stmt)?
+        """
+        mast = token2ast(self.cur_token)
+        self.force_match_op(Operator.LBRA)
+        mast.append((yield self._parse_expr()))
+        self.force_match_op(Operator.RBRA)
+        mast.append((yield self._parse_stmt()))
+        if self.match(TokenType.CTRL, Keyword.ELSE):
+            mast.append((yield self._parse_stmt()))
+        return mast 
+
+    def _parse_while(self):
+        """ iter_stmt = 'while' '(' expr ')' stmt
+        """
+        mast = token2ast(self.cur_token)
+        self.force_match_op(Operator.LBRA)
+        mast.append((yield self._parse_expr()))
+        self.force_match_op(Operator.RBRA)
+        mast.append((yield self._parse_stmt()))
+        return mast 
+
+    def _parse_for(self):
+        """ iter_stmt = 'for' '(' expr ';' expr ';' expr ')' stmt
+        """
+        mast = token2ast(self.cur_token)
+        self.force_match_op(Operator.LBRA)
+        mast.append((yield self._parse_expr()))
+        self.force_match(TokenType.EOL)
+        mast.append((yield self._parse_expr()))
+        self.force_match(TokenType.EOL)
+        mast.append((yield self._parse_expr()))
+        self.force_match_op(Operator.RBRA)
+        mast.append((yield self._parse_stmt()))
+        return mast 
+
+    def _parse_return(self):
+        """ jump_stmt = 'return' expr? ';'
+        """
+        mast = token2ast(self.cur_token)
+        if not self.match(TokenType.EOL):
+            mast.append((yield self._parse_expr()))
+        return mast 
+
 
     def _parse_expr(self):
         """ Parse an expression (include assignment)
         Syntax:
             expr = simple_expr | postfix_expr '=' expr
         """
+        return self._parse_simple_expr(True)
 
-        mast, maxpred = self._parse_simple_expr()
-
-        # assignment
-        if self.match(TokenType.OP, lambda x: OpAryLoc[x] == 2 and OpAssoLoc[x] == 1):
-            # check if left is simple enough
-            if maxpred > 1:
-                raise SynError('Lvalue required for assignment', self.lexer.cur_pos())
-            
-            return AST(ASTType.OP, self.cur_token.val, nodes=[mast, self._parse_expr()])
-
-        else:
-            return mast 
-
-    def _parse_simple_expr(self):
+    def _parse_simple_expr(self, assignment=False):
         """ Parse an expression without assignment.
-        Returns: Maximum precedence of operator appeared.
-        """
+            assignment: Also parse a following assignment (see _parse_expr).
+        Syntax:
 
-        def parse_unary_expr():
-            """ Parse an unary expression.
-            Syntax:
+            unary_expr = postfix_expr | '++|--|+|-' unary_expr;
+            postfix_expr = primary_expr 
+                | postfix_expr '[' expr ']'
+                | postfix_expr '(' expr_list? ')'
+                | postfix_expr '.' id
+                | postfix_expr '++|--';
+            primary_expr = id | value | '(' expr ')';
+        """
 
-                unary_expr = postfix_expr | '++|--|+|-' unary_expr;
-                postfix_expr = primary_expr 
-                    | postfix_expr '[' expr ']'
-                    | postfix_expr '(' expr_list? ')'
-                    | postfix_expr '.' id
-                    | postfix_expr '++|--';
-                primary_expr = id | value | '(' expr ')';
-            """
+        op_stack = [None]
+        pred_stack = [99]   # precedence of op_stack; 99 for the bottom
+        var_stack = []
+        maxpred = 0
 
+        while True:
             builder_pre = ASTBuilder()
             builder_post = ASTBuilder()
 
             # unary operators
 
-            while True:
-                if self.match_op(Operator.INC) or self.match_op(Operator.DEC):
-                    builder_pre.ext_child(self.cur_token)
-                elif self.match_op(Operator.ADD):
-                    builder_pre.ext_child(AST(ASTType.OP, Operator.PLUS))
-                elif self.match_op(Operator.SUB):
-                    builder_pre.ext_child(AST(ASTType.OP, Operator.MINUS))
-                elif self.match_op(Operator.NOT):
-                    builder_pre.ext_child(AST(ASTType.OP, Operator.NOT))
-                else:
-                    break 
+            while self.next_token.tp is TokenType.OP and PrefixOp[self.next_token.val._value_] is not None:
+                builder_pre.ext_child(AST(ASTType.OP, PrefixOp[self.next_token.val._value_]))
+                self.match(TokenType.OP)
 
             # primary_expr
 
             if self.match(TokenType.NAME) or self.match(TokenType.VAL):
                 builder_post.ext_child(self.cur_token)
             elif self.match_op(Operator.LBRA):
-                builder_post.ext_child(self._parse_expr())
+                builder_post.ext_child((yield self._parse_expr()))
                 self.force_match_op(Operator.RBRA)
             else:
                 raise SynError('Unrecognized token: %r' % self.next_token, self.lexer.cur_pos())
 
             # postfix expr
 
-            while True:
+            while self.next_token.tp is TokenType.OP:
                 # subscript
                 if self.match_op(Operator.LSUB):
                     builder_post.ext_parent(AST(ASTType.OP, Operator.LSUB))
-                    builder_post.add_child(self._parse_expr())
+                    builder_post.add_child((yield self._parse_expr()))
                     self.force_match_op(Operator.RSUB)
 
                 # function call
@@ -317,7 +412,7 @@ class Parser:
                     builder_post.ext_parent(AST(ASTType.CALL))
                     if not self.match_op(Operator.RBRA):
                         while True:
-                            builder_post.add_child(self._parse_expr())
+                            builder_post.add_child((yield self._parse_expr()))
                             if not self.match_sep(Separator.COMMA):
                                 break
                         self.force_match_op(Operator.RBRA)
@@ -334,44 +429,37 @@ class Parser:
                     break 
 
             builder_pre.ext_child(builder_post.ast)
-            return builder_pre.ast 
+            var_stack.append(builder_pre.ast)
 
-        op_stack = [None]
-        var_stack = []
-        maxpred = 0
+            # binary operators
 
-        while True:
-            var_stack.append(parse_unary_expr())
-            if not self.match_noget(TokenType.OP):
+            token = self.next_token
+            if token.tp is not TokenType.OP:
                 break 
 
-            cur_op = self.next_token.val 
+            cur_op = token.val 
+            role = OpRole[cur_op._value_]
 
-            # assignment
-            if OpAryLoc[cur_op] == 2 and OpAssoLoc[cur_op] == 1:
+            # assignment / right bracket
+            if role == OP_ASSIGN or role == OP_CLOSE:
                 break
 
-            # right bracket
-            if cur_op == Operator.RBRA or cur_op == Operator.RSUB:
-                break 
-
             self.match(TokenType.OP)
 
-            if OpAryLoc[cur_op] == 1 or OpAssoLoc[cur_op] != 0:
+            if role == OP_ERROR:
                 raise SynError('Incorrect operator: %s' % self.cur_token.val, self.lexer.cur_pos())
 
-            curpred = precedence(cur_op)
-            maxpred = max(maxpred, curpred)
-            # check precedence
-            # push operator
-            if curpred < precedence(op_stack[-1]):
-                op_stack.append(cur_op)
+            curpred = OpPrecedence[cur_op._value_]
+            if curpred > maxpred:
+                maxpred = curpred
 
-            else: # all left association
-                while curpred >= precedence(op_stack[-1]):
-                    rv, lv = var_stack.pop(), var_stack.pop()
-                    var_stack.append(AST(ASTType.OP, op_stack.pop(), nodes=[lv, rv]))
-                op_stack.append(cur_op)
+            # all left association: reduce operators with higher or equal precedence
+            while curpred >= pred_stack[-1]:
+                pred_stack.pop()
+                rv, lv = var_stack.pop(), var_stack.pop()
+                var_stack.append(AST(ASTType.OP, op_stack.pop(), nodes=[lv, rv]))
+            op_stack.append(cur_op)
+            pred_stack.append(curpred)
 
         while len(op_stack) > 1:
             rv, lv = var_stack.pop(), var_stack.pop()
@@ -380,7 +468,18 @@ class Parser:
         if len(op_stack) != 1 or len(var_stack) != 1:
             raise SynError('Binary operator not match', self.lexer.cur_pos())
 
-        return var_stack.pop(), maxpred
+        mast = var_stack.pop()
+
+        # assignment (right association)
+        if assignment and token.tp is TokenType.OP and role == OP_ASSIGN:
+            self.match(TokenType.OP)
+            # check if left is simple enough
+            if maxpred > 1:
+                raise SynError('Lvalue required for assignment', self.lexer.cur_pos())
+
+            return AST(ASTType.OP, cur_op, nodes=[mast, (yield self._parse_simple_expr(True))])
+
+        return mast
 
     def _parse_decl(self):
         """ Parse a variable declaration without line end.
@@ -406,7 +505,7 @@ class Parser:
                 if self.match_op(Operator.LSUB):
                    # builder.ext_parent(AST(ASTType.DECL, DeclNode.ARRAYDECL))
                     if not self.match(Operator.RSUB):
-                        builder.add_child(self._parse_simple_expr()[0])
+                        builder.add_child((yield self._parse_simple_expr()))
                         self.force_match_op(Operator.RSUB)
                 else:
                     break 
@@ -426,7 +525,7 @@ class Parser:
             if self.match_sep(Separator.LCPD):
                 mast = AST(ASTType.LIST)
                 while True:
-                    mast.append(parse_initializer())
+                    mast.append((yield parse_initializer()))
                     if not self.match_sep(Separator.COMMA):
                         break 
 
@@ -434,7 +533,7 @@ class Parser:
                 return mast 
 
             else:
-                return self._parse_expr()
+                return (yield self._parse_expr())
 
         mast = AST(ASTType.DECL, DeclNode.VARDECL)
         self.force_match(TokenType.TYPE)
@@ -443,62 +542,58 @@ class Parser:
         # decl_init_list
         while True:
             mast.append(AST(ASTType.DECL, DeclNode.DECLELEM))
-            mast.nodes[-1].append(parse_declarator())
+            mast.nodes[-1].append((yield parse_declarator()))
             if self.match_op(Operator.ASN):
-                mast.nodes[-1].append(parse_initializer())
+                mast.nodes[-1].append((yield parse_initializer()))
             if not self.match_sep(Separator.COMMA):
                 break
 
         return mast 
 
-    def match(self, token_type, func=None):
-        if self.next_token.tp == token_type:
-            if func is None or func(self.next_token.val):
-                self.cur_token = self.next_token
-                self.next_token = self.lexer.get_token()
-                return True 
-        else:
-            return False 
+    def match(self, token_type, value=None):
+        """ Consume next token if it has type token_type (and value, if given).
+        """
+        token = self.next_token
+        if token.tp is token_type and (value is None or token.val is value):
+            self.cur_token = token
+            self.next_token = self.lexer.get_token()
+            return True 
+        return False 
 
     def match_op(self, opname):
-        return self.match(TokenType.OP, lambda x:x == opname)
+        return self.match(TokenType.OP, opname)
 
     def match_sep(self, sepname):
-        return self.match(TokenType.SEP, lambda x:x == sepname)
+        return self.match(TokenType.SEP, sepname)
 
-    def force_match(self, token_type, func=None):
-        if not self.match(token_type, func):
+    def force_match(self, token_type, value=None):
+        if not self.match(token_type, value):
             raise SynError('Token not match: %s required, got %s' % (token_type, self.next_token), self.lexer.cur_pos())
         
     def force_match_op(self, opname):
-        if not self.match_op(opname):
+        if not self.match(TokenType.OP, opname):
             raise SynError('Operator not match: %s required, got %s' % (opname, self.next_token.val), self.lexer.cur_pos())
 
     def force_match_sep(self, sepname):
-        if not self.match_sep(sepname):
+        if not self.match(TokenType.SEP, sepname):
             raise SynError('Separator not match: %s required, got %s' % (sepname, self.next_token.val), self.lexer.cur_pos())
 
-    def match_noget(self, token_type, func=None):
+    def match_noget(self, token_type, value=None):
         """ Match without get. So next time still same token.
         """
-        if self.next_token.tp == token_type:
-            if func is None or func(self.next_token.val):
-                return True 
-        else:
-            return False 
+        token = self.next_token
+        return token.tp is token_type and (value is None or token.val is value)
         
-    def match_ahead(self, token_type, func=None):
+    def match_ahead(self, token_type, value=None):
         """ Match with look ahead.
         """
         if not self.next_look_token:
             self.next_look_token = self.next_token
 
-        if self.next_look_token.tp == token_type:
-            if func is None or func(self.next_token.val):
-                self.next_look_token = self.lexer.look_ahead()
-                return True 
-            else:
-                return False 
+        if self.next_look_token.tp is token_type and (value is None or self.next_look_token.val is value):
+            self.next_look_token = self.lexer.look_ahead()
+            return True 
+        return False 
 
     def revert(self):
         self.next_look_token = None 
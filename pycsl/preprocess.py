@@ -2,14 +2,145 @@
 """
 
 import re 
+import mmap
 import os.path
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
 
 from .errors import ReadError
 
 
-class Preprocessor:
+class SourceLoc(namedtuple('SourceLoc', ['file', 'line', 'column'])):
+    """ A resolved source location (line and column are 1-based)
+    """
+
+    def __str__(self):
+        return '%s:%d:%d' % (self.file, self.line, self.column)
+
+
+class SourceMap:
+    """ Maps offsets in preprocessed output back to source files.
+
+        Every fragment appended to the output is a segment; segments are kept
+        in parallel arrays sorted by output offset, so a lookup is a bisect.
+        A segment may also be a whole file buffer (mmap mode); its line index
+        is only built on the first lookup that hits it.
+    """
 
     def __init__(self):
+        self.files = []             # list of file names
+        self.offsets = array('L')   # start offset of segment in output
+        self.file_ids = array('L')  # index in self.files
+        self.lines = array('L')     # source line of segment
+        self.columns = array('L')   # source column of segment start (0-based)
+        self.buffers = {}           # dict{segment index: buffer}, for buffer segments
+        self.line_starts = {}       # dict{segment index: array of line start offsets}
+
+    def clear(self):
+        self.buffers.clear()
+        self.line_starts.clear()
+        self.files.clear()
+        del self.offsets[:]
+        del self.file_ids[:]
+        del self.lines[:]
+        del self.columns[:]
+
+    def add_file(self, filename):
+        """ Register a file. Returns its id.
+        """
+        self.files.append(filename)
+        return len(self.files) - 1
+
+    def add(self, offset, file_id, line, column=0):
+        """ Add a segment starting at `offset` of output. Offsets must be
+            added in increasing order.
+        """
+        self.offsets.append(offset)
+        self.file_ids.append(file_id)
+        self.lines.append(line)
+        self.columns.append(column)
+
+    def add_buffer(self, offset, file_id, buf):
+        """ Add a whole file buffer as one segment, starting at line 1.
+        """
+        self.buffers[len(self.offsets)] = buf
+        self.add(offset, file_id, 1)
+
+    def lookup(self, offset):
+        """ Returns SourceLoc of output offset, or None if not mapped.
+        """
+        idx = bisect_right(self.offsets, offset) - 1
+        if idx < 0:
+            return None
+
+        if idx in self.buffers:
+            if idx not in self.line_starts:
+                self.line_starts[idx] = array('L', [0] + [
+                    m.end() for m in re.finditer(b'\n', self.buffers[idx])])
+            starts = self.line_starts[idx]
+            local = offset - self.offsets[idx]
+            line = bisect_right(starts, local)
+            return SourceLoc(self.files[self.file_ids[idx]], line, local - starts[line - 1] + 1)
+
+        return SourceLoc(
+            self.files[self.file_ids[idx]],
+            self.lines[idx],
+            self.columns[idx] + offset - self.offsets[idx] + 1
+        )
+
+
+# translation table blanking everything but newlines
+_BLANK_TABLE = bytes(c if c == ord('\n') else ord(' ') for c in range(256))
+
+
+def blank_comments(buf, on_blockcomm=False):
+    """ Overwrite comments in a writable buffer with spaces, keeping newlines
+        so offsets and lines are unchanged. Scans the buffer once.
+        Returns whether the buffer ends inside a block comment.
+    """
+    pos = 0
+    size = len(buf)
+
+    if on_blockcomm:
+        end = buf.find(b'*/')
+        end = size if end < 0 else end + 2
+        buf[:end] = buf[:end].translate(_BLANK_TABLE)
+        if end == size:
+            return True
+        pos = end
+
+    while True:
+        pos = buf.find(b'/', pos)
+        if pos < 0 or pos + 1 >= size:
+            return False
+
+        nextc = buf[pos + 1]
+        if nextc == ord('/'):
+            end = buf.find(b'\n', pos)
+            end = size if end < 0 else end
+            buf[pos:end] = b' ' * (end - pos)
+            pos = end
+
+        elif nextc == ord('*'):
+            end = buf.find(b'*/', pos + 2)
+            if end < 0:
+                buf[pos:] = buf[pos:].translate(_BLANK_TABLE)
+                return True
+            end += 2
+            buf[pos:end] = buf[pos:end].translate(_BLANK_TABLE)
+            pos = end
+
+        else:
+            pos += 1
+
+
+class Preprocessor:
+
+    MMAP = False            # map files and blank comments in place instead of reading by line
+
+    def __init__(self, use_mmap=None):
+        self.use_mmap = Preprocessor.MMAP if use_mmap is None else use_mmap
         self.suffix = '.csl'
         self.include_paths = ['.']
         self.macro_flag = r'\#' # macro is not used currently
@@ -18,6 +149,10 @@ class Preprocessor:
         self.on_blockcomm = False
         self.strstack = []
         self.included_files = set()
+        self.source_map = SourceMap()
+        self.out_len = 0            # length of output so far
+        self.cur_file_id = None     # file/line being processed, for source_map
+        self.cur_line = 0
 
         self.clear()
 
@@ -27,6 +162,10 @@ class Preprocessor:
         self.on_blockcomm = False 
         self.strstack.clear()
         self.included_files.clear()
+        self.source_map.clear()
+        self.out_len = 0
+        self.cur_file_id = None
+        self.cur_line = 0
         self.re_macro = re.compile(self.macro_flag)
         self.re_linecomm = re.compile(self.linecomm_flag)
         self.re_blkcomm_begin = re.compile(self.blockcomm_flags[0])
@@ -59,35 +198,77 @@ class Preprocessor:
         else:
             self.included_files.add(fullname)
             self.include_paths.append(os.path.dirname(fullname))
-            with open(fullname, 'r') as finput:
-                for line in finput:
-                    self.process_line(line)
+            self.cur_file_id = self.source_map.add_file(fullname)
+            if self.use_mmap:
+                self.process_mmap(fullname)
+            else:
+                with open(fullname, 'r') as finput:
+                    for lineno, line in enumerate(finput, 1):
+                        self.cur_line = lineno
+                        self.process_line(line)
+            self.cur_file_id = None
+
+    def process_mmap(self, fullname):
+        """ Map a file copy-on-write and blank its comments in place.
+            The mapped buffer itself becomes part of the output.
+        """
+        with open(fullname, 'rb') as finput:
+            try:
+                buf = mmap.mmap(finput.fileno(), 0, access=mmap.ACCESS_COPY)
+            except ValueError: # empty file
+                return
 
+        self.on_blockcomm = blank_comments(buf, self.on_blockcomm)
+        self.source_map.add_buffer(self.out_len, self.cur_file_id, buf)
+        self.out_len += len(buf)
+        self.strstack.append(buf)
 
     def process_line(self, string):
-        """ Process a string in one line
+        """ Process a string in one line.
+            Comments are dropped; a block comment is replaced by a space.
         """
-        if self.on_blockcomm:
-            blockcomm_end = self.re_blkcomm_end.search(string)
-            if blockcomm_end:
-                string = string[blockcomm_end.endpos:]
+        pos = 0
+        while pos < len(string):
+
+            if self.on_blockcomm:
+                blockcomm_end = self.re_blkcomm_end.search(string, pos)
+                if not blockcomm_end:
+                    return
+                pos = blockcomm_end.end()
                 self.on_blockcomm = False
-            else:
+                continue
+
+            comm_start = self.re_linecomm.search(string, pos)
+            blockcomm_start = self.re_blkcomm_begin.search(string, pos)
+
+            if blockcomm_start and (not comm_start or blockcomm_start.start() < comm_start.start()):
+                self.append(string[pos:blockcomm_start.start()] + ' ', pos)
+                pos = blockcomm_start.end()
+                self.on_blockcomm = True
+
+            elif comm_start:
+                self.append(string[pos:comm_start.start()] + '\n', pos)
                 return
-        
-        comm_start = self.re_linecomm.search(string)
-        if comm_start:
-            string = string[:comm_start.pos]
 
-        blockcomm_start = self.re_blkcomm_begin.search(string)
-        if blockcomm_start:
-            string = string[:blockcomm_start.pos]
-            self.on_blockcomm = True 
+            else:
+                self.append(string[pos:], pos)
+                return
 
+    def append(self, string, column=0):
+        """ Append a fragment of current line to output.
+        """
+        if self.cur_file_id is not None:
+            self.source_map.add(self.out_len, self.cur_file_id, self.cur_line, column)
+        self.out_len += len(string)
         self.strstack.append(string)
 
-
     def result(self):
-        """ Output result.
+        """ Output result. A single mapped file is returned as the buffer
+            itself; otherwise fragments are joined.
         """
-        return ''.join(self.strstack)
+        if all(isinstance(s, str) for s in self.strstack):
+            return ''.join(self.strstack)
+        elif len(self.strstack) == 1:
+            return self.strstack[0]
+        else:
+            return b''.join(s.encode() if isinstance(s, str) else s for s in self.strstack)
@@ -0,0 +1,153 @@
+""" Symbol tables used in translation.
+"""
+
+from .grammar.basic_types import ValType
+from .ir.types import Pointer
+from .errors import CompileError
+
+
+def conversion_cost(src, target):
+    """ Cost of passing a value of type src as type target:
+        0: same type; 1: promotion; 2: narrowing or int <=> float;
+        3: pointer cast; None: not convertible.
+    """
+    if src == target:
+        return 0
+    elif isinstance(src, ValType) and isinstance(target, ValType):
+        if src == ValType.VOID or target == ValType.VOID:
+            return None
+        elif target.value > src.value and not (src == ValType.FLOAT or target == ValType.FLOAT):
+            return 1
+        else:
+            return 2
+    elif isinstance(src, Pointer) and isinstance(target, Pointer):
+        return 3
+    else:
+        return None
+
+
+class OverloadTable:
+    """ Function signatures indexed by name.
+        A signature is a tuple (name, argtypes, rettype). resolve() picks the
+        signature whose arguments need the cheapest conversions (see
+        conversion_cost), the first declared one on a tie; results are cached
+        per (name, argtypes) until an overload of that name is added.
+    """
+
+    def __init__(self):
+        self.overloads = dict()     # dict{name: [signature]} in declaration order
+        self.resolved = dict()      # dict{name: dict{argtypes: signature}}
+
+    def __contains__(self, name):
+        return name in self.overloads
+
+    def add(self, signature):
+        """ Register a signature.
+        """
+        self.overloads.setdefault(signature[0], []).append(signature)
+        self.resolved.pop(signature[0], None)
+
+    def resolve(self, name, argtypes):
+        """ Returns the signature called by name(args of argtypes).
+        """
+        argtypes = tuple(argtypes)
+        cache = self.resolved.get(name)
+        if cache is None:
+            cache = self.resolved[name] = dict()
+        else:
+            signature = cache.get(argtypes)
+            if signature is not None:
+                return signature
+
+        candidates = self.overloads.get(name)
+        if not candidates:
+            raise CompileError('Function "%s" not defined' % name)
+
+        best = None
+        best_cost = None
+        for signature in candidates:
+            if len(signature[1]) != len(argtypes):
+                continue
+            cost = 0
+            for src, target in zip(argtypes, signature[1]):
+                c = conversion_cost(src, target)
+                if c is None:
+                    break
+                cost += c
+            else:
+                if best_cost is None or cost < best_cost:
+                    best, best_cost = signature, cost
+                    if cost == 0:
+                        break
+
+        if best is None:
+            if all(len(signature[1]) != len(argtypes) for signature in candidates):
+                raise CompileError("Argument number not match")
+            raise CompileError('No matching function for %s(%s)' % (name, ','.join(str(t) for t in argtypes)))
+
+        cache[argtypes] = best
+        return best
+
+
+class ScopedSymbolTable:
+    """ Names of nested scopes.
+        Every name maps to a stack of its bindings (scope depth, value),
+        innermost last, and every scope logs the names it declared, so that
+        lookup, declaration and push() do not depend on the nesting depth;
+        pop() costs the number of names of the scope.
+    """
+
+    def __init__(self):
+        self.symbols = dict()   # dict{name: [(depth, binding)]} innermost last
+        self.scopes = []        # list [list of names declared in scope]
+
+    def __len__(self):
+        """ Number of open scopes.
+        """
+        return len(self.scopes)
+
+    def __contains__(self, name):
+        """ Whether name is declared in any open scope.
+        """
+        return name in self.symbols
+
+    def push(self):
+        """ Open a scope.
+        """
+        self.scopes.append([])
+
+    def pop(self):
+        """ Close the innermost scope, dropping its names.
+        """
+        symbols = self.symbols
+        for name in self.scopes.pop():
+            bindings = symbols[name]
+            if len(bindings) == 1:
+                del symbols[name]
+            else:
+                bindings.pop()
+
+    def declare(self, name, value):
+        """ Bind name in the innermost scope. A name declared again in the
+            same scope is rebound.
+        """
+        depth = len(self.scopes)
+        bindings = self.symbols.get(name)
+        if bindings is None:
+            self.symbols[name] = [(depth, value)]
+        elif bindings[-1][0] == depth:
+            bindings[-1] = (depth, value)
+            return
+        else:
+            bindings.append((depth, value))
+        self.scopes[-1].append(name)
+
+    def lookup(self, name, default=None):
+        """ Returns the innermost binding of name, or default.
+        """
+        bindings = self.symbols.get(name)
+        return bindings[-1][1] if bindings is not None else default
+
+    def clear(self):
+        self.symbols.clear()
+        self.scopes.clear()
@@ -30,12 +30,14 @@ class Token:
     """ Token object
     """
 
-    def __init__(self, tp:TokenType, val):
+    def __init__(self, tp:TokenType, val, pos=None):
         """ tp ===> Type
             val ===> Specific value
+            pos ===> Start offset in source (resolved by preprocess.SourceMap)
         """
         self.tp = tp 
         self.val = val 
+        self.pos = pos 
         
     def __repr__(self):
         return '<%s, %r>' % (self.tp.name, self.val)
@@ -10,12 +10,16 @@ from .grammar.keywords import Keyword
 from .tokens import Symbol
 from .ast import AST, ASTType, DeclNode
 
-from .ir.tac import Code, TAC, op2code
+from .ir.tac import Code, TAC, OpCodeLoc
 from .ir.types import Array, Pointer
-from .ir.memory import Register, Label, Block, MemoryLoc, Identifier
+from .ir.memory import Register, Block, MemoryLoc, Identifier
 
 from .errors import CompileError
-from .evalute import eval_op
+from .util.trampoline import trampoline
+from .visitor import Visitor, visits
+from .evalute import eval_op, cast_value
+from .ctfe import Evaluator
+from .symtable import OverloadTable, ScopedSymbolTable
 
 
 class Side:
@@ -23,7 +27,25 @@ class Side:
     RHS = 1
 
 
-class Translater:
+# Operators by handler in Translater
+AssignOps = [op for op in OpCodeLoc if OpAsnLoc[op] and OpAryLoc[op] == 2]
+IncDecOps = [op for op in OpCodeLoc if OpAsnLoc[op] and OpAryLoc[op] == 1]
+BinaryOps = [op for op in OpCodeLoc if not OpAsnLoc[op] and OpAryLoc[op] == 2]
+UnaryOps = [op for op in OpCodeLoc if not OpAsnLoc[op] and OpAryLoc[op] == 1]
+
+
+class Translater(Visitor):
+    """ Translate AST into TAC.
+        Nodes are dispatched to handlers by visit(): statements take the node
+        only; expressions take (node, side, lazyeval) and return the
+        Identifier / Value holding the result.
+        lazyeval: Generate short-circuit code for and/or. But is recommended to 
+            turn off this option here and let optimizer do this task.
+        Handlers walking the AST recursively are generators run by
+        util.trampoline: they yield the generator of a sub-translation and
+        receive its result, so nesting depth is not bounded by the Python
+        recursion limit.
+    """
 
     ARRAY_SIZE_LIMIT = 16384        # maximum size of single array decalared
     POINTER_ARITHMETIC = True       # allow add and sub between pointers with same type
@@ -32,21 +54,24 @@ class Translater:
     EXPLICIT_TYPE = True            # type must be explicitly declared (not allow void)
 
     def __init__(self):
+        super().__init__()
 
         # symbol tables
         self.global_sym_table = dict()  # dict{string: Register}
-        self.function_table = dict()    # dict{function name: function signature}
-        self.sym_table_stack = []       # dict{string <-- var name:Identifier <-- register id}
+        self.function_table = dict()    # dict{function signature: index in functions, None if declared only}
+        self.overloads = OverloadTable()    # signatures by function name
+        self.sym_table = ScopedSymbolTable()    # local var name ==> Identifier <-- register id
         
         # functions
         self.functions = []             # list [Block]
         self.global_values = {}         # dict{string: Value}; Value of global vars;
+        self.evaluator = Evaluator()    # runs functions called in constant expressions
 
         # temporary variables
         self.curfunction = None
         self.currettype = None
         self.looplabelstack = []
-        self.labelidpool = []
+        self.labelidpool = set()        # labels created but not inserted
 
     def clear(self):
         self.curfunction = None
@@ -58,9 +83,10 @@ class Translater:
         """
         assert ast.type == ASTType.ROOT
 
+        self.evaluator.add_functions(ast)
         for node in ast.nodes:
             if node.type == ASTType.DECL:
-                self._translate_decl(node, True)
+                trampoline(self._translate_decl(node, True))
             elif node.type == ASTType.FUNC:
                 self._translate_function(node)
             else:
@@ -76,9 +102,9 @@ class Translater:
         self.clear()
 
         if ast.type == ASTType.DECL:
-            self._translate_decl(ast, False)
+            trampoline(self._translate_decl(ast, False))
         else:
-            r = self._translate_expr(ast)
+            r = trampoline(self.visit(ast))
             self.write(Code.RET, r) # Controversal: Need to use something to disable it in interperator.
 
     def _translate_function(self, ast:AST):
@@ -99,15 +125,16 @@ class Translater:
 
         self.functions.append(Block())
         self.curfunction = self.functions[-1]
+        self.curfunction.argnum = len(argtypes)
         self.currettype = rettype
         self.looplabelstack.clear()
         self.labelidpool.clear()
 
-        self.sym_table_stack.append(dict())
+        self.sym_table.push()
 
         # allocate registers that stores original arguments
         for argname, argtype in zip(argnames, argtypes):
-            self.sym_table_stack[-1][argname] = self.create_reg(argtype)
+            self.sym_table.declare(argname, self.create_reg(argtype))
 
         # label of function block
         lblentry = self.create_label()
@@ -118,14 +145,14 @@ class Translater:
             
             argid = self.create_reg(Pointer(argtype))
             self.write(Code.ALLOC, argid, argtype)
-            self.write(Code.STORE, None, self.sym_table_stack[-1][argname], argid)
-            self.sym_table_stack[-1][argname] = argid # now change reference into local copy
+            self.write(Code.STORE, None, self.sym_table.lookup(argname), argid)
+            self.sym_table.declare(argname, argid) # now change reference into local copy
 
 
         assert ast.nodes[1].type == ASTType.BLOCK
 
-        self._translate_stmt(ast.nodes[1])
-        self.sym_table_stack.pop()
+        trampoline(self.visit(ast.nodes[1]))
+        self.sym_table.pop()
 
         if Translater.EXPLICIT_TYPE and self.curfunction.codes[-1].code != Code.RET:
             if rettype != ValType.VOID:
@@ -133,7 +160,7 @@ class Translater:
             else:
                 self.write(Code.RET, None, Value(ValType.VOID, None))
 
-        assert len(self.sym_table_stack) == 0
+        assert len(self.sym_table) == 0
         assert len(self.looplabelstack) == 0
         self.curfunction = None
         self.currettype = None
@@ -184,138 +211,116 @@ class Translater:
                     ))
         else:
             self.function_table[signature] = None
+            self.overloads.add(signature)
 
         return signature, argnames
 
-    def _translate_stmt(self, ast:AST):
-        """ Translate statement (including compound statement)
+    @visits(ASTType.BLOCK)
+    def _translate_block(self, ast:AST):
+        """ Translate compound statement
         """
-
-        if ast.type == ASTType.BLOCK:
-            self.sym_table_stack.append(dict())
-            for node in ast.nodes:
-                if node.type == ASTType.DECL:
-                    self._translate_decl(node, False)
-                else:
-                    self._translate_stmt(node)
-            self.sym_table_stack.pop()
-
-        elif ast.type == ASTType.DECL:
-            self._translate_decl(ast, False)
-
-        elif ast.type == ASTType.CTRL:
-            self._translate_ctrl(ast)
-
-        else:
-            self._translate_expr(ast)
-
-    def _translate_ctrl(self, ast:AST):
-        
-        if ast.value == Keyword.IF:
-            varcond = self._translate_expr(ast.nodes[0]) ## TODO: Type check
-            lbltrue = self.create_label()
-            lblfalse = self.create_label()
-            self.write(Code.BR, None, lbltrue, lblfalse, cond=varcond)
-            self.insert_label(lbltrue)
-            self._translate_stmt(ast.nodes[1])
-
-            if len(ast.nodes) == 3:
-                lblend = self.create_label()
-                self.write(Code.BR, None, lblend)
-                self.insert_label(lblfalse)
-                self._translate_stmt(ast.nodes[2])
-                self.write(Code.BR, None, lblend)
-                self.insert_label(lblend)
-            else:
-                self.write(Code.BR, None, lblfalse)
-                self.insert_label(lblfalse)
-
-        elif ast.value == Keyword.WHILE:
-
-            lblbegin = self.create_label()
-            self.write(Code.BR, None, lblbegin)
-            self.insert_label(lblbegin)
-            varcond = self._translate_expr(ast.nodes[0])
-            lblloop = self.create_label()
-            lblend = self.create_label()
-            self.write(Code.BR, None, lblloop, lblend, cond=varcond)
-            self.looplabelstack.append((lblbegin, lblend))
-            self.insert_label(lblloop)
-            self._translate_stmt(ast.nodes[1])
-            self.write(Code.BR, None, lblbegin)
-            self.insert_label(lblend)
-            self.looplabelstack.pop()
-
-        elif ast.value == Keyword.FOR:
-
-            self._translate_expr(ast.nodes[0])
-            lblbegin = self.create_label()
-            self.write(Code.BR, None, lblbegin)
-            self.insert_label(lblbegin)
-            varcond = self._translate_expr(ast.nodes[1])
-            lblloop = self.create_label()
+        self.sym_table.push()
+        for node in ast.nodes:
+            yield self.visit(node)
+        self.sym_table.pop()
+
+    @visits((ASTType.CTRL, Keyword.IF))
+    def _translate_if(self, ast:AST):
+        varcond = yield self.visit(ast.nodes[0]) ## TODO: Type check
+        lbltrue = self.create_label()
+        lblfalse = self.create_label()
+        self.write(Code.BR, None, lbltrue, lblfalse, cond=varcond)
+        self.insert_label(lbltrue)
+        yield self.visit(ast.nodes[1])
+
+        if len(ast.nodes) == 3:
             lblend = self.create_label()
-            self.write(Code.BR, None, lblloop, lblend, cond=varcond)
-            self.insert_label(lblloop)
-            lblctn = self.create_label()
-            self.looplabelstack.append((lblctn, lblend))
-            self._translate_stmt(ast.nodes[3])
-            self.write(Code.BR, None, lblctn)
-            self.insert_label(lblctn)
-            self._translate_expr(ast.nodes[2])
-            self.write(Code.BR, None, lblbegin)
+            self.write(Code.BR, None, lblend)
+            self.insert_label(lblfalse)
+            yield self.visit(ast.nodes[2])
+            self.write(Code.BR, None, lblend)
             self.insert_label(lblend)
-            self.looplabelstack.pop()
-        
-        elif ast.value == Keyword.BREAK:
-            if not self.looplabelstack:
-                raise CompileError('"break" must be inside loop')
-            self.write(Code.BR, None, self.looplabelstack[-1][1])
-
-        elif ast.value == Keyword.CONTINUE:
-            if not self.looplabelstack:
-                raise CompileError('"continue" must be inside loop')
-            self.write(Code.BR, None, self.looplabelstack[-1][0])
-
-        elif ast.value == Keyword.RETURN:
-            if not ast.nodes:
-                if Translater.EXPLICIT_TYPE and self.currettype == ValType.VOID:
-                    return Value(ValType.VOID, None)
-                else:
-                    raise CompileError('Must return a value')
+        else:
+            self.write(Code.BR, None, lblfalse)
+            self.insert_label(lblfalse)
+
+    @visits((ASTType.CTRL, Keyword.WHILE))
+    def _translate_while(self, ast:AST):
+        lblbegin = self.create_label()
+        self.write(Code.BR, None, lblbegin)
+        self.insert_label(lblbegin)
+        varcond = yield self.visit(ast.nodes[0])
+        lblloop = self.create_label()
+        lblend = self.create_label()
+        self.write(Code.BR, None, lblloop, lblend, cond=varcond)
+        self.looplabelstack.append((lblbegin, lblend))
+        self.insert_label(lblloop)
+        yield self.visit(ast.nodes[1])
+        self.write(Code.BR, None, lblbegin)
+        self.insert_label(lblend)
+        self.looplabelstack.pop()
+
+    @visits((ASTType.CTRL, Keyword.FOR))
+    def _translate_for(self, ast:AST):
+        yield self.visit(ast.nodes[0])
+        lblbegin = self.create_label()
+        self.write(Code.BR, None, lblbegin)
+        self.insert_label(lblbegin)
+        varcond = yield self.visit(ast.nodes[1])
+        lblloop = self.create_label()
+        lblend = self.create_label()
+        self.write(Code.BR, None, lblloop, lblend, cond=varcond)
+        self.insert_label(lblloop)
+        lblctn = self.create_label()
+        self.looplabelstack.append((lblctn, lblend))
+        yield self.visit(ast.nodes[3])
+        self.write(Code.BR, None, lblctn)
+        self.insert_label(lblctn)
+        yield self.visit(ast.nodes[2])
+        self.write(Code.BR, None, lblbegin)
+        self.insert_label(lblend)
+        self.looplabelstack.pop()
+
+    @visits((ASTType.CTRL, Keyword.BREAK))
+    def _translate_break(self, ast:AST):
+        if not self.looplabelstack:
+            raise CompileError('"break" must be inside loop')
+        self.write(Code.BR, None, self.looplabelstack[-1][1])
+
+    @visits((ASTType.CTRL, Keyword.CONTINUE))
+    def _translate_continue(self, ast:AST):
+        if not self.looplabelstack:
+            raise CompileError('"continue" must be inside loop')
+        self.write(Code.BR, None, self.looplabelstack[-1][0])
+
+    @visits((ASTType.CTRL, Keyword.RETURN))
+    def _translate_return(self, ast:AST):
+        if not ast.nodes:
+            if Translater.EXPLICIT_TYPE and self.currettype == ValType.VOID:
+                return Value(ValType.VOID, None)
             else:
-                valret = self._translate_expr(ast.nodes[0])
-                valret_cast = valret if self.get_vartype(valret) == self.currettype else self._translate_typecast(valret, self.currettype)
-                self.write(Code.RET, None, valret_cast)
-
+                raise CompileError('Must return a value')
         else:
-            raise RuntimeError()
+            valret = yield self.visit(ast.nodes[0])
+            valret_cast = valret if self.get_vartype(valret) == self.currettype else self._translate_typecast(valret, self.currettype)
+            self.write(Code.RET, None, valret_cast)
 
-    def _translate_expr(self, ast:AST, side=Side.RHS, lazyeval=False):
-        """ Translate basic expression.
-            lazyeval: Generate short-circuit code for and/or. But is recommended to 
-                turn off this option here and let optimizer do this task.
+    @visits(ASTType.VAL)
+    def _translate_val(self, ast:AST, side=Side.RHS, lazyeval=False):
+        """ Translate a direct value
         """
-        
-        if ast.type == ASTType.OP:
-            return self._translate_op(ast, side, lazyeval)
-
-        elif ast.type == ASTType.VAL:
-            if side == Side.LHS:
-                raise CompileError("Cannot assign to constant")
-            return ast.value
-
-        elif ast.type == ASTType.NAME:
-            return self._translate_name(ast, side)
-
-        elif ast.type == ASTType.CALL:
-            return self._translate_funcall(ast)
+        if side == Side.LHS:
+            raise CompileError("Cannot assign to constant")
+        return ast.value
 
-        else:
-            raise RuntimeError()
+    def generic_visit(self, ast:AST, *args, **kwargs):
+        if ast.type == ASTType.OP:
+            raise CompileError("Operator %s is not valid" % ast.value)
+        raise RuntimeError()
 
     def _eval_expr(self, ast:AST):
-        """ Evaluate constant expression (values, operations)
+        """ Evaluate constant expression (values, operations, calls of
+            functions without side effects, see ctfe.Evaluator)
             const variables are not supported yet
         """
         if ast.type == ASTType.OP:
@@ -324,162 +329,163 @@ class Translater:
                 raise CompileError("Cannot evaluate assignment")
 
             else:
-                lhs = self._eval_expr(ast.nodes[0])
-                rhs = self._eval_expr(ast.nodes[1]) if len(ast.nodes) > 1 else None
+                lhs = yield self._eval_expr(ast.nodes[0])
+                rhs = (yield self._eval_expr(ast.nodes[1])) if len(ast.nodes) > 1 else None
 
-                return eval_op(operator, lhs, rhs)
+                try:
+                    return eval_op(operator, lhs, rhs)
+                except ZeroDivisionError:
+                    raise CompileError("Division by zero in constant expression")
 
         elif ast.type == ASTType.VAL:
             return ast.value
 
+        elif ast.type == ASTType.CALL and ast.nodes[0].type == ASTType.NAME:
+            args = []
+            for node in ast.nodes[1:]:
+                args.append((yield self._eval_expr(node)))
+            return self.evaluator.call(ast.nodes[0].value.name, args)
+
         else:
             raise CompileError('Cannot evaluate %s' % ast.type)
 
-    def _translate_op(self, ast:AST, side, *args):
-        """ Translate an operator (ASTType.OP)
+    @visits((ASTType.OP, Operator.LSUB))
+    def _translate_subscript(self, ast:AST, side=Side.RHS, lazyeval=False):
+        """ Translate array indexing.
+            ptr = GETPTR(a, b)
+            ret = LOAD ptr      (RHS only)
         """
 
         def translate_subscript(mast, subarray):
             """ Translate continues subscripts. Notice: assignment is not allowed in indexer.
             """
             if mast.value != Operator.LSUB:
-                arr = self._translate_expr(mast, Side.LHS, *args[1:])
+                arr = yield self.visit(mast, Side.LHS)
                 arrtype = self.get_vartype(arr) 
                 if not isinstance(arrtype, Pointer) or not (isinstance(arrtype.unref_type(), Pointer) or isinstance(arrtype.unref_type(), Array)):
                     raise CompileError('Subscript may only applied to pointer or array')
                 return arr
             else:
-                lhs = translate_subscript(mast.nodes[0], subarray)
-                idx = self._translate_expr(mast.nodes[1], Side.RHS, *args[1:])
+                lhs = yield translate_subscript(mast.nodes[0], subarray)
+                idx = yield self.visit(mast.nodes[1], Side.RHS)
                 idx_cast = idx if self.get_vartype(idx) == ValType.INT else self._translate_typecast(idx, ValType.INT)
                 subarray.append(idx_cast)
                 return lhs 
 
-        def translate_array_index(mast):
-            """ Translate array indexing, return the pointer to array element;
-                Currently unsupport pointer;
-            """
-            subarray = [Value(ValType.INT, 0)]
-            valarr = translate_subscript(mast, subarray)
-            typeelem = self.get_vartype(valarr)
-            for i in range(len(subarray)):
-                typeelem = typeelem.type
-            valptr = self.create_reg(Pointer(typeelem))
-            self.write(Code.GETPTR, valptr, valarr, subarray)  # %valptr = getptr %valarr %subarray
-            return valptr
-
-        lazyeval = args[0]
+        # pointer to array element; currently unsupport pointer
+        subarray = [Value(ValType.INT, 0)]
+        valarr = yield translate_subscript(ast, subarray)
+        typeelem = self.get_vartype(valarr)
+        for i in range(len(subarray)):
+            typeelem = typeelem.type
+        valptr = self.create_reg(Pointer(typeelem))
+        self.write(Code.GETPTR, valptr, valarr, subarray)  # %valptr = getptr %valarr %subarray
 
-        assert ast.type == ASTType.OP
-
-        operator = ast.value
-        assert OpAryLoc[operator] == len(ast.nodes)
-
-        ## This is for array indexing in RHS
-        ## ptr = GETPTR(a, b)
-        ## ret = LOAD ptr
-        if operator == Operator.LSUB:
-            valptr = translate_array_index(ast)
-
-            if side == Side.LHS:
-                return valptr
+        if side == Side.LHS:
+            return valptr
 
-            else:
-                valret = self.create_reg(self.get_vartype(valptr).unref_type())
-                self.write(Code.LOAD, valret, valptr)  # %valret = load %valptr
-                return valret 
-        
-        ## TODO: ADD MEMBER OPERATOR (.)
+        else:
+            valret = self.create_reg(self.get_vartype(valptr).unref_type())
+            self.write(Code.LOAD, valret, valptr)  # %valret = load %valptr
+            return valret 
 
-        try:
-            code = op2code(operator)
-        except KeyError:
-            raise CompileError("Operator %s is not valid" % operator)
+    ## TODO: ADD MEMBER OPERATOR (.)
 
-        # ASSIGNMENT
-        if OpAsnLoc[operator]:
+    @visits(*[(ASTType.OP, op) for op in AssignOps])
+    def _translate_assign(self, ast:AST, side=Side.RHS, lazyeval=False):
+        """ =, +=, -=
+        """
+        if side == Side.LHS:
+            raise CompileError("Expression is not assignable")
+
+        code = OpCodeLoc[ast.value]
+        valrhs = yield self.visit(ast.nodes[1], Side.RHS, lazyeval)
+        vallhs = yield self.visit(ast.nodes[0], Side.LHS, lazyeval)
+        typelhs = self.get_vartype(vallhs).unref_type() # valllhs is supposed to be a Pointer
+        typerhs = self.get_vartype(valrhs)
+        valrhs_cast = valrhs if typelhs == typerhs else self._translate_typecast(valrhs, typelhs)
+
+        if code is not None:
+            rvallhs = self.create_reg(typelhs) 
+            self.write(Code.LOAD, rvallhs, vallhs)
+
+            valret = self.create_reg(typelhs)
+            self.write(code, valret, rvallhs, valrhs_cast)
+            self.write(Code.STORE, None, valret, vallhs)
             
-            if side == Side.LHS:
-                raise CompileError("Expression is not assignable")
-
-            ## =, +=, -=
-            if OpAryLoc[operator] == 2:
-                valrhs = self._translate_expr(ast.nodes[1], Side.RHS, *args)
-                vallhs = self._translate_expr(ast.nodes[0], Side.LHS, *args)
-                typelhs = self.get_vartype(vallhs).unref_type() # valllhs is supposed to be a Pointer
-                typerhs = self.get_vartype(valrhs)
-                valrhs_cast = valrhs if typelhs == typerhs else self._translate_typecast(valrhs, typelhs)
-
-                if code is not None:
-                    rvallhs = self.create_reg(typelhs) 
-                    self.write(Code.LOAD, rvallhs, vallhs)
-
-                    valret = self.create_reg(typelhs)
-                    self.write(code, valret, rvallhs, valrhs_cast)
-                    self.write(Code.STORE, None, valret, vallhs)
-                    
-                    return valret
-                else:
-                    self.write(Code.STORE, None, valrhs_cast, vallhs)
-                    
-                    return valrhs
-
-            ## ++, --
-            else:
-                
-                vallhs = self._translate_expr(ast.nodes[0], Side.LHS)
-                typelhs = self.get_vartype(vallhs).unref_type()
-                rvallhs = self.create_reg(typelhs)
-                self.write(Code.LOAD, rvallhs, vallhs)
-                valret = self.create_reg(typelhs)
-                self.write(code, valret, rvallhs, Value(typelhs, 1))
-                self.write(Code.STORE, None, valret, vallhs)
-
-                if operator in (Operator.INC, Operator.DEC):
-                    return valret
-
-                elif operator in (Operator.POSTINC, Operator.POSTDEC):
-                    return rvallhs
-
-                else:
-                    raise RuntimeError()
-
+            return valret
         else:
-            vallhs = self._translate_expr(ast.nodes[0], Side.RHS, *args)
-            typelhs = self.get_vartype(vallhs)
-            if OpAryLoc[operator] == 2:
-
-           #     if lazyeval and operator in (Operator.AND, Operator.OR):
-           #         return self._translate_lazyevalbool(code, vallhs, ast.nodes[1], *args)
-           #         pass
-
-                valrhs = self._translate_expr(ast.nodes[1], Side.RHS, *args)
-                typerhs = self.get_vartype(valrhs)
-                ptr_arithmetic = operator in (Operator.ADD, Operator.SUB) and Translater.POINTER_ARITHMETIC
-                typeret = self.get_target_type(typelhs, typerhs, ptr_arithmetic)
-
-                if isinstance(vallhs, Value) and isinstance(valrhs, Value):
-                    return eval_op(operator, vallhs, valrhs)
+            self.write(Code.STORE, None, valrhs_cast, vallhs)
+            
+            return valrhs
 
-                vallhs_cast = self._translate_typecast(vallhs, typeret) if typelhs != typeret else vallhs
-                valrhs_cast = self._translate_typecast(valrhs, typeret) if typerhs != typeret else valrhs
+    @visits(*[(ASTType.OP, op) for op in IncDecOps])
+    def _translate_incdec(self, ast:AST, side=Side.RHS, lazyeval=False):
+        """ ++, --
+        """
+        if side == Side.LHS:
+            raise CompileError("Expression is not assignable")
 
-                # compare
-                if operator.value >= Operator.EQ.value and operator.value <= Operator.GE.value:
-                    typeret = ValType.BOOL
+        operator = ast.value
+        vallhs = yield self.visit(ast.nodes[0], Side.LHS)
+        typelhs = self.get_vartype(vallhs).unref_type()
+        rvallhs = self.create_reg(typelhs)
+        self.write(Code.LOAD, rvallhs, vallhs)
+        valret = self.create_reg(typelhs)
+        self.write(OpCodeLoc[operator], valret, rvallhs, Value(typelhs, 1))
+        self.write(Code.STORE, None, valret, vallhs)
+
+        if operator in (Operator.INC, Operator.DEC):
+            return valret
 
-                valret = self.create_reg(typeret)
-                self.write(code, valret, vallhs_cast, valrhs_cast)
+        else:
+            return rvallhs
 
-            # -, not    
-            else:   
+    @visits(*[(ASTType.OP, op) for op in BinaryOps])
+    def _translate_binary(self, ast:AST, side=Side.RHS, lazyeval=False):
+        operator = ast.value
+        vallhs = yield self.visit(ast.nodes[0], Side.RHS, lazyeval)
+        typelhs = self.get_vartype(vallhs)
+
+       #     if lazyeval and operator in (Operator.AND, Operator.OR):
+       #         return self._translate_lazyevalbool(code, vallhs, ast.nodes[1], lazyeval)
+       #         pass
+
+        valrhs = yield self.visit(ast.nodes[1], Side.RHS, lazyeval)
+        typerhs = self.get_vartype(valrhs)
+        ptr_arithmetic = operator in (Operator.ADD, Operator.SUB) and Translater.POINTER_ARITHMETIC
+        typeret = self.get_target_type(typelhs, typerhs, ptr_arithmetic)
+
+        if isinstance(vallhs, Value) and isinstance(valrhs, Value):
+            try:
+                return eval_op(operator, vallhs, valrhs)
+            except ZeroDivisionError:
+                pass    # left to run time
+
+        vallhs_cast = self._translate_typecast(vallhs, typeret) if typelhs != typeret else vallhs
+        valrhs_cast = self._translate_typecast(valrhs, typeret) if typerhs != typeret else valrhs
+
+        # compare
+        if operator.value >= Operator.EQ.value and operator.value <= Operator.GE.value:
+            typeret = ValType.BOOL
+
+        valret = self.create_reg(typeret)
+        self.write(OpCodeLoc[operator], valret, vallhs_cast, valrhs_cast)
+        return valret 
+
+    @visits(*[(ASTType.OP, op) for op in UnaryOps])
+    def _translate_unary(self, ast:AST, side=Side.RHS, lazyeval=False):
+        """ -, not
+        """
+        vallhs = yield self.visit(ast.nodes[0], Side.RHS, lazyeval)
+        typelhs = self.get_vartype(vallhs)
 
-                if isinstance(vallhs, Value):
-                    return eval_op(operator, vallhs)
+        if isinstance(vallhs, Value):
+            return eval_op(ast.value, vallhs)
 
-                valret = self.create_reg(typelhs)
-                self.write(code, valret, vallhs)
-            return valret 
+        valret = self.create_reg(typelhs)
+        self.write(OpCodeLoc[ast.value], valret, vallhs)
+        return valret 
         
     def _translate_lazyevalbool(self, code, vallhs, astrhs, *args):
 
@@ -490,38 +496,32 @@ class Translater:
         if code == Code.AND:
             self.write(Code.BR, None, lblrhs, lblskip, cond=vallhs)
             self.insert_label(lblrhs)
-            valrhs = self._translate_expr(astrhs, *args)
+            valrhs = yield self.visit(astrhs, *args)
             self.write(Code.BR, None, lblskip)
             self.insert_label(lblskip)
             valret = self.create_reg()
-            self.write(Code.PHI, valret, (vallhs, lblprev), (valrhs, lblrhs))
+            self.write(Code.PHI, valret, [(vallhs, lblprev), (valrhs, lblrhs)])
             return valret
 
         elif code == Code.OR:
             self.write(Code.BR, None, lblskip, lblrhs, cond=vallhs)
             self.insert_label(lblrhs)
-            valrhs = self._translate_expr(astrhs, *args)
+            valrhs = yield self.visit(astrhs, *args)
             self.write(Code.BR, None, lblskip)
             self.insert_label(lblskip)
             valret = self.create_reg()
-            self.write(Code.PHI, valret, (vallhs, lblprev), (valrhs, lblrhs))
+            self.write(Code.PHI, valret, [(vallhs, lblprev), (valrhs, lblrhs)])
             return valret
 
         else:
             raise RuntimeError()
 
-    def _translate_name(self, ast:AST, side):
+    @visits(ASTType.NAME)
+    def _translate_name(self, ast:AST, side=Side.RHS, lazyeval=False):
         """ Translate a name
         """
-        assert ast.type == ASTType.NAME
-
         varname = ast.value.name 
-        varid = None
-
-        for local_sym_table in reversed(self.sym_table_stack):
-            if varname in local_sym_table:
-                varid = local_sym_table[varname]
-                break
+        varid = self.sym_table.lookup(varname)
 
         if not varid:
 
@@ -538,27 +538,18 @@ class Translater:
             return rval
 
 
-    def _translate_funcall(self, ast:AST):
-        
-        assert ast.type == ASTType.CALL
+    @visits(ASTType.CALL)
+    def _translate_funcall(self, ast:AST, side=Side.RHS, lazyeval=False):
         
-        argids = [self._translate_expr(node) for node in ast.nodes[1:]] # identifier / value
+        argids = [] # identifier / value
+        for node in ast.nodes[1:]:
+            argids.append((yield self.visit(node)))
         if ast.nodes[0].type != ASTType.NAME:
             raise CompileError('Not a function: %s' % ast.nodes[0].value)
         
-        funcname = ast.nodes[0].value.name
-
-        signature = None
-        for f in self.function_table:
-            if f[0] == funcname:
-                signature = f
-                break
-
+        signature = self.overloads.resolve(ast.nodes[0].value.name, [self.get_vartype(argid) for argid in argids])
         funcname, argtypes, rettype = signature
 
-        if len(argtypes) != len(argids):
-            raise CompileError("Argument number not match")
-
         argids_cast = []
         for argid, argtype in zip(argids, argtypes):
             if self.get_vartype(argid) == argtype:
@@ -573,14 +564,14 @@ class Translater:
             self.write(Code.CALL, ret, signature, argids_cast)
             return ret 
 
-    def _translate_decl(self, ast:AST, isglobal):
+    @visits((ASTType.DECL, DeclNode.VARDECL))
+    def _translate_decl(self, ast:AST, isglobal=False):
         """ Translate variable decalaration
         """
-        assert ast.value == DeclNode.VARDECL
         assert ast.nodes[0].type == ASTType.TYPE
 
         for node in ast.nodes[1:]:
-            self._translate_decl_elem(node, ast.nodes[0].value, isglobal)
+            yield self._translate_decl_elem(node, ast.nodes[0].value, isglobal)
         
     def _translate_decl_elem(self, ast:AST, typename, isglobal):
         """ Translate a single definition.
@@ -591,7 +582,7 @@ class Translater:
         def translate_array_shape(mast):
             arrshape = []
             for node in mast.nodes:
-                newdimlen = self._eval_expr(node)
+                newdimlen = yield self._eval_expr(node)
                 newlen = int(newdimlen.val)  # this should be int
                 arrshape.append(newlen)
             return arrshape
@@ -601,13 +592,13 @@ class Translater:
                 requireconst is used in global definition;
                 inits: List of tuple (coord, val) (for return)
             """
-            evalfunc = self._translate_expr if not requireconst else self._eval_expr
+            evalfunc = self.visit if not requireconst else self._eval_expr
 
             for i, node in enumerate(mast.nodes):
                 if node.type == ASTType.LIST:
-                    translate_init_list(node, coord + [i], inits)
+                    yield translate_init_list(node, coord + [i], inits, requireconst)
                 else:
-                    inits.append((coord + [i], evalfunc(node)))
+                    inits.append((coord + [i], (yield evalfunc(node))))
 
         def unflat(val:int, dim, coord):
             """ coord: list for return
@@ -624,7 +615,7 @@ class Translater:
                 raise CompileError('Array must be initialized by list')
 
             inits1 = []
-            translate_init_list(mast, [], inits1, isglobal)
+            yield translate_init_list(mast, [], inits1, isglobal)
             inits = []
 
             # expand init list into full coordination
@@ -651,7 +642,7 @@ class Translater:
 
         ## array shape
         if len(ast.nodes[0].nodes) > 0:
-            arrshape = translate_array_shape(ast.nodes[0])
+            arrshape = yield translate_array_shape(ast.nodes[0])
 
             # size check (may not be necessary)
             if product(arrshape) > Translater.ARRAY_SIZE_LIMIT:
@@ -672,7 +663,7 @@ class Translater:
         if isglobal:
             if not arrshape:
                 if len(ast.nodes) > 1:
-                    initializer = self._eval_expr(ast.nodes[1]) # may require type cast
+                    initializer = yield self._eval_expr(ast.nodes[1]) # may require type cast
                     if initializer.type != typename:
                         initializer = self._translate_typecast(initializer, typename)
                 else:
@@ -680,7 +671,7 @@ class Translater:
             else:
                 init_array = zeros(arrshape, dtype=(float if vartype[0] == ValType.FLOAT else int))
                 if len(ast.nodes) > 1:
-                    for c, v in convert_init_list(ast.nodes[1]):
+                    for c, v in (yield convert_init_list(ast.nodes[1])):
                         init_array[tuple(c)] = v.val
                 initializer = Value(vartype, init_array)
 
@@ -689,20 +680,19 @@ class Translater:
 
         else:
 
-            for local_sym_table in self.sym_table_stack:
-                if varname in local_sym_table:
-                    raise CompileError('Variable "%s" already defined' % varname)
+            if varname in self.sym_table:
+                raise CompileError('Variable "%s" already defined' % varname)
 
             varid = self.create_reg(Pointer(vartype))
             self.write(Code.ALLOC, varid, vartype)
-            self.sym_table_stack[-1][varname] = varid
+            self.sym_table.declare(varname, varid)
 
             # declaration only
             if len(ast.nodes) == 1:
                 pass
 
             elif not arrshape:
-                initializer = self._translate_expr(ast.nodes[1])
+                initializer = yield self.visit(ast.nodes[1])
                 initialzer_cast = initializer if self.get_vartype(initializer) == typename else self._translate_typecast(initializer, typename)
                 self.write(Code.STORE, None, initialzer_cast, varid)
 
@@ -710,7 +700,7 @@ class Translater:
 
                 # fill 0 for the whole array here (memcpy)
 
-                for c, v in convert_init_list(ast.nodes[1]):
+                for c, v in (yield convert_init_list(ast.nodes[1])):
                     v_cast = v if self.get_vartype(v) == typename else self._translate_typecast(v, typename)                    
                     elemptr = self.create_reg(Pointer(typename))
 
@@ -744,7 +734,7 @@ class Translater:
 
             if (isinstance(target_type, Pointer) and isinstance(src_type, Pointer)) or (
                 isinstance(target_type, ValType) and isinstance(src_type, ValType)):
-                return Value(target_type, var_or_id.val)
+                return Value(target_type, cast_value(var_or_id.val, target_type) if isinstance(target_type, ValType) else var_or_id.val)
             
             elif Translater.POINTER_TO_VAL:
                 return Value(tar)
@@ -761,7 +751,7 @@ class Translater:
                     if src_type.value < ValType.FLOAT.value and target_type.value < ValType.FLOAT.value:
                         code = Code.EXT if src_type.value < target_type.value else Code.TRUNC
                     else:
-                        code = Code.ITOF if src_type == ValType.FLOAT else Code.FTOI
+                        code = Code.FTOI if src_type == ValType.FLOAT else Code.ITOF
                         
                     self.write(code, target, var_or_id, target_type)
 
@@ -863,24 +853,15 @@ class Translater:
         return Identifier(MemoryLoc.LOCAL, len(self.curfunction.registers) - 1)   
 
     def create_label(self):
-        self.labelidpool.append(Identifier(MemoryLoc.LOCAL, None))
-        return self.labelidpool[-1]
+        label_id = Identifier(MemoryLoc.LOCAL, None)
+        self.labelidpool.add(label_id)
+        return label_id
 
     def insert_label(self, label_id:Identifier):
         """ Pointer label with label_id to next code
         """
-        target_addr = len(self.curfunction.codes)
-
-        # check if already exists
-        for i, reg in enumerate(self.curfunction.registers):
-            if isinstance(reg, Label) and reg.addr == target_addr:
-                label_id.addr = i 
-                self.labelidpool.remove(label_id)
-                return
-
-        label_id.addr = len(self.curfunction.registers)
-        self.curfunction.registers.append(Label(target_addr))
-        self.labelidpool.remove(label_id)
+        label_id.addr = self.curfunction.label_at(len(self.curfunction.codes))
+        self.labelidpool.discard(label_id)
 
     def locate(self, id_):
         """ id_: Identifier;
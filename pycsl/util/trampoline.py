@@ -0,0 +1,57 @@
+""" Run recursive generator functions on an explicit stack.
+
+    A recursive function is written as a generator. Instead of calling itself
+    (or another such function), it yields the callee's generator and receives
+    the callee's return value:
+
+        def depth(node):
+            result = 0
+            for child in node.nodes:
+                result = max(result, (yield depth(child)))
+            return result + 1
+
+        trampoline(depth(root))
+
+    Nesting depth is then limited by memory, not by the Python recursion limit.
+    A yielded object that is not a generator (e.g. the result of a function
+    that does not recurse) is sent back as is.
+"""
+
+from types import GeneratorType
+
+
+def trampoline(gen):
+    """ Drive generator gen (and every generator it yields) to completion.
+        Returns the return value of gen. An exception raised by a callee is
+        thrown into its caller, as with an ordinary call.
+    """
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    value = None
+    error = None
+
+    while True:
+        try:
+            if error is None:
+                callee = gen.send(value)
+            else:
+                err, error = error, None
+                callee = gen.throw(err)
+        except StopIteration as stop:
+            if not stack:
+                return stop.value
+            gen = pop()
+            value = stop.value
+        except BaseException as err:
+            if not stack:
+                raise
+            gen = pop()
+            error = err
+        else:
+            if callee.__class__ is GeneratorType:
+                push(gen)
+                gen = callee
+                value = None
+            else:
+                value = callee
@@ -0,0 +1,79 @@
+""" Table-driven AST visitors.
+"""
+
+from .ast import AST, ASTType
+
+
+def visits(*kinds):
+    """ Register a Visitor method as the handler of node kinds.
+        A kind is an ASTType (every node of that type), or a tuple
+        (ASTType, value) for nodes of that type with that value, e.g.
+        (ASTType.CTRL, Keyword.IF). A (type, value) handler takes precedence
+        over a handler of the whole type.
+    """
+    def register(func):
+        func.visits = getattr(func, 'visits', ()) + kinds
+        return func
+    return register
+
+
+class Visitor:
+    """ Base of AST passes.
+        Handlers registered with @visits are collected once per class into a
+        table indexed by node type (and value); visit() looks the node up and
+        calls the handler bound to self, or generic_visit().
+
+        Handlers may be generators to be run by util.trampoline; a handler of
+        leaf nodes can simply return its result.
+    """
+
+    _tables = {}    # dict{Visitor class: table}
+
+    def __init__(self):
+        table = Visitor._tables.get(type(self))
+        if table is None:
+            table = Visitor._tables[type(self)] = type(self).build_table()
+
+        self.handlers = []  # list indexed by ASTType.value, of bound handler or dict{value: bound handler}
+        for entry in table:
+            if isinstance(entry, dict):
+                entry = {value: getattr(self, name) for value, name in entry.items()}
+            elif entry is not None:
+                entry = getattr(self, entry)
+            self.handlers.append(entry)
+
+    @classmethod
+    def build_table(cls):
+        """ Returns list indexed by ASTType.value, of handler name, or
+            dict{value: handler name} with key None for the whole type.
+            Handlers are looked up by name, so overriding methods keep their
+            registration.
+        """
+        table = [None] * (max(t.value for t in ASTType) + 1)
+        for klass in reversed(cls.__mro__):
+            for name, func in vars(klass).items():
+                for kind in getattr(func, 'visits', ()):
+                    mtype, value = kind if isinstance(kind, tuple) else (kind, None)
+                    entry = table[mtype.value]
+                    if value is None and not isinstance(entry, dict):
+                        table[mtype.value] = name
+                    else:
+                        if not isinstance(entry, dict):
+                            entry = table[mtype.value] = {None: entry} if entry else {}
+                        entry[value] = name
+        return table
+
+    def visit(self, node:AST, *args, **kwargs):
+        """ Call the handler of node.
+        """
+        handler = self.handlers[node.type.value]
+        if handler.__class__ is dict:
+            handler = handler.get(node.value) or handler.get(None)
+        if handler is None:
+            return self.generic_visit(node, *args, **kwargs)
+        return handler(node, *args, **kwargs)
+
+    def generic_visit(self, node:AST, *args, **kwargs):
+        """ Called for nodes without handler.
+        """
+        raise RuntimeError('No handler for %s %s in %s' % (node.type, node.value, type(self).__name__))
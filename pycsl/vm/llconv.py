@@ -30,6 +30,13 @@ class LLConverter:
         Code.BITC: 'bitcast'
     }
 
+    _IntrinsicTypeLoc = {
+        ValType.BOOL: 'i1',
+        ValType.CHAR: 'i8',
+        ValType.INT: 'i32',
+        ValType.FLOAT: 'f32'
+    }
+
     _IcmpCodeLoc = {
         Code.EQ: 'eq',
         Code.NE: 'ne',
@@ -48,6 +55,38 @@ class LLConverter:
         Code.GE: 'uge'
     }
 
+    # x ^ n for integers by squaring; 1 and -1 are the only bases keeping
+    # a nonzero value with a negative exponent
+    _IntPowFunction = '''
+define internal %(type)s @%(name)s(%(type)s %%x, %(type)s %%n) {
+entry:
+  %%neg = icmp slt %(type)s %%n, 0
+  br i1 %%neg, label %%negative, label %%head
+negative:
+  %%one = icmp eq %(type)s %%x, 1
+  %%minusone = icmp eq %(type)s %%x, -1
+  %%unit = or i1 %%one, %%minusone
+  %%odd = and %(type)s %%n, 1
+  br i1 %%unit, label %%head, label %%done
+head:
+  %%r = phi %(type)s [1, %%entry], [1, %%negative], [%%r.next, %%body]
+  %%b = phi %(type)s [%%x, %%entry], [%%x, %%negative], [%%b.next, %%body]
+  %%e = phi %(type)s [%%n, %%entry], [%%odd, %%negative], [%%e.next, %%body]
+  %%more = icmp ne %(type)s %%e, 0
+  br i1 %%more, label %%body, label %%done
+body:
+  %%bit = and %(type)s %%e, 1
+  %%set = icmp ne %(type)s %%bit, 0
+  %%rb = mul %(type)s %%r, %%b
+  %%r.next = select i1 %%set, %(type)s %%rb, %(type)s %%r
+  %%b.next = mul %(type)s %%b, %%b
+  %%e.next = lshr %(type)s %%e, 1
+  br label %%head
+done:
+  %%ret = phi %(type)s [0, %%negative], [%%r, %%head]
+  ret %(type)s %%ret
+}'''
+
     def __init__(self, translater:Translater):
         """ Add a translater object
         """
@@ -55,11 +94,15 @@ class LLConverter:
         self.translater = translater
 
         self.cur_pred = None
+        self.support = dict()   # dict{function name: declaration / definition}, used by the module
+        self.overloaded = set() # names of functions with several signatures
 
     def output(self, filename=None):
         """ filename: None==> stdout; name ==> open filename and write it;
         """
         self.writer = StrWriter(filename, '%s')
+        names = [fsig[0] for fsig in self.translater.function_table]
+        self.overloaded = set(name for name in names if names.count(name) > 1)
         for name, val in self.translater.global_values.items():
             self.format_global_var(name, val)
 
@@ -69,10 +112,13 @@ class LLConverter:
             else:
                 self.format_function_decl(fsig)
 
+        for text in self.support.values():
+            self.writeln('%s', text)
+
     def format_function_decl(self, signature):
         self.writeln('declare %s @%s (%s)',
             self.format_type(signature[2]),
-            str(signature[0]),
+            self.format_function_name(signature),
             ', '.join((self.format_type(s) for s in signature[1]))
         )
 
@@ -100,7 +146,7 @@ class LLConverter:
             self.writeln('@%s = global %s, align %d',
                 name, 
                 format_array(value.val, value.type), 
-                min(16, max(4, self.get_space(value.type))))
+                self.get_align(value.type))
             
 
     def format_block(self, signature, function:Block):
@@ -110,13 +156,16 @@ class LLConverter:
 
         self.writeln('\ndefine %s @%s(%s) {' ,
             self.format_type(rettype),
-            name,
+            self.format_function_name(signature),
             ', '.join((self.format_type(argtype) for argtype in argtypes))
         )
 
         self.cur_pred = len(argtypes)
 
         for idx, code in enumerate(function.codes):
+            if idx > 0 and idx in function.labels:
+                self.cur_pred = self.get_pred(idx)
+                self.writeln('; <label>:%d:', self.cur_pred)
             self.write('  ')
             self.format_tac(code, idx)
 
@@ -140,15 +189,12 @@ class LLConverter:
             else:
                 self.writeln('br label %s', tac.first)
 
-            self.cur_pred = self.get_pred(idx + 1)
-            self.writeln('; <label>:%d:', self.cur_pred)
-
         elif tac.code == Code.ALLOC:
 
             self.writeln('%s = alloca %s, align %d',
                 self.format_id(tac.ret),
                 self.format_type(tac.first),
-                min(16, max(4, self.get_space(tac.first)))
+                self.get_align(tac.first)
             )
 
         elif tac.code == Code.LOAD:
@@ -176,7 +222,7 @@ class LLConverter:
             
             if self.get_type(tac.first) == ValType.FLOAT:
                 tpabbr = 'f'
-            elif tac.code in (Code.MUL, Code.DIV, Code.REM):
+            elif tac.code in (Code.DIV, Code.REM):
                 tpabbr = 's'
             else:
                 tpabbr = ''
@@ -191,7 +237,7 @@ class LLConverter:
             )
 
         elif tac.code == Code.POW:
-            raise NotImplemented
+            self.format_pow(tac)
 
         elif tac.code.value >= Code.AND.value and tac.code.value < Code.NOT.value:
             self.writeln('%s = %s %s %s, %s',
@@ -202,6 +248,15 @@ class LLConverter:
                 self.format_var(tac.second)
             )
 
+        elif tac.code in (Code.SHL, Code.SHR):
+            self.writeln('%s = %s %s %s, %s',
+                self.format_id(tac.ret),
+                'shl' if tac.code == Code.SHL else 'ashr',
+                self.format_type(self.get_type(tac.ret)),
+                self.format_var(tac.first),
+                self.format_var(tac.second)
+            )
+
         elif tac.code == Code.NOT:
             
             if self.get_type(tac.first) == ValType.FLOAT:
@@ -219,7 +274,7 @@ class LLConverter:
                 self.format_id(tac.ret),
                 LLConverter._CastCodeLoc[tac.code],
                 self.format_var_with_type(tac.first),
-                self.format_var(tac.second)
+                self.format_type(tac.second)
             )
 
         elif tac.code.value >= Code.EQ.value and tac.code.value < Code.PHI.value:
@@ -238,13 +293,10 @@ class LLConverter:
             )
 
         elif tac.code == Code.PHI:
-            self.writeln('%s = phi %s [%s %s] [%s %s]',
+            self.writeln('%s = phi %s %s',
                 self.format_id(tac.ret),
                 self.format_type(self.get_type(tac.ret)),
-                self.format_var_with_type(tac.first[0]),
-                self.format_id(tac.first[1]),
-                self.format_var_with_type(tac.second[0]),
-                self.format_id(tac.second[1])
+                ', '.join(('[%s, %s]' % (self.format_var(val), self.format_id(label)) for val, label in tac.first))
             )
 
         elif tac.code == Code.CALL:
@@ -254,27 +306,57 @@ class LLConverter:
                 self.writeln('%s = call %s @%s(%s)',
                     self.format_id(tac.ret),
                     self.format_type(self.get_type(tac.ret)),
-                    str(tac.first[0]),
+                    self.format_function_name(tac.first),
                     ', '.join((self.format_var_with_type(v) for v in tac.second))
                 )
             else:
                 self.writeln('call void @%s(%s)',
-                    str(tac.first[0]),
+                    self.format_function_name(tac.first),
                     ', '.join((self.format_var_with_type(v) for v in tac.second))
                 )
 
         else:
             raise RuntimeError('Unrecognized TAC: %r' % str(tac))
 
+    def format_pow(self, tac:TAC):
+        """ float ^ float ==> llvm.pow; float ^ int (or integral constant) ==> llvm.powi;
+            int ^ int ==> csl.pow, exponentiation by squaring.
+        """
+        rettype = self.format_type(self.get_type(tac.ret))
+        exponent = tac.second
+
+        if self.get_type(tac.first) == ValType.FLOAT:
+            if isinstance(exponent, Value) and exponent.type == ValType.FLOAT and \
+                    float(exponent.val).is_integer() and abs(exponent.val) < 2**31:
+                exponent = Value(ValType.INT, int(exponent.val))
+
+            exptype = self.get_type(exponent)
+            if exptype == ValType.FLOAT:
+                name = 'llvm.pow.f32'
+                self.support[name] = 'declare %s @%s(%s, %s)' % (rettype, name, rettype, rettype)
+            else:
+                name = 'llvm.powi.f32.%s' % LLConverter._IntrinsicTypeLoc[exptype]
+                self.support[name] = 'declare %s @%s(%s, %s)' % (rettype, name, rettype, self.format_type(exptype))
+        else:
+            name = 'csl.pow.%s' % LLConverter._IntrinsicTypeLoc[self.get_type(tac.ret)]
+            self.support[name] = LLConverter._IntPowFunction % {'name': name, 'type': rettype}
+
+        self.writeln('%s = call %s @%s(%s, %s)',
+            self.format_id(tac.ret),
+            rettype,
+            name,
+            self.format_var_with_type(tac.first),
+            self.format_var_with_type(exponent)
+        )
+
     def get_type(self, id_or_val):
         return self.translater.get_vartype(id_or_val)
 
     def get_pred(self, code_idx):
-        for i, reg in enumerate(self.translater.curfunction.registers):
-            if isinstance(reg, Label) and reg.addr == code_idx:
-                return i
-
-        raise RuntimeError('Cannot find label at address: %r' % code_idx)
+        idx = self.translater.curfunction.labels.get(code_idx)
+        if idx is None:
+            raise RuntimeError('Cannot find label at address: %r' % code_idx)
+        return idx
 
     def get_space(self, tp):
         
@@ -287,6 +369,22 @@ class LLConverter:
         else:
             raise RuntimeError('Unrecognized type: %r', str(tp))
 
+    def get_align(self, tp):
+        """ Alignment of a variable: a power of two in 4..16, at most its size
+            if it is larger than 4.
+        """
+        space = min(16, max(4, self.get_space(tp)))
+        return 1 << (space.bit_length() - 1)
+
+    def format_function_name(self, signature):
+        """ Name of a function in LLVM. Overloaded functions get their
+            argument types appended, e.g. "g.i32", "g.float".
+        """
+        name = str(signature[0])
+        if name not in self.overloaded:
+            return name
+        return '"%s"' % '.'.join([name] + [self.format_type(argtype) for argtype in signature[1]])
+
     def format_code(self, code:Code):
         return code.name.lower()
 
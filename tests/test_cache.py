@@ -0,0 +1,54 @@
+""" Cache of parsed ASTs.
+"""
+
+import os
+import tempfile
+import unittest
+
+from pycsl.cache import ASTCache
+from pycsl.parse import Parser
+
+
+def write(dirname, filename, source):
+    with open(os.path.join(dirname, filename), 'w') as foutput:
+        foutput.write(source)
+
+
+class TestInlineImports(unittest.TestCase):
+
+    def setUp(self):
+        Parser.ast_cache.clear()
+
+    def test_same_main_different_import(self):
+        # the same main.csl imports a different lib.csl in each directory
+        names = []
+        with tempfile.TemporaryDirectory() as root:
+            for sub, retval in (('a', 1), ('b', 2)):
+                dirname = os.path.join(root, sub)
+                os.mkdir(dirname)
+                write(dirname, 'main.csl', 'import lib;\ndef main():int { return f(); }\n')
+                write(dirname, 'lib.csl', 'def f():int { return %d; }\n' % retval)
+                tree = Parser().parse_file(os.path.join(dirname, 'main.csl'))
+                names.append(str(tree))
+        self.assertIn('1', names[0])
+        self.assertIn('2', names[1])
+        self.assertNotEqual(names[0], names[1])
+
+
+class TestDiskTier(unittest.TestCase):
+
+    def test_reload(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ASTCache(cache_dir).put('k', 'ast')
+            self.assertEqual(ASTCache(cache_dir).get('k').ast, 'ast')
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), 'no user ids')
+    def test_writable_directory_ignored(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ASTCache(cache_dir).put('k', 'ast')
+            os.chmod(cache_dir, 0o777)
+            self.assertIsNone(ASTCache(cache_dir).get('k'))
+
+
+if __name__ == '__main__':
+    unittest.main()
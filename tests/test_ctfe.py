@@ -0,0 +1,70 @@
+""" Compile-time evaluation of CSL functions.
+"""
+
+import unittest
+
+from pycsl.ast import AST, ASTType
+from pycsl.ctfe import Evaluator
+from pycsl.errors import CompileError, EvalError
+from pycsl.grammar.basic_types import ValType, Value
+from pycsl.opt import ConstantFolder
+from pycsl.parse import Parser
+from pycsl.translate import Translater
+
+
+def parse(source):
+    return AST(ASTType.ROOT, nodes=Parser().parse_source(source))
+
+
+class TestArrayDecl(unittest.TestCase):
+
+    BigArray = '''
+def f(n:int):int { int t[2000000000]; return n; }
+int g = f(3);
+'''
+
+    def test_small_array(self):
+        evaluator = Evaluator()
+        evaluator.add_functions(parse('''
+def f(n:int):int { int t[3] = {1, 2, 3}; return t[0] + t[2] * n; }
+'''))
+        self.assertEqual(evaluator.call('f', [Value(ValType.INT, 2)]).val, 7)
+
+    def test_array_over_step_limit(self):
+        # must fail before allocating the cells
+        evaluator = Evaluator()
+        evaluator.add_functions(parse(TestArrayDecl.BigArray))
+        with self.assertRaises(EvalError):
+            evaluator.call('f', [Value(ValType.INT, 3)])
+
+    def test_array_too_large_translation(self):
+        tree = ConstantFolder().fold(parse(TestArrayDecl.BigArray))
+        with self.assertRaisesRegex(CompileError, 'Array too large'):
+            Translater().translate(tree)
+
+
+class TestOverloads(unittest.TestCase):
+
+    Source = '''
+def k(x:int):int;
+def k(x:float):int { return 7; }
+'''
+
+    def test_declared_overload_not_evaluated(self):
+        # k(5) calls the declared k(int), not k(float)
+        evaluator = Evaluator()
+        evaluator.add_functions(parse(TestOverloads.Source))
+        with self.assertRaises(EvalError):
+            evaluator.call('k', [Value(ValType.INT, 5)])
+        self.assertEqual(evaluator.call('k', [Value(ValType.FLOAT, 1.5)]).val, 7)
+
+    def test_declared_then_defined(self):
+        evaluator = Evaluator()
+        evaluator.add_functions(parse(TestOverloads.Source + '''
+def k(x:int):int { return x * 2; }
+'''))
+        self.assertEqual(evaluator.call('k', [Value(ValType.INT, 5)]).val, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
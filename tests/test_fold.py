@@ -0,0 +1,35 @@
+""" Constant folding of operators.
+"""
+
+import unittest
+
+from pycsl.evalute import eval_op
+from pycsl.grammar.basic_types import ValType, Value
+from pycsl.grammar.operators import Operator
+
+
+def ipow(a, b, vtype=ValType.INT):
+    return eval_op(Operator.POW, Value(vtype, a), Value(vtype, b)).val
+
+
+class TestPow(unittest.TestCase):
+
+    def test_wraps_around(self):
+        self.assertEqual(ipow(3, 21), 1870418611)
+        self.assertEqual(ipow(-2, 31), -2147483648)
+        self.assertEqual(ipow(3, 5, ValType.CHAR), 3 ** 5 - 256)
+
+    def test_large_exponent(self):
+        # evaluated modulo 2**32, not as a big integer
+        self.assertEqual(ipow(3, 1000000000), 783845377)
+
+    def test_negative_exponent(self):
+        self.assertEqual(ipow(7, -2), 0)
+        self.assertEqual(ipow(0, -1), 0)
+        self.assertEqual(ipow(1, -4), 1)
+        self.assertEqual(ipow(-1, -3), -1)
+        self.assertEqual(ipow(-1, -4), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
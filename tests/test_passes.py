@@ -0,0 +1,220 @@
+""" IR optimization passes.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from pycsl.ast import AST, ASTType
+from pycsl.ir import CFG, Code, MemoryLoc, natural_loops
+from pycsl.opt import ConstantFolder, run_passes
+from pycsl.parse import Parser
+from pycsl.translate import Translater
+from pycsl.vm import LLConverter
+
+
+def translate(source):
+    translater = Translater()
+    translater.translate(ConstantFolder().fold(AST(ASTType.ROOT, nodes=Parser().parse_source(source))))
+    return translater
+
+
+def function(translater, name):
+    for signature, idx in translater.function_table.items():
+        if signature[0] == name and idx is not None:
+            return translater.functions[idx]
+
+
+def count(block, code):
+    return sum(1 for c in block.codes if c.code == code)
+
+
+class PassTest(unittest.TestCase):
+    """ Runs passes on the functions of Source.
+    """
+
+    Source = ''
+
+    def run_passes(self, passes):
+        self.translater = translate(self.Source)
+        return run_passes(self.translater, passes)
+
+    def function(self, name='f'):
+        return function(self.translater, name)
+
+    def assertPhisMatchPreds(self, block):
+        """ Every PHI has one incoming value per predecessor of its block.
+        """
+        cfg = CFG(block)
+        for bb in cfg.blocks:
+            preds = sorted(pred.label for pred in bb.preds)
+            for code in bb.codes:
+                if code.code == Code.PHI:
+                    self.assertEqual(sorted(label.addr for _, label in code.first), preds)
+
+
+class TestMem2Reg(PassTest):
+
+    Source = '''
+def f(n:int):int {
+    int s = 0, i;
+    for (i = 0; i < n; i++) { s += i; }
+    return s;
+}
+'''
+
+    def test_promoted(self):
+        stats = self.run_passes(['mem2reg'])['mem2reg']
+        self.assertEqual(stats['variables promoted'], 3)
+        block = self.function()
+        for code in (Code.ALLOC, Code.LOAD, Code.STORE):
+            self.assertEqual(count(block, code), 0)
+        self.assertEqual(count(block, Code.PHI), 2)
+        self.assertPhisMatchPreds(block)
+
+
+class TestLoadStoreForwarding(PassTest):
+
+    Source = '''
+def f(n:int):int {
+    int x;
+    x = n + 1;
+    return x * x;
+}
+'''
+
+    def test_loads_removed(self):
+        before = count(function(translate(self.Source), 'f'), Code.LOAD)
+        stats = self.run_passes(['peephole'])['peephole']
+        self.assertGreater(stats['loads removed'], 0)
+        self.assertEqual(count(self.function(), Code.LOAD), before - stats['loads removed'])
+
+
+class TestGlobalValueNumbering(PassTest):
+
+    Source = '''
+def f(a:int, b:int):int {
+    return (a + b) * (a + b);
+}
+'''
+
+    def test_common_expression(self):
+        stats = self.run_passes(['mem2reg', 'gvn'])['gvn']
+        self.assertGreater(stats['codes removed'], 0)
+        self.assertEqual(count(self.function(), Code.ADD), 1)
+
+
+class TestLoopInvariantCodeMotion(PassTest):
+
+    Source = '''
+int g = 3;
+
+def set(x:int) { g = x; }
+
+def f(n:int):int {
+    int s = 0, i;
+    for (i = 0; i < n; i++) { s += g; }
+    return s;
+}
+'''
+
+    def test_load_hoisted(self):
+        stats = self.run_passes(['mem2reg', 'licm'])['licm']
+        self.assertEqual(stats['loads hoisted'], 1)
+        cfg = CFG(self.function())
+        loop_blocks = set().union(*(loop.blocks for loop in natural_loops(cfg)))
+        self.assertTrue(loop_blocks)
+        for block in cfg.blocks:
+            for code in block.codes:
+                if code.code == Code.LOAD and code.first.loc == MemoryLoc.GLOBAL:
+                    self.assertNotIn(block, loop_blocks)
+
+
+class TestStrengthReduction(PassTest):
+
+    Source = '''
+def f(n:int):int {
+    int a[10], i;
+    for (i = 0; i < 10; i++) { a[i] = n; }
+    return a[3];
+}
+'''
+
+    def test_address_reduced(self):
+        stats = self.run_passes(['mem2reg', 'strength'])['strength']
+        self.assertEqual(stats['addresses reduced'], 1)
+        # the store goes through a pointer stepped by the loop
+        block = self.function()
+        phis = set(code.ret.addr for code in block.codes if code.code == Code.PHI)
+        stores = [code for code in block.codes if code.code == Code.STORE]
+        self.assertEqual(len(stores), 1)
+        self.assertIn(stores[0].second.addr, phis)
+        self.assertPhisMatchPreds(block)
+
+
+class TestDeadCodeElimination(PassTest):
+
+    Source = '''
+def g(x:int);
+
+def f(n:int):int {
+    int debug = 0;
+    if (debug) { g(n); }
+    return n;
+}
+'''
+
+    def test_block_removed(self):
+        blocks = len(CFG(function(translate(self.Source), 'f')).blocks)
+        stats = self.run_passes(['mem2reg', 'dce'])['dce']
+        self.assertGreater(stats['blocks removed'], 0)
+        block = self.function()
+        self.assertLess(len(CFG(block).blocks), blocks)
+        self.assertEqual(count(block, Code.CALL), 0)
+
+
+class TestFunctionInlining(PassTest):
+
+    Source = '''
+def sq(x:int):int {
+    if (x < 0) { return 0 - x * x; }
+    return x * x;
+}
+
+def f(n:int):int {
+    int s = 0, i, t;
+    if (n > 3) { t = sq(n); } else { t = sq(n) + 1; }
+    for (i = 0; i < n; i++) { s += sq(i) + t; }
+    return s + sq(t);
+}
+'''
+
+    def test_inlined(self):
+        stats = self.run_passes(['inline'])['inline']
+        self.assertEqual(stats['calls inlined'], 4)
+        self.assertEqual(count(self.function(), Code.CALL), 0)
+
+    def test_after_mem2reg(self):
+        # inlining splits blocks that are incoming blocks of PHIs
+        stats = self.run_passes(['mem2reg', 'inline'])
+        self.assertEqual(stats['inline']['calls inlined'], 4)
+        self.assertPhisMatchPreds(self.function())
+
+    @unittest.skipUnless(shutil.which('opt'), 'LLVM opt not found')
+    def test_after_mem2reg_verifies(self):
+        for passes in (['mem2reg', 'inline'], ['mem2reg', 'inline', 'dce']):
+            self.run_passes(passes)
+            with tempfile.TemporaryDirectory() as dirname:
+                filename = os.path.join(dirname, 'f.ll')
+                converter = LLConverter(self.translater)
+                converter.output(filename)
+                converter.writer.close()
+                result = subprocess.run(['opt', '-passes=verify', '-disable-output', filename],
+                    capture_output=True, text=True)
+            self.assertEqual(result.returncode, 0, result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()